@@ -1,3 +1,8 @@
+# Patch the standard library before anything else imports it, so the message
+# bus consumer thread runs as a green thread that can emit on the Socket.IO server
+import eventlet
+eventlet.monkey_patch()
+
 from flask import Flask, request, jsonify, Response, send_from_directory, render_template, redirect
 import requests
 import os
@@ -10,8 +15,14 @@ import base64
 import json
 from flask_cors import CORS
 from werkzeug.exceptions import HTTPException
-import eventlet
 import socketio
+import sys
+
+# Add common directory to path for event modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
+from events.consumer import setup_consumer, register_event_handler
+from events.orders import build_order_delta, order_recipients, order_table_number, staff_devices, table_devices
+from storage.blobs import BLOB_NAME
 
 # Set up logging
 logging.basicConfig(
@@ -28,6 +39,10 @@ CORS(app)
 JWT_SECRET = os.getenv('JWT_SECRET', 'restaurant-system-secret')
 JWT_ALGORITHM = 'HS256'
 
+# Kitchen queue long-polls are held open by the order service for up to its
+# KITCHEN_QUEUE_MAX_WAIT (25s), so the proxy waits a little longer
+KITCHEN_QUEUE_PROXY_TIMEOUT = float(os.getenv('KITCHEN_QUEUE_PROXY_TIMEOUT', 35))
+
 # Initialize Socket.IO server
 sio = socketio.Server(cors_allowed_origins="*", async_mode='eventlet')
 app.wsgi_app = socketio.WSGIApp(sio, app.wsgi_app)
@@ -45,13 +60,18 @@ SERVICE_REGISTRY = {
     'content_service': os.getenv('CONTENT_SERVICE_URL', 'http://localhost:5009')
 }
 
+# Response headers passed back to clients from the services
+FORWARDED_RESPONSE_HEADERS = ['X-Next-Cursor', 'ETag', 'Cache-Control', 'X-Menu-Version']
 
 # Connected clients for WebSocket tracking
 connected_devices = {}
 
 # Authentication utility functions
-def proxy_request(service, path, method='GET', params=None, data=None, files=None, headers=None):
-    """Forward request to the appropriate microservice"""
+def proxy_request(service, path, method='GET', params=None, data=None, files=None, headers=None, stream=False, timeout=None):
+    """
+    Forward request to the appropriate microservice. With stream=True the
+    response body is relayed as it arrives instead of being buffered.
+    """
     try:
         service_url = SERVICE_REGISTRY.get(service)
         if not service_url:
@@ -75,25 +95,30 @@ def proxy_request(service, path, method='GET', params=None, data=None, files=Non
 
         # Forward the request
         if method == 'GET':
-            response = requests.get(url, params=params, headers=forwarded_headers)
+            response = requests.get(url, params=params, headers=forwarded_headers, stream=stream, timeout=timeout)
         elif method == 'POST':
             if files:
-                response = requests.post(url, data=data, files=files, headers=forwarded_headers)
+                response = requests.post(url, data=data, files=files, headers=forwarded_headers, timeout=timeout)
             else:
-                response = requests.post(url, json=data, headers=forwarded_headers)
+                response = requests.post(url, json=data, headers=forwarded_headers, timeout=timeout)
         elif method == 'PUT':
-            response = requests.put(url, json=data, headers=forwarded_headers)
+            response = requests.put(url, json=data, headers=forwarded_headers, timeout=timeout)
         elif method == 'DELETE':
-            response = requests.delete(url, headers=forwarded_headers)
+            response = requests.delete(url, headers=forwarded_headers, timeout=timeout)
         else:
             return jsonify({'error': 'Method not supported'}), 405
 
         # Return the service response
-        return Response(
-            response.content,
+        proxied = Response(
+            response.iter_content(chunk_size=None) if stream else response.content,
             status=response.status_code,
             content_type=response.headers.get('Content-Type', 'application/json')
         )
+        for header in FORWARDED_RESPONSE_HEADERS:
+            if header in response.headers:
+                proxied.headers[header] = response.headers[header]
+        
+        return proxied
 
     except requests.RequestException as e:
         logger.error(f"Error proxying request to {service}: {e}")
@@ -139,6 +164,11 @@ def import_menu():
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@app.route('/api/menu/import/<job_id>', methods=['GET'])
+def get_menu_import_job(job_id):
+    return proxy_request('menu_service', f'/api/menu/import/{job_id}')
+
 # Static files for web application
 @app.route('/')
 def index():
@@ -160,6 +190,18 @@ def role_view(role):
 def get_menu():
     return proxy_request('menu_service', '/api/menu', params=request.args)
 
+@app.route('/api/menu/categories', methods=['GET'])
+def get_menu_categories():
+    return proxy_request('menu_service', '/api/menu/categories')
+
+@app.route('/api/menu/changes', methods=['GET'])
+def get_menu_changes():
+    return proxy_request('menu_service', '/api/menu/changes', params=request.args)
+
+@app.route('/api/menu/search', methods=['GET'])
+def search_menu():
+    return proxy_request('menu_service', '/api/menu/search', params=request.args)
+
 @app.route('/api/menu/<int:item_id>', methods=['GET'])
 def get_menu_item(item_id):
     return proxy_request('menu_service', f'/api/menu/{item_id}')
@@ -218,9 +260,14 @@ def upload_image():
         return jsonify({'error': f'Error forwarding request: {str(e)}'}), 500
 
 # Order Service Routes
+def wants_ndjson():
+    """Whether a listing request asked for a newline-delimited JSON stream"""
+    return (request.args.get('format') == 'ndjson' or
+            request.accept_mimetypes.best == 'application/x-ndjson')
+
 @app.route('/api/orders', methods=['GET'])
 def get_orders():
-    return proxy_request('order_service', '/api/orders', params=request.args)
+    return proxy_request('order_service', '/api/orders', params=request.args, stream=wants_ndjson())
 
 @app.route('/api/orders/<order_id>', methods=['GET'])
 def get_order(order_id):
@@ -234,10 +281,28 @@ def create_order():
 def update_order(order_id):
     return proxy_request('order_service', f'/api/orders/{order_id}', method='PUT', data=request.json)
 
+@app.route('/api/order-items', methods=['GET'])
+def get_order_items():
+    return proxy_request('order_service', '/api/order-items', params=request.args, stream=wants_ndjson())
+
+@app.route('/api/order-items/bulk', methods=['PUT'])
+def bulk_update_order_items():
+    return proxy_request('order_service', '/api/order-items/bulk', method='PUT', data=request.json)
+
 @app.route('/api/order-items/<item_id>', methods=['PUT'])
 def update_order_item(item_id):
     return proxy_request('order_service', f'/api/order-items/{item_id}', method='PUT', data=request.json)
 
+@app.route('/api/kitchen/queue', methods=['GET'])
+def get_kitchen_queue():
+    """
+    Kitchen queue long-poll. The request can be held open for the whole
+    poll timeout; with the standard library monkey-patched it waits on a
+    green socket, so the hub keeps serving other requests meanwhile.
+    """
+    return proxy_request('order_service', '/api/kitchen/queue', params=request.args,
+                         timeout=KITCHEN_QUEUE_PROXY_TIMEOUT)
+
 @app.route('/api/orders/table/<int:table_number>', methods=['GET'])
 def get_table_orders(table_number):
     return proxy_request(
@@ -507,6 +572,14 @@ def serve_promo_image(filename):
     # Define the path to your uploads directory relative to your app
     uploads_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads/promo')
     return send_from_directory(uploads_dir, filename)
+
+@app.after_request
+def cache_blobs(response):
+    # Uploads named by their content hash never change under the same URL
+    if request.method == 'GET' and response.status_code == 200 and BLOB_NAME.match(request.path.rsplit('/', 1)[-1]):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 # Error handler
 @app.errorhandler(Exception)
 def handle_error(e):
@@ -560,18 +633,23 @@ def forward_event_to_clients(event_name, data=None):
     """Forward events to connected clients"""
     sio.emit(event_name, data)
 
+def forward_event_to_devices(event_name, data, sids):
+    """Forward events to the given connected clients only"""
+    for sid in sids:
+        sio.emit(event_name, data, room=sid)
+
 # Event forwarding functions
-def forward_menu_updated():
-    forward_event_to_clients('menu_updated')
+def forward_menu_updated(data=None):
+    forward_event_to_clients('menu_updated', data)
 
 def forward_menu_item_availability_updated(data):
     forward_event_to_clients('menu_item_availability_updated', data)
 
-def forward_new_order(data):
-    forward_event_to_clients('new_order', data)
+def forward_new_order(data, sids):
+    forward_event_to_devices('new_order', data, sids)
 
-def forward_order_updated(data):
-    forward_event_to_clients('order_updated', data)
+def forward_order_updated(data, sids):
+    forward_event_to_devices('order_updated', data, sids)
 
 def forward_promo_updated():
     forward_event_to_clients('promo_updated')
@@ -607,12 +685,49 @@ def reset_device_api(device_id):
     else:
         return jsonify({"error": "Device not found"}), 404
 
-# Subscribe to the Notification Service for events
+# Subscribe to the message bus for order and menu events; orders only go to staff
+# devices and to the customer devices of the order's table
+def handle_order_created(payload):
+    """Handle order_created event"""
+    delta = build_order_delta(payload)
+    forward_new_order(delta, staff_devices(connected_devices))
+    forward_order_updated(delta, table_devices(connected_devices, order_table_number(payload)))
+
+def handle_order_updated(payload):
+    """Handle order_updated and order_item_updated events"""
+    forward_order_updated(build_order_delta(payload), order_recipients(connected_devices, payload))
+
+def handle_menu_changed(payload):
+    """Handle menu_updated and menu_item_created/updated/deleted events"""
+    # Clients fetch the change itself from the menu change feed
+    forward_menu_updated({'version': payload.get('version')})
+
+def handle_menu_item_availability_updated(payload):
+    """Handle menu_item_availability_updated event"""
+    forward_menu_item_availability_updated({
+        'item_id': payload.get('item_id'),
+        'available': payload.get('available')
+    })
+
 def connect_to_notification_service():
-    """Connect to notification service to receive events"""
-    # In a real implementation, this would use a WebSocket connection
-    # to the notification service or directly subscribe to the message bus
-    pass
+    """Subscribe to the message bus to receive order and menu events"""
+    register_event_handler('order_created', handle_order_created)
+    register_event_handler('order_updated', handle_order_updated)
+    register_event_handler('order_item_updated', handle_order_updated)
+    register_event_handler('menu_updated', handle_menu_changed)
+    register_event_handler('menu_item_created', handle_menu_changed)
+    register_event_handler('menu_item_updated', handle_menu_changed)
+    register_event_handler('menu_item_deleted', handle_menu_changed)
+    register_event_handler('menu_item_availability_updated', handle_menu_item_availability_updated)
+    
+    setup_consumer([
+        'order_created', 'order_updated', 'order_item_updated',
+        'menu_updated', 'menu_item_created', 'menu_item_updated', 'menu_item_deleted',
+        'menu_item_availability_updated'
+    ])
+
+connect_to_notification_service()
+
 @app.route('/debug-auth/<int:table_number>', methods=['GET'])
 def debug_auth(table_number):
     auth = request.headers.get('X-Table-Auth')
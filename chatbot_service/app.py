@@ -6,12 +6,12 @@ import logging
 import sys
 import re
 import time
-import sqlite3
 from datetime import datetime
 
 # Add common directory to path for event modules
 sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
 from events.consumer import setup_consumer, register_event_handler
+from db.pool import get_connection, retry_on_busy
 
 # Import RAG system and LLM chat
 from rag_system import RAGSystem
@@ -71,10 +71,10 @@ def save_chatbot_config(config):
 
 # Database setup
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled WAL-mode connection; close() hands it back to the pool
+    return get_connection(DATABASE)
 
+@retry_on_busy
 def create_tables():
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -479,14 +479,11 @@ def upload_rag_document():
             logger.info(f"Saving file to {file_path}")
             file.save(file_path)
             
-            # Add to RAG system
+            # Add to RAG system and index it
             success = rag_system.add_document(file_path)
             
             if success:
                 try:
-                    # Re-vectorize documents
-                    rag_system._vectorize_documents()
-                    
                     # Clear all user sessions to ensure they use the updated RAG system
                     global user_sessions
                     user_sessions = {}
@@ -527,13 +524,8 @@ def remove_rag_document():
         rag_system.document_paths.remove(path)
         rag_system.save_document_registry()
         
-        # Remove from loaded documents
-        if filename in rag_system.documents:
-            del rag_system.documents[filename]
-            
-            # Update vectors
-            rag_system._vectorize_documents()
-            
+        # Remove from loaded documents and the index
+        if rag_system.remove_document(filename):
             # Clear all user sessions to ensure they use the updated RAG system
             global user_sessions
             user_sessions = {}
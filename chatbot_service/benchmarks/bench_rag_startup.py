@@ -0,0 +1,90 @@
+"""
+Benchmark of RAGSystem startup over a folder of N documents: the original
+load, which refits the TF-IDF model after every document, against a first
+start that fits once and fills the cache, a restart from the cache, and a
+restart after one document changed.
+
+Documents are generated CSV price lists, which parse much faster than the
+PDF and DOCX files the cache mostly saves, so the parsing share of the
+original and first start is understated here.
+
+Usage:
+    python benchmarks/bench_rag_startup.py [--docs 50 200 800] [--rows 40]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import logging
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import rag_system
+from rag_system import RAGSystem
+
+WORDS = ('pho bun banh mi com tam goi cuon cha gio ca phe sua da sinh to '
+         'beef pork chicken shrimp tofu rice noodle herbs lime chili broth '
+         'grilled crispy fresh spicy sweet sour vegan gluten peanut soy').split()
+
+def write_documents(folder, count, rows, rng):
+    for number in range(count):
+        lines = ['Dish,Description,Price,Allergens']
+        for row in range(rows):
+            words = ' '.join(rng.choice(WORDS) for _ in range(12))
+            lines.append(f"Dish {number}-{row},{words},{rng.randint(3, 30)}.99,{rng.choice(WORDS)}")
+        Path(folder, f"doc_{number:04d}.csv").write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+def original_load(folder):
+    """The load before the cache: parse every file and refit after each one"""
+    rag = RAGSystem(docs_folder=os.path.join(folder, 'empty'))
+    rag.save_cache = lambda: None
+    for file_path in Path(folder).glob('*.csv'):
+        rag.add_document(str(file_path), register=False)
+    return rag
+
+def timed(load):
+    start = time.perf_counter()
+    rag = load()
+    return (time.perf_counter() - start) * 1000, rag
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, nargs='+', default=[50, 200, 800])
+    parser.add_argument('--rows', type=int, default=40)
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    rng = random.Random(7)
+    
+    # The original load refits a TfidfVectorizer; compare like with like
+    rag_system.RAG_INDEX_MODE = 'tfidf'
+    
+    print(f"{'documents':<11}{'original ms':>13}{'first start':>13}{'cached':>9}{'1 changed':>11}")
+    for count in args.docs:
+        with tempfile.TemporaryDirectory() as workdir:
+            # The registry file is relative to the working directory
+            os.chdir(workdir)
+            rag_system.RAG_CACHE_FILE = os.path.join(workdir, 'rag_cache.pkl')
+            folder = os.path.join(workdir, 'documents')
+            os.makedirs(folder)
+            write_documents(folder, count, args.rows, rng)
+            
+            original, baseline = timed(lambda: original_load(folder))
+            first, _ = timed(lambda: RAGSystem(docs_folder=folder))
+            cached, rag = timed(lambda: RAGSystem(docs_folder=folder))
+            
+            # Same index either way
+            assert rag.chunk_map == baseline.chunk_map
+            assert (rag.document_vectors != baseline.document_vectors).nnz == 0
+            
+            write_documents(folder, 1, args.rows, rng)
+            changed, _ = timed(lambda: RAGSystem(docs_folder=folder))
+            
+            os.chdir('/')
+        
+        print(f"{count:<11}{original:>13.0f}{first:>13.0f}{cached:>9.0f}{changed:>11.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark of adding and removing one document in a RAGSystem of N
+documents, as the admin upload and remove routes do: the 'tfidf' mode,
+which refits the vectorizer over every chunk, against the incremental
+index. Also times the first query after a change, which recomputes the
+IDF weights, a steady query, and the background compaction.
+
+Documents are generated CSV price lists, loaded once per size.
+
+Usage:
+    python benchmarks/bench_rag_updates.py [--docs 50 200 800] [--rows 40]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import logging
+from pathlib import Path
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import rag_system
+from rag_system import RAGSystem
+
+WORDS = ('pho bun banh mi com tam goi cuon cha gio ca phe sua da sinh to '
+         'beef pork chicken shrimp tofu rice noodle herbs lime chili broth '
+         'grilled crispy fresh spicy sweet sour vegan gluten peanut soy').split()
+
+def write_document(path, rows, rng):
+    lines = ['Dish,Description,Price,Allergens']
+    for row in range(rows):
+        words = ' '.join(rng.choice(WORDS) for _ in range(12))
+        lines.append(f"Dish {row},{words},{rng.randint(3, 30)}.99,{rng.choice(WORDS)}")
+    Path(path).write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+def timed(action):
+    start = time.perf_counter()
+    action()
+    return (time.perf_counter() - start) * 1000
+
+def measure(folder, extra_path):
+    """Add, query and remove one document; returns the timings in ms"""
+    rag = RAGSystem(docs_folder=folder)
+    add = timed(lambda: rag.add_document(extra_path, register=False))
+    first_query = timed(lambda: rag.query('spicy beef pho'))
+    query = timed(lambda: rag.query('vegan tofu noodle'))
+    remove = timed(lambda: rag.remove_document(os.path.basename(extra_path)))
+    compact = timed(rag.index.compact) if rag.index is not None else 0
+    return add, remove, first_query, query, compact
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, nargs='+', default=[50, 200, 800])
+    parser.add_argument('--rows', type=int, default=40)
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    rng = random.Random(7)
+    
+    print(f"{'documents':<11}{'mode':<13}{'add ms':>8}{'remove':>8}{'1st query':>11}{'query':>7}{'compact':>9}")
+    for count in args.docs:
+        with tempfile.TemporaryDirectory() as workdir:
+            # The registry file is relative to the working directory
+            os.chdir(workdir)
+            rag_system.RAG_CACHE_FILE = os.path.join(workdir, 'rag_cache.pkl')
+            folder = os.path.join(workdir, 'documents')
+            os.makedirs(folder)
+            for number in range(count):
+                write_document(os.path.join(folder, f"doc_{number:04d}.csv"), args.rows, rng)
+            extra_path = os.path.join(workdir, 'extra.csv')
+            write_document(extra_path, args.rows, rng)
+            
+            for mode in ('tfidf', 'incremental'):
+                rag_system.RAG_INDEX_MODE = mode
+                timings = measure(folder, extra_path)
+                print(f"{count:<11}{mode:<13}" + ''.join(f"{value:>{width}.1f}" for value, width in zip(timings, (8, 8, 11, 7, 9))))
+            
+            os.chdir('/')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import logging
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+logger = logging.getLogger(__name__)
+
+# Hashed term space; collisions between the terms of a restaurant's
+# documents are negligible at this size
+INDEX_FEATURES = 2 ** 20
+
+class IncrementalIndex:
+    """
+    TF-IDF index over document chunks that adds and removes documents
+    without refitting. Chunks are hashed to raw term counts, which don't
+    depend on the rest of the corpus, document frequencies are counts kept
+    up to date on every change, and IDF weights are applied when querying.
+    Scores equal those of a TfidfVectorizer fitted on the same chunks, hash
+    collisions aside.
+    
+    Added documents are appended as separate blocks and removed ones are
+    tombstoned, so both cost O(size of the document); compact() later
+    merges everything into one matrix.
+    """
+    
+    def __init__(self, n_features=INDEX_FEATURES):
+        self.hasher = HashingVectorizer(stop_words='english', n_features=n_features,
+                                        alternate_sign=False, norm=None)
+        self.lock = threading.Lock()
+        self.matrix = sp.csr_matrix((0, n_features), dtype=np.float64)  # Compacted chunk counts
+        self.rows = []  # (doc_name, chunk_index) of each compacted row
+        self.live = np.zeros(0, dtype=bool)  # False for tombstoned rows
+        self.doc_rows = {}  # Compacted row numbers of each document
+        self.blocks = {}  # Chunk counts of the documents added since compaction
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.chunk_count = 0
+        self.generation = 0  # Bumped on every change
+        self.weights = None  # IDF and row norms of the current generation
+    
+    @classmethod
+    def build(cls, documents):
+        """Index {doc_name: chunks} from scratch"""
+        index = cls()
+        for doc_name, chunks in documents.items():
+            index.add(doc_name, chunks)
+        index.compact()
+        return index
+    
+    def __getstate__(self):
+        # Copies, so the pickle is consistent while other threads keep writing
+        with self.lock:
+            state = self.__dict__.copy()
+            state['df'] = self.df.copy()
+            state['live'] = self.live.copy()
+            state['blocks'] = dict(self.blocks)
+            state['doc_rows'] = dict(self.doc_rows)
+            state['rows'] = list(self.rows)
+        del state['lock']
+        state['weights'] = None
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+    
+    def add(self, doc_name, chunks):
+        """Index a document's chunks, replacing any document of that name"""
+        counts = self.hasher.transform(chunks) if chunks else None
+        
+        with self.lock:
+            self._remove(doc_name)
+            if counts is not None:
+                self.blocks[doc_name] = counts
+                np.add.at(self.df, counts.indices, 1)
+                self.chunk_count += counts.shape[0]
+            self.generation += 1
+            self.weights = None
+    
+    def remove(self, doc_name):
+        """Drop a document from the index"""
+        with self.lock:
+            self._remove(doc_name)
+            self.generation += 1
+            self.weights = None
+    
+    def _remove(self, doc_name):
+        counts = self.blocks.pop(doc_name, None)
+        rows = self.doc_rows.pop(doc_name, None)
+        if rows is not None:
+            counts = self.matrix[rows]
+            self.live[rows] = False
+        if counts is not None:
+            np.subtract.at(self.df, counts.indices, 1)
+            self.chunk_count -= counts.shape[0]
+    
+    def current_weights(self):
+        """IDF weights and row norms for the current documents, computed once per change"""
+        weights = self.weights
+        if weights is not None and weights[0] == self.generation:
+            return weights
+        
+        # Smoothed IDF, as TfidfVectorizer computes it
+        idf = np.log((1 + self.chunk_count) / (1 + self.df)) + 1
+        squared = idf ** 2
+        matrix_norms = np.sqrt(self.matrix.power(2) @ squared)
+        block_norms = {doc_name: np.sqrt(counts.power(2) @ squared) for doc_name, counts in self.blocks.items()}
+        
+        weights = (self.generation, idf, matrix_norms, block_norms)
+        self.weights = weights
+        return weights
+    
+    def search(self, text, top_k):
+        """The top_k chunks most similar to text, as (doc_name, chunk_index, similarity)"""
+        query = self.hasher.transform([text])
+        
+        with self.lock:
+            _, idf, matrix_norms, block_norms = self.current_weights()
+            
+            # Terms no chunk has are not in the vocabulary of a fitted model
+            terms = query.indices[self.df[query.indices] > 0]
+            weighted = query[0, terms].toarray().ravel() * idf[terms]
+            query_norm = np.sqrt(weighted @ weighted)
+            if not query_norm:
+                return []
+            vector = np.zeros(query.shape[1])
+            vector[terms] = weighted * idf[terms]
+            
+            candidates = []
+            parts = [(self.matrix, matrix_norms, self.rows, self.live)]
+            parts += [(counts, block_norms[doc_name], [(doc_name, i) for i in range(counts.shape[0])], None)
+                      for doc_name, counts in self.blocks.items()]
+            
+            for counts, norms, rows, live in parts:
+                if not counts.shape[0]:
+                    continue
+                similarity = np.divide(counts @ vector, norms * query_norm,
+                                       out=np.zeros(counts.shape[0]), where=norms > 0)
+                if live is not None:
+                    similarity[~live] = 0
+                best = np.argsort(similarity)[-top_k:]
+                candidates.extend((rows[i][0], rows[i][1], float(similarity[i])) for i in best)
+        
+        return sorted(candidates, key=lambda candidate: candidate[2], reverse=True)[:top_k]
+    
+    def compact(self):
+        """
+        Merge the added blocks into the matrix and drop tombstoned rows,
+        checking the maintained document frequencies against a recount.
+        Returns False when the index changed meanwhile and nothing was done.
+        """
+        with self.lock:
+            generation = self.generation
+            matrix, rows, live, blocks = self.matrix, self.rows, self.live, dict(self.blocks)
+        
+        # Stack outside the lock; queries and changes continue meanwhile
+        kept = np.flatnonzero(live)
+        parts = [matrix[kept]] + list(blocks.values())
+        merged = sp.vstack(parts, format='csr')
+        merged_rows = [rows[i] for i in kept]
+        for doc_name, counts in blocks.items():
+            merged_rows.extend((doc_name, i) for i in range(counts.shape[0]))
+        recount = np.bincount(merged.indices, minlength=merged.shape[1])
+        
+        doc_rows = {}
+        for number, (doc_name, _) in enumerate(merged_rows):
+            doc_rows.setdefault(doc_name, []).append(number)
+        
+        with self.lock:
+            if self.generation != generation:
+                return False
+            
+            if not np.array_equal(recount, self.df) or merged.shape[0] != self.chunk_count:
+                logger.error("Document frequencies drifted from the indexed chunks, using a recount")
+                self.df = recount
+                self.chunk_count = merged.shape[0]
+            
+            self.matrix = merged
+            self.rows = merged_rows
+            self.live = np.ones(merged.shape[0], dtype=bool)
+            self.doc_rows = {doc_name: np.array(numbers) for doc_name, numbers in doc_rows.items()}
+            self.blocks = {}
+            self.weights = None
+            return True
+    
+    def needs_compaction(self):
+        return bool(self.blocks) or not self.live.all()
+    
+    def matches(self, documents):
+        """
+        Whether the index agrees with a full rebuild from {doc_name: chunks}:
+        same chunks, same term counts and same document frequencies
+        """
+        rebuilt = IncrementalIndex.build(documents)
+        with self.lock:
+            if self.needs_compaction():
+                return None
+            matrix, rows, df = self.matrix, self.rows, self.df.copy()
+        
+        if rows != rebuilt.rows or not np.array_equal(df, rebuilt.df):
+            return False
+        return (matrix != rebuilt.matrix).nnz == 0
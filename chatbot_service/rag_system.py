@@ -1,10 +1,15 @@
 import os
+import time
 import pickle
+import hashlib
 import logging
+import threading
+import weakref
 import numpy as np
 from pathlib import Path
 import nltk
 from nltk.tokenize import sent_tokenize
+import sklearn
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import json
@@ -13,6 +18,8 @@ import csv
 import tempfile
 import subprocess
 
+from incremental_index import IncrementalIndex
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -29,6 +36,44 @@ except LookupError:
 # File to store document paths
 DOC_REGISTRY_FILE = "document_registry.pkl"
 
+# Parsed chunks of every document, by content hash, and the fitted TF-IDF
+# model, so a restart only parses new or changed files. Kept in the
+# service's data directory, which is a volume in Docker.
+RAG_CACHE_FILE = os.getenv('RAG_CACHE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'rag_cache.pkl'))
+
+# Bump when parsing, chunking or the vectorizer settings change
+RAG_CACHE_VERSION = 2
+
+# 'incremental' indexes added and removed documents without refitting, and
+# compacts the index every RAG_COMPACT_INTERVAL seconds in the background;
+# 'tfidf' refits a TfidfVectorizer over every chunk on each change
+RAG_INDEX_MODE = os.getenv('RAG_INDEX_MODE', 'incremental')
+RAG_COMPACT_INTERVAL = int(os.getenv('RAG_COMPACT_INTERVAL', 300))
+
+SUPPORTED_EXTENSIONS = ['.txt', '.pdf', '.doc', '.docx', '.csv', '.xls', '.xlsx']
+
+def file_sha256(file_path):
+    """Content hash of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def maintain_index_periodically(rag_ref):
+    """Maintain a RAGSystem's incremental index until the system is discarded"""
+    while True:
+        time.sleep(RAG_COMPACT_INTERVAL)
+        rag = rag_ref()
+        if rag is None:
+            return
+        
+        try:
+            rag.maintain_index()
+        except Exception as e:
+            logger.error(f"Error maintaining RAG index: {e}")
+        del rag
+
 class DocumentParser:
     """Handles parsing of different document formats into plain text"""
     
@@ -217,6 +262,10 @@ class RAGSystem:
         self.vectorizer = TfidfVectorizer(stop_words='english')
         self.document_vectors = None
         self.chunk_map = []  # Maps index to (doc_name, chunk_index)
+        self.document_hashes = {}  # Content hash of each loaded document
+        self.index = IncrementalIndex() if RAG_INDEX_MODE == 'incremental' else None
+        self.cache_dirty = False  # Incremental changes not saved to the cache yet
+        self.lock = threading.RLock()  # Keeps documents and the index in step
         
         # Create documents folder if it doesn't exist
         os.makedirs(self.docs_folder, exist_ok=True)
@@ -226,6 +275,10 @@ class RAGSystem:
         
         # Load existing documents
         self.load_documents()
+        
+        if self.index is not None:
+            # A weak reference, so a replaced system's thread ends
+            threading.Thread(target=maintain_index_periodically, args=(weakref.ref(self),), daemon=True).start()
     
     def load_document_registry(self):
         """Load the registry of document paths"""
@@ -249,32 +302,106 @@ class RAGSystem:
         except Exception as e:
             logger.error(f"Error saving document registry: {e}")
     
+    def load_cache(self):
+        """Load the cached chunks and model, or an empty cache if unusable"""
+        if not os.path.exists(RAG_CACHE_FILE):
+            return {}
+        
+        try:
+            with open(RAG_CACHE_FILE, 'rb') as f:
+                cache = pickle.load(f)
+        except Exception as e:
+            logger.error(f"Error loading RAG cache: {e}")
+            return {}
+        
+        # A model pickled by another scikit-learn version may not load correctly
+        if cache.get('version') != RAG_CACHE_VERSION or cache.get('sklearn') != sklearn.__version__:
+            logger.info("RAG cache is from another version, rebuilding it")
+            return {}
+        
+        # After a change of index mode only the parsed chunks can be used
+        if cache.get('mode') != RAG_INDEX_MODE:
+            return {'chunks': cache.get('chunks', {})}
+        
+        return cache
+    
+    def corpus_key(self):
+        """The loaded documents and their content, in vectorizing order"""
+        return [(name, self.document_hashes[name]) for name in self.documents]
+    
+    def save_cache(self):
+        """Persist the chunks of the loaded documents and the fitted model or index"""
+        with self.lock:
+            cache = {
+                'version': RAG_CACHE_VERSION,
+                'sklearn': sklearn.__version__,
+                'mode': RAG_INDEX_MODE,
+                'chunks': {self.document_hashes[name]: chunks for name, chunks in self.documents.items()},
+                'corpus': self.corpus_key()
+            }
+            if self.index is not None:
+                cache['index'] = self.index
+            else:
+                cache['vectorizer'] = self.vectorizer
+                cache['document_vectors'] = self.document_vectors
+                cache['chunk_map'] = self.chunk_map
+            cache = pickle.dumps(cache, protocol=pickle.HIGHEST_PROTOCOL)
+        
+        try:
+            # Written aside and renamed, so a crash never leaves half a cache
+            os.makedirs(os.path.dirname(os.path.abspath(RAG_CACHE_FILE)), exist_ok=True)
+            temp_file = f"{RAG_CACHE_FILE}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(cache)
+            os.replace(temp_file, RAG_CACHE_FILE)
+            logger.info(f"Saved RAG cache with {len(self.documents)} documents")
+        except Exception as e:
+            logger.error(f"Error saving RAG cache: {e}")
+    
     def load_documents(self):
-        """Load all documents from the documents folder and registry"""
-        # First load documents from the documents folder
-        supported_extensions = ['.txt', '.pdf', '.doc', '.docx', '.csv', '.xls', '.xlsx']
-        for ext in supported_extensions:
-            for file_path in Path(self.docs_folder).glob(f"*{ext}"):
-                self.add_document(str(file_path), register=False)  # Don't re-register folder docs
-        
-        # Then load documents from the registry
-        for file_path in self.document_paths:
-            if os.path.exists(file_path):
-                # Skip if already loaded from documents folder
-                folder_files = []
-                for ext in supported_extensions:
-                    folder_files.extend([str(p) for p in Path(self.docs_folder).glob(f"*{ext}")])
-                
-                if file_path not in folder_files:
-                    self.add_document(file_path, register=False)  # Already registered
+        """
+        Load all documents from the documents folder and registry. Files whose
+        content is in the cache are not parsed again, and the model is fitted
+        once, or not at all if no document changed.
+        """
+        cache = self.load_cache()
+        cached_chunks = cache.get('chunks', {})
+        
+        # First the documents folder, then registered documents outside it
+        folder_files = [str(p) for ext in SUPPORTED_EXTENSIONS for p in Path(self.docs_folder).glob(f"*{ext}")]
+        folder_paths = {os.path.abspath(file_path) for file_path in folder_files}
+        registry_files = [
+            file_path for file_path in self.document_paths
+            if os.path.exists(file_path) and os.path.abspath(file_path) not in folder_paths
+        ]
         
-        # Vectorize all documents
-        if self.documents:
+        for file_path in folder_files + registry_files:
+            # Folder documents aren't registered; registry documents already are
+            self.add_document(file_path, register=False, vectorize=False, cached_chunks=cached_chunks)
+        
+        if not self.documents:
+            return
+        
+        if cache.get('corpus') == self.corpus_key() and 'index' in cache:
+            self.index = cache['index']
+            logger.info(f"Reused the cached index of {self.index.chunk_count} document chunks")
+        elif cache.get('corpus') == self.corpus_key():
+            self.vectorizer = cache['vectorizer']
+            self.document_vectors = cache['document_vectors']
+            self.chunk_map = cache['chunk_map']
+            logger.info(f"Reused the cached model of {len(self.chunk_map)} document chunks")
+        else:
+            # Vectorize all documents
             self._vectorize_documents()
-            logger.info(f"Loaded {len(self.documents)} documents into RAG system")
+        
+        logger.info(f"Loaded {len(self.documents)} documents into RAG system")
     
-    def add_document(self, file_path, register=True):
-        """Add a document to the knowledge base"""
+    def add_document(self, file_path, register=True, vectorize=True, cached_chunks=None):
+        """
+        Add a document to the knowledge base. With vectorize=False the model
+        or index is left for the caller to rebuild; cached_chunks maps content
+        hashes to the chunks of documents parsed before.
+        """
         # Check if file exists
         if not os.path.exists(file_path):
             logger.error(f"Error: File not found at '{file_path}'")
@@ -290,39 +417,101 @@ class RAGSystem:
             ext = ext.lower()
             
             # Check supported extensions
-            supported_extensions = ['.txt', '.pdf', '.doc', '.docx', '.csv', '.xls', '.xlsx']
-            if ext not in supported_extensions:
+            if ext not in SUPPORTED_EXTENSIONS:
                 logger.error(f"Error: Unsupported file format {ext}")
                 return False
             
-            # Parse document based on type
-            try:
-                text = DocumentParser.parse_document(abs_path)
-            except ValueError as e:
-                logger.error(f"Error parsing document: {e}")
-                return False
-            except Exception as e:
-                logger.error(f"Unexpected error parsing document: {e}")
-                return False
+            # An unchanged document keeps the chunks parsed last time
+            file_hash = file_sha256(abs_path)
+            chunks = (cached_chunks or {}).get(file_hash)
+            
+            if chunks is None:
+                # Parse document based on type
+                try:
+                    text = DocumentParser.parse_document(abs_path)
+                except ValueError as e:
+                    logger.error(f"Error parsing document: {e}")
+                    return False
+                except Exception as e:
+                    logger.error(f"Unexpected error parsing document: {e}")
+                    return False
+                
+                chunks = self._split_into_chunks(text)
+                logger.info(f"Extracted {len(text)} characters, split into {len(chunks)} chunks")
             
             # Store document by filename
             filename = os.path.basename(file_path)
-            self.documents[filename] = self._split_into_chunks(text)
+            with self.lock:
+                self.documents[filename] = chunks
+                self.document_hashes[filename] = file_hash
+                
+                if vectorize and self.index is not None:
+                    # Only this document is indexed; compaction saves the cache
+                    self.index.add(filename, chunks)
+                    self.cache_dirty = True
             
             # Add to document registry if not already there
             if register and abs_path not in self.document_paths:
                 self.document_paths.append(abs_path)
                 self.save_document_registry()
-
-            self._vectorize_documents()
+            
+            if vectorize and self.index is None:
+                self._vectorize_documents()
             
             logger.info(f"Added document: {filename}")
-            logger.info(f"Extracted {len(text)} characters, split into {len(self.documents[filename])} chunks")
             return True
         except Exception as e:
             logger.error(f"Error adding document {file_path}: {str(e)}")
             return False
     
+    def remove_document(self, filename):
+        """Remove a loaded document from the knowledge base"""
+        with self.lock:
+            if filename not in self.documents:
+                return False
+            del self.documents[filename]
+            del self.document_hashes[filename]
+            
+            if self.index is not None:
+                self.index.remove(filename)
+                self.cache_dirty = True
+            else:
+                self._vectorize_documents()
+        
+        logger.info(f"Removed document: {filename}")
+        return True
+    
+    def maintain_index(self):
+        """
+        Compact the incremental index, check it against a full rebuild from
+        the loaded documents and save the cache, if documents changed since
+        the last run
+        """
+        index = self.index
+        if not self.cache_dirty:
+            return
+        
+        if index.needs_compaction() and not index.compact():
+            # Changed meanwhile; the next run compacts it
+            return
+        
+        with self.lock:
+            generation = index.generation
+            documents = dict(self.documents)
+        
+        consistent = index.matches(documents)
+        
+        with self.lock:
+            if self.index is not index or index.generation != generation:
+                return
+            if consistent is False:
+                logger.error("Incremental RAG index differs from a full rebuild, replacing it")
+                self.index = IncrementalIndex.build(documents)
+            self.cache_dirty = False
+        
+        logger.info(f"Compacted RAG index of {self.index.chunk_count} document chunks")
+        self.save_cache()
+    
     def _split_into_chunks(self, text, max_chunk_size=1000):
         """Split text into manageable chunks based on document type"""
         # Check if text has tabular format (indication of CSV/Excel)
@@ -381,6 +570,14 @@ class RAGSystem:
         
     def _vectorize_documents(self):
         """Create vector representations of all document chunks"""
+        if self.index is not None:
+            with self.lock:
+                self.index = IncrementalIndex.build(self.documents)
+                self.cache_dirty = False
+            logger.info(f"Indexed {self.index.chunk_count} document chunks")
+            self.save_cache()
+            return
+        
         all_chunks = []
         self.chunk_map = []  # Maps index to (doc_name, chunk_index)
         
@@ -395,10 +592,12 @@ class RAGSystem:
         else:
             self.document_vectors = None
             logger.warning("No document chunks to vectorize")
+        
+        self.save_cache()
     
     def query(self, query_text, top_k=3):
         """Find the most relevant document chunks for a query"""
-        if not self.documents or self.document_vectors is None:
+        if not self.documents or (self.index is None and self.document_vectors is None):
             logger.warning("No documents available for querying")
             return []
         
@@ -413,21 +612,27 @@ class RAGSystem:
         elif 'allerg' in query_text.lower() or 'diet' in query_text.lower():
             expanded_query += " allergens dietary vegetarian vegan gluten"
             
-        # Vectorize the query
-        query_vector = self.vectorizer.transform([expanded_query])
-        
-        # Calculate similarity with all chunks
-        similarities = cosine_similarity(query_vector, self.document_vectors).flatten()
-        
-        # Get indices of top_k most similar chunks
-        top_indices = similarities.argsort()[-top_k:][::-1]
+        if self.index is not None:
+            top_chunks = self.index.search(expanded_query, top_k)
+        else:
+            # Vectorize the query
+            query_vector = self.vectorizer.transform([expanded_query])
+            
+            # Calculate similarity with all chunks
+            similarities = cosine_similarity(query_vector, self.document_vectors).flatten()
+            
+            # Get indices of top_k most similar chunks
+            top_indices = similarities.argsort()[-top_k:][::-1]
+            top_chunks = [(*self.chunk_map[idx], similarities[idx]) for idx in top_indices]
         
         # Return the relevant chunks with their similarity scores
         results = []
-        for idx in top_indices:
-            doc_name, chunk_idx = self.chunk_map[idx]
-            chunk_text = self.documents[doc_name][chunk_idx]
-            similarity = similarities[idx]
+        for doc_name, chunk_idx, similarity in top_chunks:
+            chunks = self.documents.get(doc_name)
+            if chunks is None:
+                # Removed while querying
+                continue
+            chunk_text = chunks[chunk_idx]
             
             # Only include chunks with meaningful similarity
             if similarity > 0.05:  # Lower threshold to ensure we get some results
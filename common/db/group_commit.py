@@ -0,0 +1,106 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+from .pool import get_connection, retry_on_busy
+
+logger = logging.getLogger(__name__)
+
+# Group commit tuning: most operations per transaction, and how long the
+# writer waits for more operations after the first one arrives
+GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', 256))
+GROUP_COMMIT_WINDOW_MS = float(os.getenv('GROUP_COMMIT_WINDOW_MS', 2))
+
+class GroupCommitWriter:
+    """
+    Single writer thread for one database file. Request threads submit write
+    operations, functions taking a cursor, and the writer applies everything
+    that is pending in one transaction and one commit. Each operation runs in
+    its own savepoint, so a failing operation only fails its own caller.
+    
+    Operations must not commit, and are run again if the whole transaction is
+    retried because the database was busy.
+    """
+    
+    def __init__(self, database, max_batch=GROUP_COMMIT_MAX_BATCH, window_ms=GROUP_COMMIT_WINDOW_MS):
+        self.database = database
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name=f"group-commit-{database}", daemon=True)
+        self.thread.start()
+    
+    def submit(self, operation, *args):
+        """Queue an operation and return a Future for its result"""
+        future = Future()
+        self.pending.put((operation, args, future))
+        return future
+    
+    def execute(self, operation, *args):
+        """Run an operation in the next group transaction and wait for its result"""
+        return self.submit(operation, *args).result()
+    
+    def collect_batch(self):
+        """Wait for an operation, then gather what arrives within the window"""
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.window
+        
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.pending.get(timeout=remaining))
+                else:
+                    batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    @retry_on_busy
+    def apply_batch(self, batch):
+        """
+        Apply a batch in one transaction. Returns a (result, error) pair per
+        operation; nothing is visible to the callers before the commit.
+        """
+        conn = get_connection(self.database)
+        cursor = conn.cursor()
+        outcomes = []
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            for operation, args, future in batch:
+                cursor.execute("SAVEPOINT operation")
+                try:
+                    outcomes.append((operation(cursor, *args), None))
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO operation")
+                    outcomes.append((None, e))
+                cursor.execute("RELEASE operation")
+            
+            conn.commit()
+            return outcomes
+        
+        finally:
+            # Rolls back an unfinished transaction
+            conn.close()
+    
+    def run(self):
+        while True:
+            batch = self.collect_batch()
+            
+            try:
+                outcomes = self.apply_batch(batch)
+            except Exception as e:
+                logger.error(f"Group commit of {len(batch)} operations on {self.database} failed: {e}")
+                outcomes = [(None, e)] * len(batch)
+            
+            for (operation, args, future), (result, error) in zip(batch, outcomes):
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
@@ -0,0 +1,154 @@
+import os
+import time
+import hashlib
+import logging
+from functools import wraps
+
+from .pool import get_connection, retry_on_busy
+
+logger = logging.getLogger(__name__)
+
+# How long a stored response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 24 * 60 * 60))
+
+# How long a key stays claimed by a request that has not stored a response.
+# A worker killed mid-request leaves its claim behind; once the lease runs
+# out, a retry takes the key over instead of getting 409 until the ttl.
+IDEMPOTENCY_LEASE = int(os.getenv('IDEMPOTENCY_LEASE_SECONDS', 60))
+
+def create_idempotency_table(cursor):
+    """Create the table that stores the responses of idempotent requests"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        request_hash TEXT NOT NULL,
+        status_code INTEGER,
+        content_type TEXT,
+        response_body TEXT,
+        created_at INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires
+    ON idempotency_keys (expires_at)
+    ''')
+
+def hash_request(request):
+    """Hash the parts of a request a replay must repeat exactly"""
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+@retry_on_busy
+def claim_key(database, key, request_hash, lease=IDEMPOTENCY_LEASE):
+    """
+    Claim an idempotency key for a request for `lease` seconds. Returns None
+    when the caller now owns the key, or the stored row of an earlier
+    request with it.
+    """
+    conn = get_connection(database)
+    cursor = conn.cursor()
+    now = int(time.time())
+    
+    try:
+        # Expired keys, and claims whose lease ran out, are dropped as new
+        # ones are claimed
+        cursor.execute("DELETE FROM idempotency_keys WHERE expires_at < ?", (now,))
+        
+        cursor.execute("""
+            INSERT OR IGNORE INTO idempotency_keys (key, request_hash, created_at, expires_at)
+            VALUES (?, ?, ?, ?)
+        """, (key, request_hash, now, now + lease))
+        claimed = cursor.rowcount == 1
+        conn.commit()
+        
+        if claimed:
+            return None
+        
+        cursor.execute("""
+            SELECT request_hash, status_code, content_type, response_body
+            FROM idempotency_keys
+            WHERE key = ?
+        """, (key,))
+        return cursor.fetchone()
+    
+    finally:
+        conn.close()
+
+@retry_on_busy
+def store_response(database, key, response, ttl):
+    """Store the response of the request that owns a key, kept for `ttl` seconds"""
+    conn = get_connection(database)
+    try:
+        conn.execute("""
+            UPDATE idempotency_keys
+            SET status_code = ?, content_type = ?, response_body = ?, expires_at = ?
+            WHERE key = ?
+        """, (response.status_code, response.content_type, response.get_data(as_text=True),
+              int(time.time()) + ttl, key))
+        conn.commit()
+    finally:
+        conn.close()
+
+@retry_on_busy
+def release_key(database, key):
+    """Forget a key so the request can be retried, e.g. after a server error"""
+    conn = get_connection(database)
+    try:
+        conn.execute("DELETE FROM idempotency_keys WHERE key = ?", (key,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def idempotent(database, ttl=IDEMPOTENCY_TTL):
+    """
+    Honor the Idempotency-Key header on a Flask view. The first request with
+    a key runs the view and stores its response; repeats of the same request
+    get the stored response without running the view again. A key reused for
+    a different request is rejected with 422, and a repeat that arrives while
+    the first request is still running gets 409, until its IDEMPOTENCY_LEASE
+    runs out.
+    
+    Server errors are not stored, so the client can retry them.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import request, jsonify, make_response
+            
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return view(*args, **kwargs)
+            
+            request_hash = hash_request(request)
+            stored = claim_key(database, key, request_hash)
+            
+            if stored is not None:
+                if stored['request_hash'] != request_hash:
+                    return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+                if stored['status_code'] is None:
+                    return jsonify({"error": "A request with this Idempotency-Key is still being processed"}), 409
+                
+                logger.info(f"Replaying stored response for Idempotency-Key {key}")
+                response = make_response(stored['response_body'], stored['status_code'])
+                response.content_type = stored['content_type']
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                release_key(database, key)
+                raise
+            
+            if response.status_code >= 500:
+                release_key(database, key)
+            else:
+                store_response(database, key, response, ttl)
+            
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,178 @@
+import sqlite3
+import os
+import time
+import queue
+import logging
+import threading
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# SQLite tuning parameters
+POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 8))
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16384))
+MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+BUSY_RETRIES = int(os.getenv('SQLITE_BUSY_RETRIES', 3))
+
+class PooledConnection:
+    """
+    One checkout of a pooled SQLite connection. Closing it returns the
+    connection to its pool and detaches this handle, so a stale second
+    close() can't release the connection again after another thread has
+    checked it out.
+    """
+    
+    def __init__(self, pool, conn):
+        object.__setattr__(self, 'pool', pool)
+        object.__setattr__(self, 'conn', conn)
+    
+    def __getattr__(self, name):
+        return getattr(self.checked_out(), name)
+    
+    def __setattr__(self, name, value):
+        setattr(self.checked_out(), name, value)
+    
+    def __enter__(self):
+        self.checked_out().__enter__()
+        return self
+    
+    def __exit__(self, *exc_info):
+        return self.checked_out().__exit__(*exc_info)
+    
+    def checked_out(self):
+        """The underlying connection, while this checkout holds it"""
+        conn = self.conn
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return conn
+    
+    def close(self):
+        """Return the connection to its pool instead of closing it"""
+        conn = self.conn
+        if conn is not None:
+            object.__setattr__(self, 'conn', None)
+            self.pool.release(conn)
+
+class ConnectionPool:
+    """
+    Pool of idle SQLite connections for one database file. Connections are
+    opened in WAL mode with tuned PRAGMAs and handed out to one thread (or
+    greenlet) at a time.
+    """
+    
+    def __init__(self, database, size=POOL_SIZE):
+        self.database = database
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.wal_enabled = False
+    
+    def create_connection(self):
+        """Open a new connection with the pool's PRAGMAs applied"""
+        conn = sqlite3.connect(
+            self.database,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        
+        # WAL is persistent in the database file, so it only needs setting once
+        with self.lock:
+            if not self.wal_enabled:
+                mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+                if mode.lower() != 'wal':
+                    logger.warning(f"Could not enable WAL for {self.database}, journal mode is {mode}")
+                self.wal_enabled = True
+        
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+    
+    def connect(self):
+        """Check out an idle connection, opening a new one if none is idle"""
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self.create_connection()
+        
+        return PooledConnection(self, conn)
+    
+    def release(self, conn):
+        """Take a connection back, discarding any uncommitted work"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Discarding broken connection to {self.database}: {e}")
+            conn.close()
+            return
+        
+        # Keep at most `size` idle connections around
+        if self.idle.qsize() < self.size:
+            self.idle.put(conn)
+        else:
+            conn.close()
+    
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+# Pools by database path
+pools = {}
+pools_lock = threading.Lock()
+
+def get_pool(database):
+    """Get the connection pool for a database file"""
+    with pools_lock:
+        if database not in pools:
+            pools[database] = ConnectionPool(database)
+            logger.info(f"Created SQLite connection pool for {database}")
+        return pools[database]
+
+def get_connection(database):
+    """
+    Get a pooled connection to a database file. Calling close() on it
+    returns it to the pool.
+    """
+    return get_pool(database).connect()
+
+def is_busy_error(error):
+    """Check whether an error means the database was locked by another writer"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and (
+        'database is locked' in message or 'database is busy' in message
+    )
+
+def retry_on_busy(func=None, retries=BUSY_RETRIES, delay=0.05):
+    """
+    Retry a function when SQLite reports the database as locked, with
+    exponential backoff. The function must be safe to run again, e.g. a
+    single transaction that is rolled back on failure.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if not is_busy_error(e) or attempt >= retries:
+                        raise
+                    attempt += 1
+                    wait_time = delay * (2 ** attempt)
+                    logger.warning(f"Database busy in {func.__name__}: {e}. Retrying in {wait_time:.2f}s...")
+                    time.sleep(wait_time)
+        return wrapper
+    
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -0,0 +1,38 @@
+# Device roles that receive the order events of every table
+STAFF_ROLES = {'kitchen', 'waiter', 'manager', 'admin'}
+
+def build_order_delta(payload):
+    """Build the order delta pushed to clients from an order event payload"""
+    delta = {'order_id': payload.get('order_id')}
+    
+    # Order events carry the full order state and its version, so clients
+    # can apply the change without fetching the order again
+    if payload.get('order'):
+        delta['version'] = payload.get('version')
+        delta['order'] = payload['order']
+    
+    return delta
+
+def order_table_number(payload):
+    """Table number of the order an event is about"""
+    table_number = payload.get('table_number')
+    if table_number is None:
+        table_number = (payload.get('order') or {}).get('table_number')
+    return table_number
+
+def staff_devices(connected_devices):
+    """Sids of the staff devices"""
+    # Copied, as devices connect and disconnect while events are sent
+    return [sid for sid, device in list(connected_devices.items())
+            if device.get('role') in STAFF_ROLES]
+
+def table_devices(connected_devices, table_number):
+    """Sids of the customer devices registered for a table"""
+    if table_number is None:
+        return []
+    return [sid for sid, device in list(connected_devices.items())
+            if device.get('role') == 'customer' and str(device.get('table_number')) == str(table_number)]
+
+def order_recipients(connected_devices, payload):
+    """Sids allowed to receive an order event: staff and the order's table"""
+    return staff_devices(connected_devices) + table_devices(connected_devices, order_table_number(payload))
@@ -4,6 +4,8 @@ import os
 import time
 import logging
 import uuid
+import threading
+from collections import deque
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +16,13 @@ RABBITMQ_USER = os.getenv('RABBITMQ_USER', 'guest')
 RABBITMQ_PASS = os.getenv('RABBITMQ_PASS', 'guest')
 EXCHANGE_NAME = 'restaurant_events'
 
+# Background publishing: most events sent per batch, events kept in memory
+# while RabbitMQ is unreachable (the oldest are dropped beyond that), and how
+# often an idle connection services its heartbeats
+EVENT_BATCH_SIZE = int(os.getenv('EVENT_BATCH_SIZE', 100))
+EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', 10000))
+EVENT_IDLE_SECONDS = 30
+
 def get_connection():
     """Create a connection to RabbitMQ"""
     credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
@@ -42,6 +51,34 @@ def get_connection():
     logger.error(f"Failed to connect to RabbitMQ after {max_retries} attempts")
     raise Exception("Could not connect to RabbitMQ")
 
+def build_message(event_type, payload):
+    """Wrap an event payload with its metadata"""
+    return {
+        "event_id": str(uuid.uuid4()),
+        "event_type": event_type,
+        "timestamp": int(time.time()),
+        "service": os.getenv('SERVICE_NAME', 'unknown'),
+        "payload": payload
+    }
+
+def declare_exchange(channel):
+    channel.exchange_declare(
+        exchange=EXCHANGE_NAME,
+        exchange_type='topic',
+        durable=True
+    )
+
+def send_message(channel, message):
+    channel.basic_publish(
+        exchange=EXCHANGE_NAME,
+        routing_key=message['event_type'],
+        body=json.dumps(message),
+        properties=pika.BasicProperties(
+            delivery_mode=2,  # Make message persistent
+            content_type='application/json'
+        )
+    )
+
 def publish_event(event_type, payload):
     """Publish an event to the event bus"""
     try:
@@ -49,31 +86,10 @@ def publish_event(event_type, payload):
         channel = connection.channel()
         
         # Declare the exchange
-        channel.exchange_declare(
-            exchange=EXCHANGE_NAME,
-            exchange_type='topic',
-            durable=True
-        )
-        
-        # Create the message with metadata
-        message = {
-            "event_id": str(uuid.uuid4()),
-            "event_type": event_type,
-            "timestamp": int(time.time()),
-            "service": os.getenv('SERVICE_NAME', 'unknown'),
-            "payload": payload
-        }
+        declare_exchange(channel)
         
-        # Publish the message
-        channel.basic_publish(
-            exchange=EXCHANGE_NAME,
-            routing_key=event_type,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(
-                delivery_mode=2,  # Make message persistent
-                content_type='application/json'
-            )
-        )
+        # Publish the message with its metadata
+        send_message(channel, build_message(event_type, payload))
         
         logger.info(f"Published event {event_type}: {payload}")
         connection.close()
@@ -81,4 +97,106 @@ def publish_event(event_type, payload):
     
     except Exception as e:
         logger.error(f"Failed to publish event {event_type}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+class EventPublisher:
+    """
+    Publishes events from a background thread over one long-lived
+    connection, so callers only queue them and never wait for RabbitMQ.
+    Events queued while a batch is being sent go out together in the next
+    one. When RabbitMQ is unreachable events wait in memory, in order, and
+    the unsent ones are retried after reconnecting.
+    """
+    
+    def __init__(self, max_batch=EVENT_BATCH_SIZE, max_pending=EVENT_QUEUE_SIZE):
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.connection = None
+        self.channel = None
+        self.thread = threading.Thread(target=self.run, name="event-publisher", daemon=True)
+        self.thread.start()
+    
+    def publish(self, event_type, payload):
+        """Queue an event for publishing and return at once"""
+        message = build_message(event_type, payload)
+        with self.condition:
+            if len(self.pending) >= self.max_pending:
+                dropped = self.pending.popleft()
+                logger.error(f"Event queue full, dropped event {dropped['event_type']}")
+            self.pending.append(message)
+            self.condition.notify()
+        return True
+    
+    def collect_batch(self):
+        """Wait for events and take up to max_batch; empty if none came while idle"""
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout=EVENT_IDLE_SECONDS)
+            count = min(len(self.pending), self.max_batch)
+            return [self.pending.popleft() for _ in range(count)]
+    
+    def requeue(self, messages):
+        """Put unsent events back in front of the queue, keeping their order"""
+        with self.condition:
+            self.pending.extendleft(reversed(messages))
+            while len(self.pending) > self.max_pending:
+                dropped = self.pending.popleft()
+                logger.error(f"Event queue full, dropped event {dropped['event_type']}")
+    
+    def keep_alive(self):
+        # A BlockingConnection only answers heartbeats while it is used
+        try:
+            if self.connection is not None and self.connection.is_open:
+                self.connection.process_data_events(time_limit=0)
+        except Exception as e:
+            logger.warning(f"Event publisher connection lost: {e}")
+            self.connection = None
+    
+    def connect(self):
+        if self.connection is None or self.connection.is_closed:
+            self.connection = get_connection()
+            self.channel = self.connection.channel()
+            declare_exchange(self.channel)
+    
+    def run(self):
+        while True:
+            batch = self.collect_batch()
+            if not batch:
+                self.keep_alive()
+                continue
+            sent = 0
+            
+            try:
+                self.connect()
+                for message in batch:
+                    send_message(self.channel, message)
+                    sent += 1
+                logger.info(f"Published {sent} events: {', '.join(message['event_type'] for message in batch)}")
+            
+            except Exception as e:
+                logger.error(f"Failed to publish {len(batch) - sent} events: {e}")
+                self.requeue(batch[sent:])
+                try:
+                    if self.connection is not None and self.connection.is_open:
+                        self.connection.close()
+                except Exception:
+                    pass
+                self.connection = None
+                time.sleep(EVENT_IDLE_SECONDS / 10)
+
+event_publisher = None
+event_publisher_lock = threading.Lock()
+
+def publish_event_async(event_type, payload):
+    """
+    Queue an event on this process's background publisher and return
+    without waiting for RabbitMQ
+    """
+    global event_publisher
+    if event_publisher is None:
+        with event_publisher_lock:
+            if event_publisher is None:
+                event_publisher = EventPublisher()
+    return event_publisher.publish(event_type, payload)
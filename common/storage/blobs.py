@@ -0,0 +1,104 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Blobs are named by the SHA-256 of their content and an extension
+BLOB_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+# Unreferenced blobs younger than this are kept: an upload is referenced
+# only once the item or promo using it is saved
+BLOB_GC_GRACE_SECONDS = int(os.getenv('BLOB_GC_GRACE_SECONDS', 86400))
+
+CHUNK_SIZE = 64 * 1024
+
+def default_file_mode():
+    """Mode open() gives new files under the process umask"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+# mkstemp creates files readable by their owner only, but the upload folders
+# are shared mounts served by other processes, so blobs get the usual mode
+BLOB_FILE_MODE = default_file_mode()
+
+def blob_extension(filename):
+    """Normalized extension of an uploaded file's name"""
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+    return 'jpg' if ext == 'jpeg' else ext
+
+def commit_blob(temp_path, digest, folder, ext):
+    """Give a written temporary file its content address, keeping one copy"""
+    filename = f"{digest}.{ext}"
+    path = os.path.join(folder, filename)
+    
+    if os.path.exists(path):
+        os.remove(temp_path)
+        # Restart the grace period of a blob that is being reused
+        os.utime(path)
+    else:
+        os.chmod(temp_path, BLOB_FILE_MODE)
+        os.replace(temp_path, path)
+    
+    return filename
+
+def store_stream(stream, folder, ext):
+    """
+    Copy a file-like object into folder, hashing it on the way, and return
+    its blob filename. The content goes to a temporary file in the same
+    folder and is renamed to its hash, so nothing is read twice and a blob is
+    never visible half-written.
+    """
+    os.makedirs(folder, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        return commit_blob(temp_path, digest.hexdigest(), folder, ext)
+    
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def store_bytes(data, folder, ext):
+    """Store bytes as a blob in folder and return its filename"""
+    os.makedirs(folder, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return commit_blob(temp_path, hashlib.sha256(data).hexdigest(), folder, ext)
+
+def collect_garbage(folder, referenced, grace_seconds=BLOB_GC_GRACE_SECONDS):
+    """
+    Delete the blobs in folder whose filenames are not in referenced and
+    that are older than the grace period. Files not named like blobs are
+    never touched. Returns the number of blobs deleted.
+    """
+    if not os.path.isdir(folder):
+        return 0
+    
+    cutoff = time.time() - grace_seconds
+    deleted = 0
+    
+    for entry in os.scandir(folder):
+        if not entry.is_file() or not BLOB_NAME.match(entry.name) or entry.name in referenced:
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                deleted += 1
+        except FileNotFoundError:
+            pass
+    
+    if deleted:
+        logger.info(f"Deleted {deleted} unreferenced blobs from {folder}")
+    return deleted
@@ -5,12 +5,14 @@ import json
 import logging
 import sys
 import time
+import threading
 from werkzeug.utils import secure_filename
 
 # Add common directory to path for event modules
 sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
 from events.producer import publish_event
 from events.consumer import setup_consumer, register_event_handler
+from storage.blobs import blob_extension, store_stream, collect_garbage
 
 # Set up logging
 logging.basicConfig(
@@ -28,6 +30,11 @@ PROMO_FOLDER = 'static/images/promo'
 PROMO_CONFIG_FILE = 'promo_config.json'
 STATIC_CONTENT_FOLDER = 'static/content'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+PROMO_UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads/promo')
+
+# Uploaded banners that are no longer the current promo are deleted every
+# BLOB_GC_INTERVAL seconds (0 disables it)
+BLOB_GC_INTERVAL = int(os.getenv('BLOB_GC_INTERVAL', 21600))
 
 # Create required directories
 os.makedirs(PROMO_FOLDER, exist_ok=True)
@@ -92,16 +99,8 @@ def upload_promo_banner():
         return jsonify({"error": "No selected file"}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        # Add timestamp to ensure uniqueness
-        filename = f"promo_{int(time.time())}_{filename}"
-        
-        # Make sure promo folder exists
-        upload_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads/promo')
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
+        # Stored once per content, named by its SHA-256
+        filename = store_stream(file.stream, PROMO_UPLOAD_FOLDER, blob_extension(file.filename))
         
         # Get the relative path for the database
         relative_path = f"/uploads/promo/{filename}"
@@ -187,7 +186,7 @@ def ensure_default_promo():
             os.makedirs(os.path.dirname(default_promo_path), exist_ok=True)
             img.save(default_promo_path)
             logger.info(f"Created default promo image at {default_promo_path}")
-            
+        
         except Exception as e:
             logger.error(f"Error creating default promo image: {e}")
             
@@ -353,6 +352,20 @@ def list_content():
     
     return jsonify(content_files)
 
+def collect_promo_garbage_periodically():
+    """Delete uploaded banners other than the current promo every BLOB_GC_INTERVAL seconds"""
+    while True:
+        time.sleep(BLOB_GC_INTERVAL)
+        
+        try:
+            current_promo = get_promo_config().get('current_promo', '')
+            collect_garbage(PROMO_UPLOAD_FOLDER, {os.path.basename(current_promo)})
+        except Exception as e:
+            logger.error(f"Error collecting unreferenced promo banners: {e}")
+
+if BLOB_GC_INTERVAL > 0:
+    threading.Thread(target=collect_promo_garbage_periodically, daemon=True).start()
+
 # Event handlers
 def handle_order_created(payload):
     """Handle order_created event"""
@@ -1,13 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import sqlite3
+import requests
+import io
 import os
+import json
 import time
-from werkzeug.utils import secure_filename
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import logging
 import sys
-import pandas
-import openpyxl
+
+# Add common directory to path for shared modules
+sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
+from db.pool import get_connection, retry_on_busy
+from events.producer import publish_event_async
+from events.consumer import setup_consumer, register_event_handler
+from storage.blobs import BLOB_GC_GRACE_SECONDS, blob_extension, store_stream, collect_garbage
+from menu_import import (
+    MAX_REPORTED_ERRORS, ensure_unique_names, iter_menu_chunks, normalize_menu_frame, merge_menu_rows
+)
+from images import generate_variants
+from search import create_search_index, save_translations, search_menu
+from changes import create_change_log, menu_version, changed_items
+
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
@@ -19,11 +39,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create a dummy event producer for now
-def publish_event(event_type, payload):
-    logger.info(f"Would publish event {event_type}: {payload}")
-    return True
-
 # Configuration
 DATABASE = os.getenv('DATABASE_FILE', 'menu.db')
 UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'static/images/menu')
@@ -31,18 +46,43 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
 
+# Price after discount, rounded to cents: the one price clients, orders and
+# reports use
+EFFECTIVE_PRICE_SQL = "ROUND(price * (100 - COALESCE(discount_percentage, 0)) / 100.0, 2)"
+
+# Uploaded menu photos are served from MENU_IMAGE_URL; their resized
+# variants go to a subfolder, generated by IMAGE_WORKERS background threads
+MENU_IMAGE_URL = '/static/images/menu'
+IMAGE_VARIANTS_FOLDER = os.path.join(UPLOAD_FOLDER, 'variants')
+IMAGE_VARIANTS_URL = f"{MENU_IMAGE_URL}/variants"
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Photos and variants no menu item uses are deleted every BLOB_GC_INTERVAL
+# seconds (0 disables it)
+BLOB_GC_INTERVAL = int(os.getenv('BLOB_GC_INTERVAL', 21600))
+
+# Menu imports: rows validated and committed together, and how many
+# finished import jobs the status endpoint remembers
+MENU_IMPORT_CHUNK_SIZE = int(os.getenv('MENU_IMPORT_CHUNK_SIZE', 1000))
+MENU_IMPORT_JOBS_KEPT = int(os.getenv('MENU_IMPORT_JOBS_KEPT', 20))
+IMPORT_FILE_TYPES = ['xlsx', 'csv']
+
+# Translated names and descriptions are indexed for search
+TRANSLATION_SERVICE_URL = os.getenv('TRANSLATION_SERVICE_URL', 'http://translation_service:5007')
+SEARCH_MAX_RESULTS = 100
+
 # Database setup
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled WAL-mode connection; close() hands it back to the pool
+    return get_connection(DATABASE)
 
+@retry_on_busy
 def create_tables():
     conn = get_db_connection()
     cursor = conn.cursor()
     
     # Create menu items table
-    cursor.execute('''
+    cursor.execute(f'''
     CREATE TABLE IF NOT EXISTS menu_items (
         id INTEGER PRIMARY KEY,
         name TEXT NOT NULL,
@@ -52,10 +92,36 @@ def create_tables():
         image_path TEXT,
         best_seller BOOLEAN DEFAULT 0,
         discount_percentage INTEGER DEFAULT 0,
-        available BOOLEAN DEFAULT 1
+        available BOOLEAN DEFAULT 1,
+        effective_price REAL GENERATED ALWAYS AS ({EFFECTIVE_PRICE_SQL}) STORED
     )
     ''')
     
+    # SQLite can only add a virtual generated column to an existing table
+    cursor.execute("PRAGMA table_xinfo(menu_items)")
+    if 'effective_price' not in [row['name'] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE menu_items ADD COLUMN effective_price REAL GENERATED ALWAYS AS ({EFFECTIVE_PRICE_SQL}) VIRTUAL")
+    
+    # Resized variants of uploaded photos, by the image_path they were made from
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS menu_images (
+        image_path TEXT PRIMARY KEY,
+        variants TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Versioned log of item changes, for clients syncing by deltas
+    create_change_log(cursor)
+    
+    # Full-text search over names, descriptions and their translations
+    create_search_index(cursor)
+    
+    # Imports merge on the item name, which needs names to be unique
+    duplicates = ensure_unique_names(cursor)
+    if duplicates:
+        logger.warning(f"Menu item names used more than once, imports are disabled until renamed: {duplicates}")
+    
     conn.commit()
     conn.close()
     logger.info("Database tables created or confirmed")
@@ -96,9 +162,240 @@ def insert_sample_data():
 # Insert sample data on startup
 insert_sample_data()
 
+# Immutable snapshot of the menu, replaced as a whole after every write. It
+# holds the JSON of the full menu, of each category, of each item and of the
+# category summaries, encoded once, with their ETags.
+menu_snapshot = None
+menu_snapshot_lock = threading.Lock()
+
+def encode_json(value):
+    """Encode a value the way jsonify does, returning the body and its ETag"""
+    body = app.json.dumps(value).encode()
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+def rebuild_menu_snapshot():
+    """Load the menu from the database and swap in a new snapshot of it. Returns its version."""
+    global menu_snapshot
+    
+    # Serialized, so a rebuild never replaces a newer snapshot
+    with menu_snapshot_lock:
+        conn = get_db_connection()
+        try:
+            # One read transaction, so the items are exactly those of the version
+            conn.execute("BEGIN")
+            rows = conn.execute("""
+                SELECT m.*, i.variants AS image_variants
+                FROM menu_items m
+                LEFT JOIN menu_images i ON i.image_path = m.image_path
+                ORDER BY m.category, m.name
+            """).fetchall()
+            stats = conn.execute("""
+                SELECT category,
+                       COUNT(*) AS item_count,
+                       SUM(CASE WHEN available THEN 1 ELSE 0 END) AS available_count,
+                       MIN(effective_price) AS min_price,
+                       MAX(effective_price) AS max_price
+                FROM menu_items
+                GROUP BY category
+                ORDER BY category
+            """).fetchall()
+            version = menu_version(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        
+        items = []
+        categories = {}
+        for row in rows:
+            item = dict(row)
+            # Make sure available is explicitly set to a boolean for JSON
+            item['available'] = bool(item['available'])
+            item['best_seller'] = bool(item['best_seller'])
+            # Null until the photo's variants are generated
+            item['image_variants'] = json.loads(item['image_variants']) if item['image_variants'] else None
+            items.append(item)
+            categories.setdefault(item['category'], []).append(item)
+        
+        snapshot = {
+            'menu': encode_json(items),
+            'categories': {category: encode_json(category_items) for category, category_items in categories.items()},
+            'items': {item['id']: encode_json(item) for item in items},
+            'category_stats': encode_json([dict(row) for row in stats]),
+            'version': version
+        }
+        menu_snapshot = snapshot
+    
+    logger.info(f"Menu snapshot rebuilt with {len(items)} items at version {version}, ETag {snapshot['menu'][1]}")
+    return version
+
+def snapshot_response(body, etag):
+    """Serve pre-encoded JSON, or 304 if the client already has this version"""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+rebuild_menu_snapshot()
+
+image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='menu-image')
+
+def image_file(image_path):
+    """Local file of an uploaded photo's path, or None for other images"""
+    if not image_path or not image_path.startswith(f"{MENU_IMAGE_URL}/"):
+        return None
+    file_path = os.path.join(UPLOAD_FOLDER, os.path.basename(image_path))
+    return file_path if os.path.isfile(file_path) else None
+
+def process_menu_image(image_path):
+    """Generate and record the variants of an uploaded photo"""
+    try:
+        # Uploads are content-addressed, so a photo uploaded again has them
+        conn = get_db_connection()
+        try:
+            if conn.execute("SELECT 1 FROM menu_images WHERE image_path = ?", (image_path,)).fetchone():
+                return
+        finally:
+            conn.close()
+        
+        variants = generate_variants(image_file(image_path), IMAGE_VARIANTS_FOLDER, IMAGE_VARIANTS_URL)
+        
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO menu_images (image_path, variants) VALUES (?, ?)",
+                (image_path, json.dumps(variants))
+            )
+            conn.commit()
+            in_use = conn.execute("SELECT 1 FROM menu_items WHERE image_path = ? LIMIT 1", (image_path,)).fetchone()
+        finally:
+            conn.close()
+        
+        # Items saved before the variants were ready get them now
+        if in_use:
+            rebuild_menu_snapshot()
+        logger.info(f"Generated image variants for {image_path}")
+    
+    except Exception as e:
+        logger.error(f"Could not generate image variants for {image_path}: {e}")
+
+def queue_image_variants(image_path):
+    """Generate an uploaded photo's variants off the request thread"""
+    if image_file(image_path):
+        image_pool.submit(process_menu_image, image_path)
+
+def queue_missing_image_variants():
+    """Queue the photos of menu items that have no variants yet"""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute("""
+            SELECT DISTINCT image_path FROM menu_items
+            WHERE image_path != '' AND image_path NOT IN (SELECT image_path FROM menu_images)
+        """).fetchall()
+    finally:
+        conn.close()
+    
+    for row in rows:
+        queue_image_variants(row['image_path'])
+
+queue_missing_image_variants()
+
+@retry_on_busy
+def referenced_image_files():
+    """
+    Forget the variants of photos no menu item has used for the grace period,
+    then return the filenames of the photos and variants still referenced
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute("""
+            DELETE FROM menu_images
+            WHERE image_path NOT IN (SELECT image_path FROM menu_items WHERE image_path IS NOT NULL)
+              AND created_at < datetime('now', ?)
+        """, (f"-{BLOB_GC_GRACE_SECONDS} seconds",))
+        conn.commit()
+        
+        referenced = {
+            os.path.basename(row['image_path'])
+            for row in conn.execute("SELECT image_path FROM menu_items WHERE image_path != ''")
+        }
+        for row in conn.execute("SELECT variants FROM menu_images"):
+            for variant in json.loads(row['variants']).values():
+                referenced.update(os.path.basename(variant[encoding]) for encoding in ('webp', 'jpeg'))
+        return referenced
+    finally:
+        conn.close()
+
+def collect_image_garbage_periodically():
+    """Delete unreferenced photos and variants every BLOB_GC_INTERVAL seconds"""
+    while True:
+        time.sleep(BLOB_GC_INTERVAL)
+        
+        try:
+            referenced = referenced_image_files()
+            collect_garbage(UPLOAD_FOLDER, referenced)
+            collect_garbage(IMAGE_VARIANTS_FOLDER, referenced)
+        except Exception as e:
+            logger.error(f"Error collecting unreferenced images: {e}")
+
+if BLOB_GC_INTERVAL > 0:
+    threading.Thread(target=collect_image_garbage_periodically, daemon=True).start()
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+# Import jobs by id, oldest first
+import_jobs = OrderedDict()
+import_jobs_lock = threading.Lock()
+
+def create_import_job(filename, update_existing):
+    job = {
+        'id': uuid.uuid4().hex,
+        'filename': filename,
+        'update_existing': update_existing,
+        'status': 'running',
+        'rows_read': 0,
+        'imported': 0,
+        'updated': 0,
+        'skipped': 0,
+        'error_count': 0,
+        'errors': [],
+        'error': None,
+        'started_at': datetime.now().isoformat(),
+        'finished_at': None
+    }
+    
+    with import_jobs_lock:
+        import_jobs[job['id']] = job
+        
+        # Forget the oldest finished jobs
+        finished = [job_id for job_id, other in import_jobs.items() if other['status'] != 'running']
+        for job_id in finished[:max(0, len(import_jobs) - MENU_IMPORT_JOBS_KEPT)]:
+            del import_jobs[job_id]
+        
+        return dict(job)
+
+def update_import_job(job_id, **changes):
+    with import_jobs_lock:
+        import_jobs[job_id].update(changes)
+
+def detach_upload(file):
+    """
+    Take over an uploaded file so it can be read after the request ends.
+    Werkzeug spools uploads to an anonymous temporary file and closes it with
+    the request; a duplicated descriptor keeps it open for the import job.
+    """
+    stream = file.stream
+    try:
+        detached = os.fdopen(os.dup(stream.fileno()), 'rb')
+    except (AttributeError, io.UnsupportedOperation):
+        # In-memory upload
+        stream.seek(0)
+        return io.BytesIO(stream.read())
+    
+    detached.seek(0)
+    return detached
+
 @app.route('/api/menu/import', methods=['POST'])
 def import_menu():
     # Check if file is present
@@ -113,271 +410,207 @@ def import_menu():
     # Check if update_existing flag is set
     update_existing = request.form.get('update_existing') == 'true'
     
-    try:
-        # Determine file type by extension
-        file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-        
-        if file_ext in ['xlsx', 'xls']:
-            # Handle Excel files
-            try:
-                import pandas as pd
-                
-                # Save file temporarily
-                temp_path = '/tmp/temp_import.' + file_ext
-                file.save(temp_path)
-                
-                # Read Excel file
-                df = pd.read_excel(temp_path)
-                
-                # Map column names (convert to lowercase and handle Price($))
-                column_mapping = {
-                    'ID': 'id',
-                    'Name': 'name',
-                    'Price($)': 'price',
-                    'Type': 'category',
-                    'Description': 'description',
-                    'Image Path': 'image_path'
-                }
-                
-                # Rename columns if they exist
-                for old_name, new_name in column_mapping.items():
-                    if old_name in df.columns:
-                        df = df.rename(columns={old_name: new_name})
-                
-                # Convert to list of dictionaries
-                records = df.to_dict('records')
-                
-                # Process the records
-                return process_excel_import(records, update_existing)
-                
-            except ImportError:
-                return jsonify({"error": "Excel support requires pandas and openpyxl libraries"}), 500
-            except Exception as e:
-                return jsonify({"error": f"Error processing Excel file: {str(e)}"}), 500
-        
-        elif file_ext == 'csv':
-            # Handle CSV files (with column mapping)
-            content = file.read().decode('utf-8-sig')  # Try with UTF-8 BOM
-            return process_csv_import(content, update_existing)
-        
-        else:
-            return jsonify({"error": f"Unsupported file format: {file_ext}"}), 400
-            
-    except Exception as e:
-        return jsonify({"error": f"Import error: {str(e)}"}), 500
+    # Determine file type by extension
+    file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+    if file_ext not in IMPORT_FILE_TYPES:
+        return jsonify({"error": f"Unsupported file format: {file_ext}. Use .xlsx or .csv"}), 400
+    
+    # Imports merge on the item name; refuse them while names are ambiguous
+    duplicates = check_unique_names()
+    if duplicates:
+        return jsonify({
+            "error": f"Menu item names must be unique before importing. Rename: {', '.join(duplicates)}"
+        }), 409
+    
+    # The rows are read, validated and committed in chunks in the background;
+    # the job's progress is at /api/menu/import/<job_id>
+    job = create_import_job(file.filename, update_existing)
+    threading.Thread(
+        target=run_menu_import,
+        args=(job['id'], detach_upload(file), file_ext, update_existing),
+        name=f"menu-import-{job['id']}",
+        daemon=True
+    ).start()
+    
+    return jsonify(job), 202, {'Location': f"/api/menu/import/{job['id']}"}
 
-def process_excel_import(records, update_existing):
-    imported_count = 0
-    updated_count = 0
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+@app.route('/api/menu/import/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    with import_jobs_lock:
+        job = import_jobs.get(job_id)
+        if not job:
+            return jsonify({"error": "Import job not found"}), 404
+        return jsonify(job)
+
+def run_menu_import(job_id, stream, file_ext, update_existing):
+    """
+    Stream the rows of an uploaded file into the menu one chunk at a time,
+    each in its own transaction, updating the job after every chunk. Chunks
+    committed before a failure stay imported.
+    """
+    totals = {'imported': 0, 'updated': 0, 'skipped': 0}
+    errors = []
+    error_count = 0
+    rows_read = 0
+    failure = None
     
-    for row in records:
-        # Extract values with appropriate handling of missing/null values
-        name = str(row.get('name', '')) if row.get('name') is not None else ''
-        description = str(row.get('description', '')) if row.get('description') is not None else ''
-        
-        # Handle price conversion safely
-        try:
-            price = float(row.get('price', 0))
-        except (ValueError, TypeError):
-            price = 0.0
-            
-        category = str(row.get('category', '')) if row.get('category') is not None else ''
-        image_path = str(row.get('image_path', '')) if row.get('image_path') is not None else ''
-        
-        # Check if item exists by ID or name
-        item_id = row.get('id')
-        if item_id and update_existing:
-            # Check if ID exists
-            cursor.execute("SELECT id FROM menu_items WHERE id = ?", (item_id,))
-            existing_item = cursor.fetchone()
+    try:
+        for chunk in iter_menu_chunks(stream, file_ext, MENU_IMPORT_CHUNK_SIZE):
+            # Validate and normalize the chunk at once; invalid rows are reported
+            rows, columns, chunk_errors = normalize_menu_frame(chunk)
+            counts, merge_errors = apply_menu_import(rows, columns, update_existing)
             
-            if existing_item:
-                # Update existing item by ID
-                cursor.execute(
-                    """
-                    UPDATE menu_items 
-                    SET name = ?, description = ?, price = ?, category = ?, image_path = ?
-                    WHERE id = ?
-                    """,
-                    (name, description, price, category, image_path, item_id)
-                )
-                updated_count += 1
-                continue
-        
-        # If not updating by ID or ID not found, check by name
-        if name:
-            cursor.execute("SELECT id FROM menu_items WHERE name = ?", (name,))
-            existing_item = cursor.fetchone()
+            for key in totals:
+                totals[key] += counts[key]
+            chunk_errors = sorted(chunk_errors + merge_errors, key=lambda error: error['row'])
+            error_count += len(chunk_errors)
+            errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+            rows_read += len(chunk)
             
-            if existing_item and update_existing:
-                # Update existing item by name
-                cursor.execute(
-                    """
-                    UPDATE menu_items 
-                    SET description = ?, price = ?, category = ?, image_path = ?
-                    WHERE id = ?
-                    """,
-                    (description, price, category, image_path, existing_item['id'])
-                )
-                updated_count += 1
-            elif not existing_item:
-                # Insert new item
-                cursor.execute(
-                    """
-                    INSERT INTO menu_items 
-                    (name, description, price, category, image_path) 
-                    VALUES (?, ?, ?, ?, ?)
-                    """,
-                    (name, description, price, category, image_path)
-                )
-                imported_count += 1
+            update_import_job(job_id, rows_read=rows_read, error_count=error_count, errors=list(errors), **totals)
     
-    conn.commit()
-    conn.close()
+    except Exception as e:
+        logger.error(f"Menu import {job_id} failed after {rows_read} rows: {e}")
+        failure = str(e)
     
-    # Publish event for menu update
-    publish_event('menu_updated', {})
+    finally:
+        stream.close()
     
-    return jsonify({
-        "success": True,
-        "imported": imported_count,
-        "updated": updated_count
-    })
+    if totals['imported'] or totals['updated']:
+        version = rebuild_menu_snapshot()
+        
+        # One bulk-change event for the whole import, not one per row
+        publish_event_async('menu_updated', dict(totals, errors=error_count, version=version))
+    
+    logger.info(f"Menu import {job_id}: {totals}, {error_count} rows with errors")
+    update_import_job(
+        job_id,
+        status='failed' if failure else 'completed',
+        error=failure,
+        finished_at=datetime.now().isoformat()
+    )
 
-def process_dict_import(records, update_existing):
-    # Process import with database operations
-    imported_count = 0
-    updated_count = 0
-    
+@retry_on_busy
+def check_unique_names():
+    """Create the unique name index if needed; returns names used more than once"""
+    conn = get_db_connection()
+    try:
+        duplicates = ensure_unique_names(conn.cursor())
+        conn.commit()
+        return duplicates
+    finally:
+        conn.close()
+
+@retry_on_busy
+def apply_menu_import(rows, columns, update_existing):
+    """Merge one chunk of normalized import rows into the menu in one transaction"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    for row in records:
-        # Check if item already exists
-        cursor.execute("SELECT id FROM menu_items WHERE name = ?", (row.get('name'),))
-        existing_item = cursor.fetchone()
-        
-        if existing_item and update_existing:
-            # Update existing item
-            update_fields = []
-            values = []
-            
-            if 'description' in row:
-                update_fields.append("description = ?")
-                values.append(row['description'])
-            
-            if 'price' in row:
-                update_fields.append("price = ?")
-                try:
-                    values.append(float(row['price']))
-                except (ValueError, TypeError):
-                    values.append(0.0)
-            
-            if 'category' in row:
-                update_fields.append("category = ?")
-                values.append(row['category'])
-            
-            if 'best_seller' in row:
-                update_fields.append("best_seller = ?")
-                values.append(1 if str(row['best_seller']).lower() in ['true', 'yes', '1'] else 0)
-            
-            if 'discount_percentage' in row:
-                update_fields.append("discount_percentage = ?")
-                try:
-                    values.append(int(row['discount_percentage']))
-                except (ValueError, TypeError):
-                    values.append(0)
-            
-            if update_fields:
-                values.append(existing_item['id'])
-                cursor.execute(
-                    f"UPDATE menu_items SET {', '.join(update_fields)} WHERE id = ?",
-                    tuple(values)
-                )
-                updated_count += 1
-        
-        elif not existing_item:
-            # Insert new item
-            try:
-                cursor.execute(
-                    """
-                    INSERT INTO menu_items 
-                    (name, description, price, category, best_seller, discount_percentage) 
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        row.get('name', ''),
-                        row.get('description', ''),
-                        float(row.get('price', 0)),
-                        row.get('category', ''),
-                        1 if str(row.get('best_seller', '')).lower() in ['true', 'yes', '1'] else 0,
-                        int(row.get('discount_percentage', 0))
-                    )
-                )
-                imported_count += 1
-            except (ValueError, TypeError) as e:
-                # Log the error but continue with other records
-                print(f"Error inserting row {row}: {str(e)}")
-    
-    conn.commit()
-    conn.close()
-    
-    # Publish event for menu update
-    publish_event('menu_updated', {})
+    try:
+        counts, errors = merge_menu_rows(cursor, rows, columns, update_existing)
+        conn.commit()
+        return counts, errors
     
-    return jsonify({
-        "success": True,
-        "imported": imported_count,
-        "updated": updated_count
-    })
+    finally:
+        conn.close()
+
 # API Routes
 @app.route('/api/menu', methods=['GET'])
 def get_menu():
     category = request.args.get('category', 'All')
+    ids = request.args.get('ids')
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Served from the snapshot; any menu change gives the full menu a new ETag
+    snapshot = menu_snapshot
+    menu_body, menu_etag = snapshot['menu']
     
-    if category == 'All':
-        cursor.execute("SELECT * FROM menu_items ORDER BY category, name")
-    else:
-        cursor.execute("SELECT * FROM menu_items WHERE category = ? ORDER BY name", (category,))
+    if not ids and category == 'All':
+        # Clients sync from this version through /api/menu/changes
+        response = snapshot_response(menu_body, menu_etag)
+        response.headers['X-Menu-Version'] = str(snapshot['version'])
+        return response
     
-    menu_items = cursor.fetchall()
-    conn.close()
+    if ids:
+        # Bulk lookup of specific items (e.g. ?ids=1,4,7) in one request
+        try:
+            item_ids = sorted({int(item_id) for item_id in ids.split(',') if item_id.strip()})
+        except ValueError:
+            return jsonify({"error": "ids must be a comma-separated list of integers"}), 400
+        
+        items = snapshot['items']
+        body = b'[' + b','.join(items[item_id][0] for item_id in item_ids if item_id in items) + b']'
+        return snapshot_response(body, menu_etag)
     
-    # Convert to list of dictionaries and ensure 'available' is properly set
-    result = []
-    for item in menu_items:
-        item_dict = dict(item)
-        # Make sure available is explicitly set to a boolean for JSON
-        item_dict['available'] = bool(item_dict['available'])
-        item_dict['best_seller'] = bool(item_dict['best_seller'])
-        result.append(item_dict)
+    body = snapshot['categories'].get(category, (b'[]', None))[0]
+    return snapshot_response(body, menu_etag)
+
+@app.route('/api/menu/categories', methods=['GET'])
+def get_menu_categories():
+    # Item count, available count and effective price range of each category
+    return snapshot_response(*menu_snapshot['category_stats'])
+
+@app.route('/api/menu/changes', methods=['GET'])
+def get_menu_changes():
+    # Items changed since a client's menu version: the current item, or a
+    # delete for items that are gone. A reset tells the client to reload.
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({"error": "since must be a menu version"}), 400
+    
+    snapshot = menu_snapshot
+    version = snapshot['version']
+    
+    if since == version:
+        item_ids = []
+    else:
+        conn = get_db_connection()
+        try:
+            item_ids = changed_items(conn.cursor(), since, version)
+        finally:
+            conn.close()
+    
+    if item_ids is None:
+        return jsonify({"version": version, "reset": True, "changes": []})
+    
+    # Item bodies come from the snapshot, which is exactly at this version
+    items = snapshot['items']
+    changes = [
+        b'{"item":' + items[item_id][0] + b',"op":"upsert"}' if item_id in items
+        else b'{"id":%d,"op":"delete"}' % item_id
+        for item_id in item_ids
+    ]
+    body = b'{"changes":[' + b','.join(changes) + b'],"reset":false,"version":%d}' % version
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/menu/search', methods=['GET'])
+def search_menu_items():
+    # Ranked and diacritic-insensitive, in any of the menu's languages;
+    # matches words by prefix, so it can run as the customer types
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 20, type=int), SEARCH_MAX_RESULTS))
+    
+    conn = get_db_connection()
+    try:
+        item_ids = search_menu(conn.cursor(), query, limit)
+    finally:
+        conn.close()
     
-    return jsonify(result)
+    # The matching items as the snapshot encodes them, best match first
+    items = menu_snapshot['items']
+    body = b'[' + b','.join(items[item_id][0] for item_id in item_ids if item_id in items) + b']'
+    return Response(body, mimetype='application/json')
 
 @app.route('/api/menu/<int:item_id>', methods=['GET'])
 def get_menu_item(item_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM menu_items WHERE id = ?", (item_id,))
-    item = cursor.fetchone()
-    
-    conn.close()
+    item = menu_snapshot['items'].get(item_id)
     
     if item is None:
         return jsonify({"error": "Item not found"}), 404
     
-    item_dict = dict(item)
-    item_dict['available'] = bool(item_dict['available'])
-    item_dict['best_seller'] = bool(item_dict['best_seller'])
-    
-    return jsonify(item_dict)
+    # Each item has its own ETag, so other items' changes don't invalidate it
+    body, etag = item
+    return snapshot_response(body, etag)
 
 @app.route('/api/menu', methods=['POST'])
 def add_menu_item():
@@ -393,32 +626,38 @@ def add_menu_item():
     best_seller = 1 if data.get('best_seller', False) else 0
     discount_percentage = max(0, min(100, int(data.get('discount_percentage', 0))))
     
-    cursor.execute(
-        """
-        INSERT INTO menu_items 
-        (name, description, price, category, image_path, best_seller, discount_percentage) 
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            data['name'], 
-            data.get('description', ''), 
-            data['price'],
-            data['category'], 
-            data.get('image_path', ''),
-            best_seller,
-            discount_percentage
+    try:
+        cursor.execute(
+            """
+            INSERT INTO menu_items 
+            (name, description, price, category, image_path, best_seller, discount_percentage) 
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                data['name'], 
+                data.get('description', ''), 
+                data['price'],
+                data['category'], 
+                data.get('image_path', ''),
+                best_seller,
+                discount_percentage
+            )
         )
-    )
+    except sqlite3.IntegrityError:
+        conn.close()
+        return jsonify({"error": f"A menu item named {data['name']} already exists"}), 409
     
     item_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    version = rebuild_menu_snapshot()
     
     # Publish event
-    publish_event('menu_item_created', {
+    publish_event_async('menu_item_created', {
         'item_id': item_id,
         'name': data['name'],
-        'category': data['category']
+        'category': data['category'],
+        'version': version
     })
     
     return jsonify({"id": item_id, "message": "Menu item added successfully"})
@@ -473,7 +712,7 @@ def update_menu_item(item_id):
         discount = max(0, min(100, int(data['discount_percentage'])))
         updates.append("discount_percentage = ?")
         values.append(discount)
-
+    
     if 'available' in data:
         updates.append("available = ?")
         values.append(1 if data['available'] else 0)
@@ -484,25 +723,32 @@ def update_menu_item(item_id):
     
     values.append(item_id)
     
-    cursor.execute(
-        f"UPDATE menu_items SET {', '.join(updates)} WHERE id = ?",
-        tuple(values)
-    )
+    try:
+        cursor.execute(
+            f"UPDATE menu_items SET {', '.join(updates)} WHERE id = ?",
+            tuple(values)
+        )
+    except sqlite3.IntegrityError:
+        conn.close()
+        return jsonify({"error": f"A menu item named {data.get('name')} already exists"}), 409
     
     conn.commit()
     conn.close()
+    version = rebuild_menu_snapshot()
     
     # Publish event
-    publish_event('menu_item_updated', {
+    publish_event_async('menu_item_updated', {
         'item_id': item_id,
-        'updated_fields': list(data.keys())
+        'updated_fields': list(data.keys()),
+        'version': version
     })
     
     # Publish availability event if that was updated
     if 'available' in data:
-        publish_event('menu_item_availability_updated', {
+        publish_event_async('menu_item_availability_updated', {
             'item_id': item_id,
-            'available': bool(data['available'])
+            'available': bool(data['available']),
+            'version': version
         })
     
     return jsonify({"message": "Menu item updated successfully"})
@@ -521,10 +767,12 @@ def delete_menu_item(item_id):
     cursor.execute("DELETE FROM menu_items WHERE id = ?", (item_id,))
     conn.commit()
     conn.close()
+    version = rebuild_menu_snapshot()
     
     # Publish event
-    publish_event('menu_item_deleted', {
-        'item_id': item_id
+    publish_event_async('menu_item_deleted', {
+        'item_id': item_id,
+        'version': version
     })
     
     return jsonify({"message": "Menu item deleted successfully"})
@@ -556,11 +804,13 @@ def update_item_availability(item_id):
     
     conn.commit()
     conn.close()
+    version = rebuild_menu_snapshot()
     
     # Publish event
-    publish_event('menu_item_availability_updated', {
+    publish_event_async('menu_item_availability_updated', {
         'item_id': item_id,
-        'available': bool(is_available)
+        'available': bool(is_available),
+        'version': version
     })
     
     return jsonify({
@@ -581,22 +831,67 @@ def upload_image():
         return jsonify({"error": "No selected file"}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        # Add timestamp to ensure uniqueness
-        filename = f"{int(time.time())}_{filename}"
-        
-        # Ensure upload directory exists
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        # Stored once per content, named by its SHA-256
+        filename = store_stream(file.stream, app.config['UPLOAD_FOLDER'], blob_extension(file.filename))
         
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        print(f"Saving file to: {os.path.abspath(file_path)}")
-        file.save(file_path)
-        
-        # Return the relative path to be stored in the database
-        relative_path = f"/static/images/menu/{filename}"
+        # Return the relative path to be stored in the database; the resized
+        # variants follow in the menu once they are generated
+        relative_path = f"{MENU_IMAGE_URL}/{filename}"
+        queue_image_variants(relative_path)
         return jsonify({"path": relative_path})
     
     return jsonify({"error": "File type not allowed"}), 400
 
+@retry_on_busy
+def store_menu_translations(items):
+    """Save translated strings, given as {item_id: {field: {lang: text}}}, for search"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        for item_id, fields in items.items():
+            try:
+                item_id = int(float(item_id))
+            except (TypeError, ValueError):
+                continue
+            save_translations(cursor, item_id, fields)
+        conn.commit()
+    finally:
+        conn.close()
+
+def load_menu_translations():
+    """Index the translations made while this service was not listening"""
+    retry_count = 0
+    max_retries = 5
+    
+    while retry_count < max_retries:
+        try:
+            response = requests.get(f"{TRANSLATION_SERVICE_URL}/api/translations/menu", timeout=10)
+            response.raise_for_status()
+            items = response.json().get('items', {})
+            store_menu_translations(items)
+            logger.info(f"Indexed translations of {len(items)} menu items for search")
+            return
+        except Exception as e:
+            retry_count += 1
+            wait_time = 2 ** retry_count  # Exponential backoff
+            logger.warning(f"Could not load menu translations: {e}. Retrying in {wait_time}s...")
+            time.sleep(wait_time)
+    
+    logger.error(f"Gave up loading menu translations after {max_retries} attempts")
+
+# Event handlers
+def handle_menu_translations_updated(payload):
+    """Handle menu_translations_updated event to keep the search index current"""
+    store_menu_translations(payload.get('items', {}))
+
+# Load translations in the background; the Translation Service may still be starting
+threading.Thread(target=load_menu_translations, daemon=True).start()
+
+# Register event handlers
+register_event_handler('menu_translations_updated', handle_menu_translations_updated)
+
+# Setup consumer
+setup_consumer(['menu_translations_updated'])
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Benchmark of menu search: the client-side approach, fetching the whole menu
+and filtering it with case-insensitive substring matches, against the FTS5
+index queried through search_menu. Menus of 200, 2,000 and 20,000 items
+with Vietnamese names, English descriptions and Chinese, Korean and French
+translations; queries mix full words, prefixes, unaccented Vietnamese and
+CJK.
+
+Usage:
+    python benchmarks/bench_search.py [--items 200 2000 20000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search import create_search_index, save_translations, search_menu
+
+DISHES = [('Phở', 'noodle soup', '河粉', '쌀국수', 'soupe'), ('Bún', 'vermicelli', '米粉', '분짜', 'vermicelles'),
+          ('Bánh mì', 'sandwich', '法棍', '반미', 'sandwich'), ('Cơm', 'broken rice', '米饭', '밥', 'riz'),
+          ('Gỏi cuốn', 'fresh rolls', '春卷', '월남쌈', 'rouleaux'), ('Chè', 'sweet soup', '甜汤', '체', 'dessert'),
+          ('Hủ tiếu', 'clear noodle soup', '粿条', '후띠우', 'nouilles'), ('Xôi', 'sticky rice', '糯米饭', '찹쌀밥', 'riz gluant')]
+PROTEINS = [('bò', 'beef', '牛肉', '소고기', 'bœuf'), ('gà', 'chicken', '鸡肉', '닭고기', 'poulet'),
+            ('heo', 'pork', '猪肉', '돼지고기', 'porc'), ('tôm', 'shrimp', '虾', '새우', 'crevettes'),
+            ('đậu hũ', 'tofu', '豆腐', '두부', 'tofu'), ('vịt', 'duck', '鸭肉', '오리', 'canard')]
+STYLES = [('đặc biệt', 'house special'), ('nướng', 'grilled'), ('chiên', 'fried'), ('xào', 'stir-fried'),
+          ('Huế', 'Hue style'), ('Sài Gòn', 'Saigon style'), ('sả ớt', 'lemongrass chili'), ('tái', 'rare')]
+QUERIES = ['pho', 'pho bo', 'banh mi dac biet', 'dac', 'ga nuong', 'chicken', 'grilled shr', 'noodle',
+           'bœuf', '牛肉', '쌀국수', 'vermicelles', 'hue', 'tofu', 'xyzzy']
+
+def build_menu(path, count):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE menu_items (
+            id INTEGER PRIMARY KEY, name TEXT NOT NULL, description TEXT, price REAL NOT NULL,
+            category TEXT NOT NULL, image_path TEXT, best_seller BOOLEAN DEFAULT 0,
+            discount_percentage INTEGER DEFAULT 0, available BOOLEAN DEFAULT 1
+        )
+    """)
+    create_search_index(cursor)
+    
+    rng = random.Random(7)
+    translations = {}
+    for item_id in range(1, count + 1):
+        dish, protein, style = rng.choice(DISHES), rng.choice(PROTEINS), rng.choice(STYLES)
+        cursor.execute(
+            "INSERT INTO menu_items (id, name, description, price, category) VALUES (?, ?, ?, ?, 'Main')",
+            (item_id, f"{dish[0]} {protein[0]} {style[0]} {item_id}",
+             f"{style[1].capitalize()} {protein[1]} {dish[1]}", 5 + item_id % 10)
+        )
+        translations[item_id] = {'name': {'zh': f"{protein[2]}{dish[2]}", 'ko': f"{protein[3]} {dish[3]}",
+                                          'fr': f"{dish[4].capitalize()} au {protein[4]}"}}
+        save_translations(cursor, item_id, translations[item_id])
+    conn.commit()
+    return conn, translations
+
+def search_client_side(conn, translations, query):
+    """Fetch the whole menu and keep the items containing the query"""
+    menu = json.loads(json.dumps([dict(zip(('id', 'name', 'description'), row)) for row in
+                                  conn.execute("SELECT id, name, description FROM menu_items")]))
+    query = query.lower()
+    return [item['id'] for item in menu
+            if query in item['name'].lower() or query in (item['description'] or '').lower()
+            or any(query in text.lower() for texts in translations[item['id']].values() for text in texts.values())]
+
+def measure(search, repeat):
+    timings = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, nargs='+', default=[200, 2000, 20000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', default=os.path.join('/tmp', 'menu_search_bench.db'))
+    args = parser.parse_args()
+    
+    print(f"{'items':<8}{'client p50':>12}{'p99':>9}{'fts p50':>10}{'p99':>9}   matches for 'pho' (client / fts)")
+    for count in args.items:
+        conn, translations = build_menu(args.db, count)
+        cursor = conn.cursor()
+        
+        client = measure(lambda query: search_client_side(conn, translations, query), args.repeat)
+        fts = measure(lambda query: search_menu(cursor, query, 20), args.repeat)
+        matches = (len(search_client_side(conn, translations, 'pho')), len(search_menu(cursor, 'pho', 100000)))
+        print(f"{count:<8}{client[0]:>12.2f}{client[1]:>9.2f}{fts[0]:>10.2f}{fts[1]:>9.2f}   {matches[0]} / {matches[1]}")
+        conn.close()
+    
+    os.remove(args.db)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# Most recent changes kept in the log; clients further behind reload the menu
+MENU_CHANGES_KEPT = 10000
+
+# Most items returned as deltas, so a sync never costs more than a reload
+MENU_CHANGES_MAX_ITEMS = 200
+
+# Columns whose change clients have to see
+ITEM_COLUMNS = [
+    'name', 'description', 'price', 'category', 'image_path',
+    'best_seller', 'discount_percentage', 'available'
+]
+
+def create_change_log(cursor):
+    """
+    Create the menu change log, filled by triggers on menu_items and
+    menu_images. Its version numbers only ever grow, so the newest one is the
+    menu version.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS menu_changes (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    changed = ' OR '.join(f"old.{column} IS NOT new.{column}" for column in ITEM_COLUMNS)
+    
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS menu_changes_insert AFTER INSERT ON menu_items BEGIN
+        INSERT INTO menu_changes (item_id, op) VALUES (new.id, 'upsert');
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS menu_changes_update AFTER UPDATE ON menu_items WHEN {changed} BEGIN
+        INSERT INTO menu_changes (item_id, op) VALUES (new.id, 'upsert');
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS menu_changes_delete AFTER DELETE ON menu_items BEGIN
+        INSERT INTO menu_changes (item_id, op) VALUES (old.id, 'delete');
+    END
+    ''')
+    
+    # New image variants change the items showing that photo
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS menu_changes_images AFTER INSERT ON menu_images BEGIN
+        INSERT INTO menu_changes (item_id, op)
+        SELECT id, 'upsert' FROM menu_items WHERE image_path = new.image_path;
+    END
+    ''')
+    
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS menu_changes_prune AFTER INSERT ON menu_changes BEGIN
+        DELETE FROM menu_changes WHERE version <= new.version - {MENU_CHANGES_KEPT};
+    END
+    ''')
+
+def menu_version(cursor):
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM menu_changes")
+    return cursor.fetchone()[0]
+
+def changed_items(cursor, since, version):
+    """
+    Ids of the items changed after version `since` up to `version`, or None
+    when the client has to reload the whole menu: its version is no longer
+    in the log, is newer than the menu, or too many items changed since.
+    """
+    if since > version:
+        return None
+    
+    cursor.execute("SELECT MIN(version) FROM menu_changes")
+    oldest = cursor.fetchone()[0]
+    if oldest is not None and since < oldest - 1:
+        return None
+    
+    cursor.execute('''
+        SELECT DISTINCT item_id FROM menu_changes
+        WHERE version > ? AND version <= ?
+        LIMIT ?
+    ''', (since, version, MENU_CHANGES_MAX_ITEMS + 1))
+    item_ids = [row[0] for row in cursor.fetchall()]
+    
+    return item_ids if len(item_ids) <= MENU_CHANGES_MAX_ITEMS else None
@@ -0,0 +1,63 @@
+import io
+import os
+import logging
+
+from PIL import Image, ImageOps
+
+from storage.blobs import store_bytes
+
+logger = logging.getLogger(__name__)
+
+# Responsive variants of a menu photo, by the longest side in pixels: the
+# manager's table thumbnails, menu cards (300px wide at 2x) and the item view
+IMAGE_VARIANTS = {
+    'thumb': 160,
+    'card': 640,
+    'detail': 1280
+}
+
+# Encodings of every variant: (Pillow format, file extension, save options)
+IMAGE_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True})
+}
+
+def load_rgb(source_path):
+    """Open an image upright and without transparency, ready for encoding"""
+    with Image.open(source_path) as image:
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(image)
+        
+        if image.mode in ('RGBA', 'LA', 'P') and (image.mode != 'P' or 'transparency' in image.info):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            return background
+        
+        return image.convert('RGB')
+
+def generate_variants(source_path, folder, url_prefix):
+    """
+    Resize an uploaded photo to every variant, encode each as WebP and JPEG
+    without metadata and store them as blobs in folder. Returns the
+    variants by name with their size and the URL of each encoding.
+    """
+    os.makedirs(folder, exist_ok=True)
+    image = load_rgb(source_path)
+    variants = {}
+    
+    for name, size in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        # Shrinks only; small photos keep their size
+        resized.thumbnail((size, size), Image.LANCZOS)
+        # EXIF, ICC profile, XMP and comments are not written
+        resized.info = {}
+        
+        variant = {'width': resized.width, 'height': resized.height}
+        for encoding, (image_format, ext, options) in IMAGE_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, **options)
+            variant[encoding] = f"{url_prefix}/{store_bytes(buffer.getvalue(), folder, ext)}"
+        variants[name] = variant
+    
+    return variants
@@ -0,0 +1,261 @@
+import logging
+
+import openpyxl
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Spreadsheet headers that differ from the column names
+COLUMN_ALIASES = {
+    'price($)': 'price',
+    'type': 'category',
+    'image': 'image_path'
+}
+
+# Columns an import can set; name is the merge key
+TEXT_COLUMNS = ['description', 'category', 'image_path']
+VALUE_COLUMNS = TEXT_COLUMNS + ['price', 'best_seller', 'discount_percentage']
+
+# Values of a new item for columns missing from the file
+INSERT_DEFAULTS = {
+    'description': '',
+    'category': '',
+    'image_path': '',
+    'price': None,
+    'best_seller': 0,
+    'discount_percentage': 0
+}
+
+TRUE_VALUES = ['true', 'yes', 'y', '1', '1.0', 'x']
+
+# Per-row errors returned in an import response
+MAX_REPORTED_ERRORS = 100
+
+def ensure_unique_names(cursor):
+    """
+    Create the unique index on menu item names that imports merge on.
+    Returns the names that are used more than once, in which case the index
+    cannot be created until those items are renamed.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_menu_items_name'")
+    if cursor.fetchone():
+        return []
+    
+    cursor.execute("SELECT name FROM menu_items GROUP BY name HAVING COUNT(*) > 1")
+    duplicates = [row[0] for row in cursor.fetchall()]
+    if not duplicates:
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_menu_items_name ON menu_items (name)")
+    return duplicates
+
+def iter_menu_chunks(stream, file_ext, chunk_size):
+    """
+    Read an uploaded CSV or XLSX file as DataFrames of up to chunk_size rows
+    of strings, indexed by spreadsheet row number. Only one chunk is held in
+    memory at a time; blank rows are left out.
+    """
+    if file_ext == 'csv':
+        yield from iter_csv_chunks(stream, chunk_size)
+    elif file_ext == 'xlsx':
+        yield from iter_xlsx_chunks(stream, chunk_size)
+    else:
+        raise ValueError(f"Unsupported file format: {file_ext}")
+
+def iter_csv_chunks(stream, chunk_size):
+    reader = pd.read_csv(stream, dtype=str, encoding='utf-8-sig', chunksize=chunk_size, skip_blank_lines=False)
+    with reader:
+        for chunk in reader:
+            # Chunk indexes continue across chunks; the header is row 1
+            chunk.index += 2
+            yield chunk.dropna(how='all')
+
+def iter_xlsx_chunks(stream, chunk_size):
+    # Read-only mode parses the sheet as rows are requested instead of
+    # building the whole workbook
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        sheet_rows = workbook.active.iter_rows(values_only=True)
+        header = next(sheet_rows, None)
+        if header is None:
+            return
+        columns = ['' if value is None else str(value) for value in header]
+        
+        numbers, chunk = [], []
+        for number, values in enumerate(sheet_rows, start=2):
+            values = (tuple(values) + (None,) * len(columns))[:len(columns)]
+            if all(value is None for value in values):
+                continue
+            numbers.append(number)
+            chunk.append([None if value is None else str(value) for value in values])
+            
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=columns, index=numbers)
+                numbers, chunk = [], []
+        
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns, index=numbers)
+    
+    finally:
+        workbook.close()
+
+def column_key(column):
+    key = str(column).strip().lower().replace(' ', '_')
+    return COLUMN_ALIASES.get(key, key)
+
+def normalize_menu_frame(df):
+    """
+    Validate and normalize imported rows, indexed by spreadsheet row number,
+    in whole-column operations. Returns the valid rows (with their row number
+    in `row`), the value columns the file provides, and a list of per-row
+    errors.
+    """
+    df = df.rename(columns=column_key)
+    df = df.loc[:, ~df.columns.duplicated()]
+    columns = [column for column in VALUE_COLUMNS if column in df.columns]
+    
+    rows = pd.DataFrame({'row': df.index}, index=df.index)
+    error = pd.Series('', index=df.index)
+    
+    def fail(mask, message):
+        # Keep the first error of each row
+        error[mask & (error == '')] = message
+    
+    rows['name'] = df['name'].fillna('').astype(str).str.strip() if 'name' in df.columns else ''
+    fail(rows['name'] == '', "Missing name")
+    
+    # Blank ids mean "match by name"
+    if 'id' in df.columns:
+        raw_id = df['id'].fillna('').astype(str).str.strip()
+        item_id = pd.to_numeric(raw_id, errors='coerce')
+        fail((raw_id != '') & (item_id.isna() | (item_id % 1 != 0)), "Invalid id")
+        rows['id'] = item_id.where(item_id % 1 == 0).astype('Int64')
+    else:
+        rows['id'] = pd.Series(pd.NA, index=df.index, dtype='Int64')
+    
+    for column in TEXT_COLUMNS:
+        if column in columns:
+            rows[column] = df[column].fillna('').astype(str).str.strip()
+    
+    if 'price' in columns:
+        price = pd.to_numeric(df['price'].astype(str).str.strip().str.lstrip('$'), errors='coerce')
+        fail(price.isna(), "Invalid price")
+        fail(price < 0, "Negative price")
+        rows['price'] = price.round(2)
+    
+    if 'best_seller' in columns:
+        rows['best_seller'] = df['best_seller'].fillna('').astype(str).str.strip().str.lower().isin(TRUE_VALUES).astype(int)
+    
+    if 'discount_percentage' in columns:
+        raw_discount = df['discount_percentage'].fillna('').astype(str).str.strip().str.rstrip('%')
+        discount = pd.to_numeric(raw_discount.replace('', '0'), errors='coerce')
+        fail(discount.isna(), "Invalid discount percentage")
+        rows['discount_percentage'] = discount.fillna(0).clip(0, 100).round().astype(int)
+    
+    # A name listed twice is taken from its last row
+    fail((rows['name'] != '') & rows['name'].duplicated(keep='last'), "Duplicate name, a later row is used")
+    
+    errors = [{'row': int(row), 'error': message} for row, message in zip(rows['row'][error != ''], error[error != ''])]
+    return rows[error == ''], columns, errors
+
+def merge_menu_rows(cursor, rows, columns, update_existing):
+    """
+    Merge normalized rows into menu_items with set-based statements: stage
+    them in a temp table with one executemany, classify them, update the
+    items matched by id, and upsert the rest on the unique name index.
+    Returns the counts by outcome and the rows that could not be merged.
+    The caller commits.
+    """
+    staged = ['row', 'id', 'name'] + VALUE_COLUMNS
+    
+    cursor.execute("DROP TABLE IF EXISTS temp.menu_import")
+    cursor.execute("""
+        CREATE TEMP TABLE menu_import (
+            row INTEGER PRIMARY KEY,
+            id INTEGER,
+            name TEXT NOT NULL,
+            description TEXT,
+            category TEXT,
+            image_path TEXT,
+            price REAL,
+            best_seller INTEGER,
+            discount_percentage INTEGER,
+            action TEXT,
+            error TEXT
+        )
+    """)
+    
+    # Columns the file does not have get the values of a new item
+    values = rows.reindex(columns=staged)
+    for column, default in INSERT_DEFAULTS.items():
+        if column not in columns:
+            values[column] = default
+    values = values.astype(object).where(values.notna(), None)
+    cursor.executemany(
+        f"INSERT INTO menu_import ({', '.join(staged)}) VALUES ({', '.join('?' for _ in staged)})",
+        values.itertuples(index=False, name=None)
+    )
+    
+    # Rows with the id of an existing item update it, name included
+    if update_existing:
+        cursor.execute("""
+            UPDATE menu_import SET action = 'update_id'
+            WHERE id IN (SELECT id FROM menu_items)
+        """)
+        cursor.execute("""
+            UPDATE menu_import SET action = 'error', error = 'Name is already used by item ' || (
+                SELECT m.id FROM menu_items m WHERE m.name = menu_import.name
+            )
+            WHERE action = 'update_id' AND EXISTS (
+                SELECT 1 FROM menu_items m WHERE m.name = menu_import.name AND m.id != menu_import.id
+            )
+        """)
+    
+    # The others match by name
+    cursor.execute("""
+        UPDATE menu_import
+        SET action = CASE
+            WHEN EXISTS (SELECT 1 FROM menu_items m WHERE m.name = menu_import.name)
+            THEN CASE WHEN ? THEN 'update_name' ELSE 'skip' END
+            ELSE 'insert'
+        END
+        WHERE action IS NULL
+    """, (1 if update_existing else 0,))
+    cursor.execute("""
+        UPDATE menu_import SET action = 'error', error = 'Missing price'
+        WHERE action = 'insert' AND price IS NULL
+    """)
+    
+    set_columns = ['name'] + columns
+    cursor.execute(f"""
+        UPDATE menu_items
+        SET ({', '.join(set_columns)}) = (
+            SELECT {', '.join(set_columns)} FROM menu_import s
+            WHERE s.id = menu_items.id AND s.action = 'update_id'
+        )
+        WHERE id IN (SELECT id FROM menu_import WHERE action = 'update_id')
+    """)
+    
+    on_conflict = (
+        f"DO UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in columns)}"
+        if columns else "DO NOTHING"
+    )
+    cursor.execute(f"""
+        INSERT INTO menu_items (name, {', '.join(VALUE_COLUMNS)})
+        SELECT name, {', '.join(VALUE_COLUMNS)} FROM menu_import
+        WHERE action IN ('insert', 'update_name')
+        ORDER BY row
+        ON CONFLICT (name) {on_conflict}
+    """)
+    
+    cursor.execute("SELECT action, COUNT(*) FROM menu_import GROUP BY action")
+    counts = dict(cursor.fetchall())
+    
+    cursor.execute("SELECT row, error FROM menu_import WHERE action = 'error' ORDER BY row")
+    errors = [{'row': row, 'error': error} for row, error in cursor.fetchall()]
+    
+    cursor.execute("DROP TABLE temp.menu_import")
+    
+    return {
+        'imported': counts.get('insert', 0),
+        'updated': counts.get('update_id', 0) + counts.get('update_name', 0),
+        'skipped': counts.get('skip', 0)
+    }, errors
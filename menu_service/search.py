@@ -0,0 +1,141 @@
+import re
+import unicodedata
+
+# Han, kana and Hangul syllables. Chinese and Japanese don't separate words
+# and Korean attaches particles to them, so these characters are indexed one
+# per token and queries match runs of them as phrases.
+CJK_CHAR = re.compile(r'([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])')
+QUERY_WORD = re.compile(r'\w+')
+
+# Letters that don't decompose into a base letter and diacritics
+FOLDED_LETTERS = str.maketrans({'đ': 'd', 'Đ': 'd', 'œ': 'oe', 'Œ': 'oe', 'æ': 'ae', 'Æ': 'ae', 'ß': 'ss'})
+
+# bm25 weights of the name, description and translations columns
+SEARCH_WEIGHTS = (10.0, 2.0, 5.0)
+
+# The tokenizer folds case and most diacritics itself; đ has no decomposition,
+# so the triggers fold it in SQL
+FOLD_D = "replace(replace({}, 'đ', 'd'), 'Đ', 'd')"
+
+def fold(text):
+    """Lowercase text without diacritics, so "Phở Đặc Biệt" becomes "pho dac biet\""""
+    decomposed = unicodedata.normalize('NFD', text or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    # Recompose what NFD split apart without being diacritics, like Hangul
+    return unicodedata.normalize('NFC', stripped).translate(FOLDED_LETTERS).lower()
+
+def search_text(text):
+    """Indexed form of a translated string: folded, CJK characters spaced out"""
+    return ' '.join(CJK_CHAR.sub(r' \1 ', fold(text)).split())
+
+def match_query(text):
+    """
+    FTS5 query for what a customer typed. Every word has to match, as a
+    prefix so results show while typing; CJK words match as a phrase of
+    their characters. Returns None when there is nothing to search for.
+    """
+    terms = []
+    for word in QUERY_WORD.findall(fold(text)):
+        tokens = CJK_CHAR.sub(r' \1 ', word).replace('_', ' ').split()
+        if tokens:
+            terms.append(f'"{" ".join(tokens)}"*')
+    return ' '.join(terms) or None
+
+def create_search_index(cursor):
+    """
+    Create the translated strings table and the FTS5 index over menu items,
+    kept in sync by triggers on both tables, and fill the index if it is new
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS menu_translations (
+        item_id INTEGER NOT NULL,
+        field TEXT NOT NULL,
+        lang TEXT NOT NULL,
+        text TEXT NOT NULL,
+        search_text TEXT NOT NULL,
+        PRIMARY KEY (item_id, field, lang)
+    )
+    ''')
+    
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'menu_search'")
+    if cursor.fetchone():
+        return
+    
+    cursor.execute('''
+    CREATE VIRTUAL TABLE menu_search USING fts5(
+        name, description, translations,
+        tokenize = "unicode61 remove_diacritics 2",
+        prefix = '2 3'
+    )
+    ''')
+    
+    name = FOLD_D.format('new.name')
+    description = FOLD_D.format("COALESCE(new.description, '')")
+    translations = "COALESCE((SELECT group_concat(search_text, ' ') FROM menu_translations WHERE item_id = {}), '')"
+    
+    cursor.execute(f'''
+    CREATE TRIGGER menu_search_insert AFTER INSERT ON menu_items BEGIN
+        INSERT INTO menu_search (rowid, name, description, translations)
+        VALUES (new.id, {name}, {description}, {translations.format('new.id')});
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER menu_search_update AFTER UPDATE OF name, description ON menu_items BEGIN
+        UPDATE menu_search SET name = {name}, description = {description} WHERE rowid = new.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER menu_search_delete AFTER DELETE ON menu_items BEGIN
+        DELETE FROM menu_search WHERE rowid = old.id;
+    END
+    ''')
+    
+    for event, item_id in (('INSERT', 'new.item_id'), ('UPDATE', 'new.item_id'), ('DELETE', 'old.item_id')):
+        cursor.execute(f'''
+        CREATE TRIGGER menu_translations_search_{event.lower()} AFTER {event} ON menu_translations BEGIN
+            UPDATE menu_search SET translations = {translations.format(item_id)} WHERE rowid = {item_id};
+        END
+        ''')
+    
+    cursor.execute(f'''
+    INSERT INTO menu_search (rowid, name, description, translations)
+    SELECT id, {FOLD_D.format('name')}, {FOLD_D.format("COALESCE(description, '')")}, {translations.format('menu_items.id')}
+    FROM menu_items
+    ''')
+
+def save_translations(cursor, item_id, fields):
+    """
+    Store the translated strings of a menu item, given as {field: {lang: text}};
+    an empty text removes that translation
+    """
+    for field, texts in fields.items():
+        for lang, text in texts.items():
+            # Spreadsheet imports can carry numbers
+            text = str(text).strip() if text else ''
+            if text:
+                cursor.execute('''
+                    INSERT INTO menu_translations (item_id, field, lang, text, search_text)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (item_id, field, lang) DO UPDATE
+                    SET text = excluded.text, search_text = excluded.search_text
+                    WHERE text != excluded.text
+                ''', (item_id, field, lang, text, search_text(text)))
+            else:
+                cursor.execute(
+                    "DELETE FROM menu_translations WHERE item_id = ? AND field = ? AND lang = ?",
+                    (item_id, field, lang)
+                )
+
+def search_menu(cursor, query, limit):
+    """Ids of the menu items matching a query, best match first"""
+    match = match_query(query)
+    if not match:
+        return []
+    
+    cursor.execute(f'''
+        SELECT rowid FROM menu_search
+        WHERE menu_search MATCH ?
+        ORDER BY bm25(menu_search, {', '.join(str(weight) for weight in SEARCH_WEIGHTS)})
+        LIMIT ?
+    ''', (match, limit))
+    return [row[0] for row in cursor.fetchall()]
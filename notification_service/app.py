@@ -11,6 +11,7 @@ import datetime
 # Add common directory to path for event modules
 sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
 from events.consumer import setup_consumer, register_event_handler
+from events.orders import build_order_delta, order_recipients, staff_devices, table_devices
 
 # Set up logging
 logging.basicConfig(
@@ -70,7 +71,13 @@ def register_device(sid, data):
 def handle_menu_updated(payload):
     """Handle menu_updated event"""
     logger.info("Menu updated, notifying clients")
-    sio.emit('menu_updated')
+    sio.emit('menu_updated', {'version': payload.get('version')})
+
+def handle_menu_item_changed(payload):
+    """Handle menu_item_created, menu_item_updated and menu_item_deleted events"""
+    # Clients fetch the change itself from the menu change feed
+    logger.info(f"Menu item {payload.get('item_id')} changed, notifying clients")
+    sio.emit('menu_updated', {'version': payload.get('version')})
 
 def handle_menu_item_availability_updated(payload):
     """Handle menu_item_availability_updated event"""
@@ -87,32 +94,38 @@ def handle_order_created(payload):
     """Handle order_created event"""
     order_id = payload.get('order_id')
     table_number = payload.get('table_number')
+    delta = build_order_delta(payload)
     
     logger.info(f"New order {order_id} created for table {table_number}")
     
-    # Notify all staff devices
-    sio.emit('new_order', {'order_id': order_id})
+    # Notify the staff devices
+    for sid in staff_devices(connected_devices):
+        sio.emit('new_order', delta, room=sid)
     
     # Notify the specific table if connected
-    for sid, device in connected_devices.items():
-        if device.get('role') == 'customer' and device.get('table_number') == table_number:
-            sio.emit('order_updated', {'order_id': order_id}, room=sid)
+    for sid in table_devices(connected_devices, table_number):
+        sio.emit('order_updated', delta, room=sid)
 
 def handle_order_updated(payload):
     """Handle order_updated event"""
     order_id = payload.get('order_id')
     status = payload.get('status')
     
-    logger.info(f"Order {order_id} updated, status: {status}")
-    sio.emit('order_updated', {'order_id': order_id})
+    logger.info(f"Order {order_id} updated, status: {status}, version: {payload.get('version')}")
+    delta = build_order_delta(payload)
+    for sid in order_recipients(connected_devices, payload):
+        sio.emit('order_updated', delta, room=sid)
 
 def handle_order_item_updated(payload):
     """Handle order_item_updated event"""
     order_id = payload.get('order_id')
-    item_id = payload.get('item_id')
+    # Bulk updates send every changed item of the order in one event
+    item_ids = payload.get('item_ids') or [payload.get('item_id')]
     
-    logger.info(f"Order item {item_id} in order {order_id} updated")
-    sio.emit('order_updated', {'order_id': order_id})
+    logger.info(f"Order items {item_ids} in order {order_id} updated")
+    delta = build_order_delta(payload)
+    for sid in order_recipients(connected_devices, payload):
+        sio.emit('order_updated', delta, room=sid)
 
 def handle_payment_processed(payload):
     """Handle payment_processed event"""
@@ -121,8 +134,8 @@ def handle_payment_processed(payload):
     
     logger.info(f"Payment processed for order {order_id}, table {table_number}")
     
-    # Notify all staff devices
-    sio.emit('order_updated', {'order_id': order_id})
+    # Staff devices receive the completed order state through the
+    # order_updated event published by the Order Service
     
     # Notify specific table
     for sid, device in connected_devices.items():
@@ -226,6 +239,9 @@ def notify_role(role):
 
 # Register event handlers
 register_event_handler('menu_updated', handle_menu_updated)
+register_event_handler('menu_item_created', handle_menu_item_changed)
+register_event_handler('menu_item_updated', handle_menu_item_changed)
+register_event_handler('menu_item_deleted', handle_menu_item_changed)
 register_event_handler('menu_item_availability_updated', handle_menu_item_availability_updated)
 register_event_handler('order_created', handle_order_created)
 register_event_handler('order_updated', handle_order_updated)
@@ -236,6 +252,9 @@ register_event_handler('promo_updated', handle_promo_updated)
 # Setup consumer for all events
 setup_consumer([
     'menu_updated',
+    'menu_item_created',
+    'menu_item_updated',
+    'menu_item_deleted',
     'menu_item_availability_updated',
     'order_created',
     'order_updated',
@@ -1,19 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import sqlite3
 import os
 import uuid
-from datetime import datetime
 import logging
 import requests
 import sys
 import base64
 import time
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 # Add common directory to path for event modules
 sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
 from events.producer import publish_event
 from events.consumer import setup_consumer, register_event_handler
+from db.pool import get_connection, retry_on_busy
+from db.idempotency import idempotent
+from db.group_commit import GroupCommitWriter
+from migrations import run_migrations
+from archive import ORDER_TABLES, union_order_tables, archive_finished_orders
 
 # Set up logging
 logging.basicConfig(
@@ -29,13 +36,38 @@ CORS(app)
 # Configuration
 DATABASE = os.getenv('DATABASE_FILE', 'orders.db')
 MENU_SERVICE_URL = os.getenv('MENU_SERVICE_URL', 'http://localhost:5001')
+# Hour (local time) at which a new business day starts, for late-night service
+BUSINESS_DAY_START_HOUR = int(os.getenv('BUSINESS_DAY_START_HOUR', 0))
+# Page sizes for the order listing endpoints
+ORDER_PAGE_SIZE = int(os.getenv('ORDER_PAGE_SIZE', 100))
+MAX_ORDER_PAGE_SIZE = int(os.getenv('MAX_ORDER_PAGE_SIZE', 1000))
+# Kitchen queue long-polling: longest wait, how often other processes'
+# changes are checked for while waiting, and how many changes are sent
+# before a client is told to resync from a full snapshot instead
+KITCHEN_QUEUE_MAX_WAIT = float(os.getenv('KITCHEN_QUEUE_MAX_WAIT', 25))
+KITCHEN_QUEUE_CHECK_INTERVAL = float(os.getenv('KITCHEN_QUEUE_CHECK_INTERVAL', 1))
+KITCHEN_QUEUE_MAX_CHANGES = int(os.getenv('KITCHEN_QUEUE_MAX_CHANGES', 500))
+# Number of enriched order documents kept for GET /api/orders/<id>
+ORDER_CACHE_SIZE = int(os.getenv('ORDER_CACHE_SIZE', 1000))
+# Orders completed or cancelled more than ARCHIVE_AFTER_DAYS ago are moved to
+# the archive tables every ARCHIVE_INTERVAL seconds (0 days disables it)
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 30))
+ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', 3600))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 200))
+# Apply order creations, item updates and payments from concurrent requests
+# in shared transactions through one writer thread
+ORDER_GROUP_COMMIT = os.getenv('ORDER_GROUP_COMMIT', 'false').lower() == 'true'
+# Cart validation: concurrent Menu Service lookups shared by all requests,
+# and the timeout of each lookup in seconds
+MENU_VALIDATION_WORKERS = int(os.getenv('MENU_VALIDATION_WORKERS', 16))
+MENU_VALIDATION_TIMEOUT = float(os.getenv('MENU_VALIDATION_TIMEOUT', 2))
 
 # Database setup
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled WAL-mode connection; close() hands it back to the pool
+    return get_connection(DATABASE)
 
+@retry_on_busy
 def create_tables():
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -67,73 +99,537 @@ def create_tables():
     ''')
     
     conn.commit()
+    
+    # Bring the schema up to date (columns, indexes)
+    schema_version = run_migrations(conn)
+    
     conn.close()
-    logger.info("Database tables created or confirmed")
+    logger.info(f"Database tables created or confirmed (schema version {schema_version})")
 
 # Create tables on startup
 create_tables()
 
-# Helper function to validate table authentication
-
+order_writer = GroupCommitWriter(DATABASE) if ORDER_GROUP_COMMIT else None
 
-# API Routes
-@app.route('/api/orders', methods=['GET'])
-def get_orders():
-    status = request.args.get('status', None)
-    date_filter = request.args.get('date', 'all')
+def run_write(operation, *args):
+    """
+    Run a write operation, a function taking a cursor, in a transaction and
+    return its result. With group commit on it shares the transaction with
+    the writes of other requests.
+    """
+    if order_writer is not None:
+        return order_writer.execute(operation, *args)
     
     conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        result = operation(conn.cursor(), *args)
+        conn.commit()
+        return result
+    finally:
+        # Rolls back if the operation failed
+        conn.close()
+
+def get_order_snapshot(cursor, order_id):
+    """
+    Build the current state of an order (status, totals, items and version)
+    so it can be pushed to clients with the order events
+    """
+    cursor.execute("""
+        SELECT id, table_number, status, created_at, completed_at, total_amount, payment_status, version
+        FROM orders
+        WHERE id = ?
+    """, (order_id,))
     
-    query = """
-        SELECT o.id, o.table_number, o.status, o.created_at, o.completed_at, o.total_amount,
-               COUNT(oi.id) as item_count
-        FROM orders o
-        LEFT JOIN order_items oi ON o.id = oi.order_id
+    order_row = cursor.fetchone()
+    if order_row is None:
+        return None
+    
+    order = dict(order_row)
+    
+    cursor.execute(f"""
+        SELECT oi.id, oi.menu_item_id, oi.quantity, oi.notes, oi.status, oi.unit_price, oi.discount_percentage,
+               {EFFECTIVE_PRICE_SQL} AS effective_price, ROUND({LINE_TOTAL_SQL}, 2) AS line_total
+        FROM order_items oi
+        WHERE oi.order_id = ?
+        ORDER BY oi.id
+    """, (order_id,))
+    
+    order['items'] = [dict(row) for row in cursor.fetchall()]
+    
+    return order
+
+# Discounted unit price and amount charged for an order item, from the
+# price snapshot taken at order time. The unit price is rounded to cents
+# like the menu's effective_price.
+EFFECTIVE_PRICE_SQL = "ROUND(COALESCE(oi.unit_price, 0) * (100 - oi.discount_percentage) / 100.0, 2)"
+LINE_TOTAL_SQL = f"oi.quantity * {EFFECTIVE_PRICE_SQL}"
+
+def update_order_total(cursor, order_id):
+    """Recompute an order's total from the price snapshots of its items"""
+    cursor.execute(f"""
+        UPDATE orders
+        SET total_amount = (
+            SELECT ROUND(COALESCE(SUM({LINE_TOTAL_SQL}), 0), 2)
+            FROM order_items oi
+            WHERE oi.order_id = orders.id
+        )
+        WHERE id = ?
+    """, (order_id,))
+
+def get_menu_items(menu_item_ids):
+    """
+    Fetch several menu items from the Menu Service with one request. Returns
+    them by id; items that could not be fetched are missing from the result.
     """
+    menu_item_ids = sorted(set(menu_item_ids))
+    if not menu_item_ids:
+        return {}
     
-    conditions = []
-    params = []
+    try:
+        response = requests.get(
+            f"{MENU_SERVICE_URL}/api/menu",
+            params={'ids': ','.join(str(menu_item_id) for menu_item_id in menu_item_ids)}
+        )
+        if response.status_code == 200:
+            return {menu_item['id']: menu_item for menu_item in response.json()}
+        logger.warning(f"Menu Service returned {response.status_code} for menu items {menu_item_ids}")
+    except requests.RequestException as e:
+        logger.error(f"Error fetching menu items {menu_item_ids}: {e}")
     
-    if status:
-        conditions.append("o.status = ?")
-        params.append(status)
+    return {}
+
+menu_validation_pool = ThreadPoolExecutor(max_workers=MENU_VALIDATION_WORKERS, thread_name_prefix='menu-validation')
+
+def fetch_orderable_menu_item(menu_item_id):
+    """
+    Fetch a menu item for an order. Raises ValueError if it does not exist or
+    is not available, and RequestException if the Menu Service cannot be reached.
+    """
+    try:
+        response = requests.get(f"{MENU_SERVICE_URL}/api/menu/{menu_item_id}", timeout=MENU_VALIDATION_TIMEOUT)
+    except requests.RequestException as e:
+        logger.error(f"Error validating menu item {menu_item_id}: {e}")
+        raise requests.RequestException(f"Could not validate menu item {menu_item_id}") from e
+    
+    if response.status_code != 200:
+        raise ValueError(f"Menu item {menu_item_id} not found")
+    
+    menu_item = response.json()
+    if not menu_item.get('available', True):
+        raise ValueError(f"Item {menu_item.get('name', 'Unknown')} is not available")
+    
+    return menu_item
+
+def fetch_cart_menu_items(menu_item_ids):
+    """
+    Fetch the distinct menu items of a cart concurrently, by id. The first
+    item that fails raises its error right away; lookups still queued are
+    cancelled.
+    """
+    futures = {
+        menu_validation_pool.submit(fetch_orderable_menu_item, menu_item_id): menu_item_id
+        for menu_item_id in dict.fromkeys(menu_item_ids)
+    }
+    
+    menu_items = {}
+    try:
+        for future in as_completed(futures):
+            menu_items[futures[future]] = future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+    
+    return menu_items
+
+def add_menu_details(items, menu_items=None):
+    """
+    Add the name and image of each order item's menu item. The price is the
+    undiscounted unit price snapshot taken at order time, or the menu price
+    for items ordered before snapshots were kept; effective_price and
+    line_total are what the order total charges.
+    """
+    if menu_items is None:
+        menu_items = get_menu_items(item['menu_item_id'] for item in items)
+    
+    for item in items:
+        menu_item = menu_items.get(item['menu_item_id'], {})
+        unit_price = item.get('unit_price')
+        item.update({
+            'name': menu_item.get('name', 'Unknown Item'),
+            'price': menu_item.get('price', 0) if unit_price is None else unit_price,
+            'image_path': menu_item.get('image_path', '')
+        })
+    
+    return items
+
+def get_business_day(moment):
+    """Business day (YYYY-MM-DD) that a local datetime belongs to"""
+    return (moment - timedelta(hours=BUSINESS_DAY_START_HOUR)).strftime('%Y-%m-%d')
+
+def get_date_filter_condition(date_filter):
+    """
+    Translate a date filter (today, yesterday, week, month) into a range
+    predicate on the indexed business_day column
+    """
+    today = datetime.now() - timedelta(hours=BUSINESS_DAY_START_HOUR)
     
     if date_filter == 'today':
-        conditions.append("DATE(o.created_at) = DATE('now')")
+        return "o.business_day = ?", [today.strftime('%Y-%m-%d')]
     elif date_filter == 'yesterday':
-        conditions.append("DATE(o.created_at) = DATE('now', '-1 day')")
+        return "o.business_day = ?", [(today - timedelta(days=1)).strftime('%Y-%m-%d')]
     elif date_filter == 'week':
-        conditions.append("DATE(o.created_at) >= DATE('now', '-7 days')")
+        return "o.business_day >= ?", [(today - timedelta(days=7)).strftime('%Y-%m-%d')]
     elif date_filter == 'month':
-        conditions.append("strftime('%Y-%m', o.created_at) = strftime('%Y-%m', 'now')")
+        return "o.business_day >= ?", [today.replace(day=1).strftime('%Y-%m-%d')]
+    
+    return None, []
+
+# Columns that can be selected with fields= on GET /api/orders
+ORDER_LIST_FIELDS = {
+    'id': 'o.id',
+    'table_number': 'o.table_number',
+    'status': 'o.status',
+    'created_at': 'o.created_at',
+    'completed_at': 'o.completed_at',
+    'total_amount': 'o.total_amount',
+    'payment_status': 'o.payment_status',
+    'version': 'o.version',
+    # Only counted when requested
+    'item_count': '(SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id)'
+}
+DEFAULT_ORDER_LIST_FIELDS = [
+    'id', 'table_number', 'status', 'created_at', 'completed_at', 'total_amount', 'version', 'item_count'
+]
+
+# Columns that can be selected with fields= on GET /api/order-items
+ORDER_ITEM_LIST_FIELDS = {
+    'id': 'oi.id',
+    'order_id': 'oi.order_id',
+    'menu_item_id': 'oi.menu_item_id',
+    'quantity': 'oi.quantity',
+    'notes': 'oi.notes',
+    'status': 'oi.status',
+    'created_at': 'o.created_at',
+    'table_number': 'o.table_number'
+}
+# Order item fields looked up from the Menu Service
+MENU_ITEM_DETAIL_FIELDS = ['name', 'price', 'category']
+DEFAULT_ORDER_ITEM_LIST_FIELDS = list(ORDER_ITEM_LIST_FIELDS) + MENU_ITEM_DETAIL_FIELDS
+
+def parse_fields(allowed, default):
+    """Read the fields= projection of a listing request"""
+    fields = request.args.get('fields')
+    if not fields:
+        return list(default)
+    
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    return fields
+
+def parse_status_filter(column):
+    """Translate status=A or status=A,B into a predicate on a status column"""
+    statuses = [value.strip() for value in request.args.get('status', '').split(',') if value.strip()]
+    
+    if not statuses:
+        return None, []
+    if len(statuses) == 1:
+        return f"{column} = ?", statuses
+    
+    # Without the hint the planner expects a status list to match most rows
+    # and walks the whole created_ts index instead of the status index
+    return f"likelihood({column} IN ({', '.join('?' for _ in statuses)}), 0.01)", statuses
+
+def encode_cursor(key):
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(cursor, key_length):
+    """Decode a cursor from encode_cursor, checking it has the expected key length"""
+    if not cursor:
+        return None
+    
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    
+    if not isinstance(key, list) or len(key) != key_length:
+        raise ValueError("Invalid cursor")
+    
+    return key
+
+def wants_ndjson():
+    """Whether a listing request asked for a newline-delimited JSON stream"""
+    return (request.args.get('format') == 'ndjson' or
+            request.accept_mimetypes.best == 'application/x-ndjson')
+
+def fetch_listing_page(cursor, listing, after, limit):
+    """Fetch up to `limit` rows of a listing that come after the `after` key"""
+    conditions = list(listing['conditions'])
+    params = list(listing['params'])
+    
+    if after:
+        keyset_condition, keyset_params = listing['keyset'](after)
+        conditions.append(keyset_condition)
+        params.extend(keyset_params)
+    
+    key_columns = ", ".join(f"{column} AS _key{i}" for i, column in enumerate(listing['key_columns']))
+    query = f"SELECT {key_columns}, {listing['columns']} FROM {listing['source']}"
     
     if conditions:
         query += " WHERE " + " AND ".join(conditions)
     
-    query += " GROUP BY o.id ORDER BY o.created_at DESC"
+    query += f" ORDER BY {listing['order_by']} LIMIT ?"
+    params.append(limit)
     
     cursor.execute(query, params)
-    orders = cursor.fetchall()
+    return cursor.fetchall()
+
+def listing_response(listing):
+    """
+    Respond to a listing request using keyset pagination. JSON responses hold
+    one page, with the cursor of the next page in the X-Next-Cursor header.
+    NDJSON responses stream every matching row (up to an optional limit)
+    in batches, so the full result set is never held in memory.
+    """
+    key_length = len(listing['key_columns'])
     
-    conn.close()
+    def page_key(rows):
+        return [rows[-1][f'_key{i}'] for i in range(key_length)]
+    
+    try:
+        after = decode_cursor(request.args.get('cursor'), key_length)
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be a positive integer")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if wants_ndjson():
+        def generate(after):
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                remaining = limit
+                while remaining is None or remaining > 0:
+                    batch_size = MAX_ORDER_PAGE_SIZE if remaining is None else min(MAX_ORDER_PAGE_SIZE, remaining)
+                    rows = fetch_listing_page(cursor, listing, after, batch_size)
+                    
+                    for row in listing['build'](rows):
+                        yield json.dumps(row) + "\n"
+                    
+                    if len(rows) < batch_size:
+                        break
+                    after = page_key(rows)
+                    if remaining is not None:
+                        remaining -= len(rows)
+            finally:
+                conn.close()
+        
+        return Response(stream_with_context(generate(after)), mimetype='application/x-ndjson')
+    
+    limit = min(limit or ORDER_PAGE_SIZE, MAX_ORDER_PAGE_SIZE)
+    
+    conn = get_db_connection()
+    try:
+        # One extra row tells whether there is a next page
+        rows = fetch_listing_page(conn.cursor(), listing, after, limit + 1)
+    finally:
+        conn.close()
+    
+    response = jsonify(listing['build'](rows[:limit]))
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(page_key(rows[:limit]))
     
-    return jsonify([dict(order) for order in orders])
+    return response
+
+def get_report_period_condition(period):
+    """
+    Translate a report period (today, week, month) into a predicate on the
+    business_day column; week and month are the trailing 7 and 30 days
+    """
+    today = datetime.now() - timedelta(hours=BUSINESS_DAY_START_HOUR)
+    
+    if period == 'today':
+        return "o.business_day = ?", [today.strftime('%Y-%m-%d')]
+    elif period == 'week':
+        return "o.business_day >= ?", [(today - timedelta(days=7)).strftime('%Y-%m-%d')]
+    elif period == 'month':
+        return "o.business_day >= ?", [(today - timedelta(days=30)).strftime('%Y-%m-%d')]
+    
+    return None, []
+
+# Statuses of orders the kitchen still works on
+ACTIVE_ORDER_STATUSES = ['Pending', 'In Progress', 'Ready', 'Delivered']
+
+# Woken after this process changes the kitchen queue
+kitchen_queue_changed = threading.Condition()
+
+def notify_kitchen_queue():
+    """Wake the kitchen queue requests waiting for changes"""
+    with kitchen_queue_changed:
+        kitchen_queue_changed.notify_all()
+
+KITCHEN_QUEUE_QUERY = """
+    SELECT oi.id, oi.order_id, oi.menu_item_id,
+           COALESCE(oi.name, 'Item #' || oi.menu_item_id) as name,
+           oi.quantity, oi.notes, oi.status, oi.change_seq,
+           o.table_number, o.status as order_status, o.created_at, o.version as order_version
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.id
+"""
+
+def get_kitchen_queue_changes(cursor, since):
+    """
+    Items changed after a queue version, in change order. Returns None when
+    there are more than KITCHEN_QUEUE_MAX_CHANGES of them.
+    """
+    cursor.execute(KITCHEN_QUEUE_QUERY + """
+        WHERE oi.change_seq > ?
+        ORDER BY oi.change_seq
+        LIMIT ?
+    """, (since, KITCHEN_QUEUE_MAX_CHANGES + 1))
+    
+    rows = cursor.fetchall()
+    if len(rows) > KITCHEN_QUEUE_MAX_CHANGES:
+        return None
+    return [dict(row) for row in rows]
+
+def get_kitchen_queue_snapshot(cursor):
+    """All items of the orders that are still active, in change order"""
+    # Without the hint the planner walks every item in change_seq order
+    # rather than looking the few active orders up by status
+    cursor.execute(KITCHEN_QUEUE_QUERY + f"""
+        WHERE likelihood(o.status IN ({', '.join('?' for _ in ACTIVE_ORDER_STATUSES)}), 0.01)
+        ORDER BY oi.change_seq
+    """, ACTIVE_ORDER_STATUSES)
+    return [dict(row) for row in cursor.fetchall()]
+
+# Enriched order documents served by GET /api/orders/<id>, least recently
+# used first. Write paths invalidate the orders they change and menu events
+# the orders holding the changed menu items.
+order_cache = OrderedDict()
+order_cache_lock = threading.Lock()
+order_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+# Bumped by every invalidation, so a document read before one is not stored
+order_cache_generation = 0
+
+def get_cached_order(order_id):
+    """Return the cached document of an order, or None, counting the lookup"""
+    with order_cache_lock:
+        order = order_cache.get(order_id)
+        if order is None:
+            order_cache_stats['misses'] += 1
+        else:
+            order_cache.move_to_end(order_id)
+            order_cache_stats['hits'] += 1
+        return order
+
+def cache_order(order, generation):
+    """Store an order document unless an invalidation happened since it was read"""
+    with order_cache_lock:
+        if generation != order_cache_generation or ORDER_CACHE_SIZE <= 0:
+            return
+        order_cache[order['id']] = order
+        order_cache.move_to_end(order['id'])
+        while len(order_cache) > ORDER_CACHE_SIZE:
+            order_cache.popitem(last=False)
+
+def invalidate_orders(order_ids):
+    """Drop the cached documents of orders that changed"""
+    global order_cache_generation
+    with order_cache_lock:
+        order_cache_generation += 1
+        for order_id in order_ids:
+            if order_cache.pop(order_id, None) is not None:
+                order_cache_stats['invalidations'] += 1
+
+def invalidate_menu_items(menu_item_ids=None):
+    """Drop the cached orders holding any of the menu items, or all of them"""
+    with order_cache_lock:
+        if menu_item_ids is None:
+            order_ids = list(order_cache)
+        else:
+            menu_item_ids = set(menu_item_ids)
+            order_ids = [
+                order_id for order_id, order in order_cache.items()
+                if any(item['menu_item_id'] in menu_item_ids for item in order['items'])
+            ]
+    invalidate_orders(order_ids)
+
+# Helper function to validate table authentication
+
+
+# API Routes
+@app.route('/api/orders', methods=['GET'])
+def get_orders():
+    date_filter = request.args.get('date', 'all')
+    
+    try:
+        fields = parse_fields(ORDER_LIST_FIELDS, DEFAULT_ORDER_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    conditions = []
+    params = []
+    
+    status_condition, status_params = parse_status_filter("o.status")
+    if status_condition:
+        conditions.append(status_condition)
+        params.extend(status_params)
+    
+    date_condition, date_params = get_date_filter_condition(date_filter)
+    if date_condition:
+        conditions.append(date_condition)
+        params.extend(date_params)
+    
+    # Newest first; the order id breaks ties between orders created in the
+    # same second so the (created_ts, id) key is unique
+    return listing_response({
+        'source': "orders o",
+        'columns': ", ".join(f"{ORDER_LIST_FIELDS[field]} AS {field}" for field in fields),
+        'conditions': conditions,
+        'params': params,
+        'key_columns': ["o.created_ts", "o.id"],
+        'keyset': lambda after: ("(o.created_ts, o.id) < (?, ?)", after),
+        'order_by': "o.created_ts DESC, o.id DESC",
+        'build': lambda rows: [{field: row[field] for field in fields} for row in rows]
+    })
+
+@app.route('/api/orders/cache/stats', methods=['GET'])
+def get_order_cache_stats():
+    with order_cache_lock:
+        stats = dict(order_cache_stats, size=len(order_cache), max_size=ORDER_CACHE_SIZE)
+    
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return jsonify(stats)
 
 @app.route('/api/orders/<order_id>', methods=['GET'])
 def get_order(order_id):
+    order = get_cached_order(order_id)
+    if order is not None:
+        return jsonify(order)
+    
+    generation = order_cache_generation
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        # Get order details
-        cursor.execute("""
-            SELECT id, table_number, status, created_at, completed_at, total_amount, payment_status
-            FROM orders
-            WHERE id = ?
-        """, (order_id,))
-    
-        order_row = cursor.fetchone()
+        # Get order details; orders finished long ago are in the archive tables
+        for orders_table, items_table in ORDER_TABLES:
+            cursor.execute(f"""
+                SELECT id, table_number, status, created_at, completed_at, total_amount, payment_status, version
+                FROM {orders_table}
+                WHERE id = ?
+            """, (order_id,))
+            
+            order_row = cursor.fetchone()
+            if order_row is not None:
+                break
     
         if order_row is None:
             return jsonify({"error": "Order not found"}), 404
@@ -142,47 +638,24 @@ def get_order(order_id):
         order = dict(order_row)
     
         # Get order items
-        cursor.execute("""
-            SELECT id, menu_item_id, quantity, notes, status
-            FROM order_items 
-            WHERE order_id = ?
+        cursor.execute(f"""
+            SELECT oi.id, oi.menu_item_id, oi.quantity, oi.notes, oi.status, oi.unit_price, oi.discount_percentage,
+                   {EFFECTIVE_PRICE_SQL} AS effective_price, ROUND({LINE_TOTAL_SQL}, 2) AS line_total
+            FROM {items_table} oi
+            WHERE oi.order_id = ?
+            ORDER BY oi.id
         """, (order_id,))
     
         items_rows = cursor.fetchall()
         items = [dict(row) for row in items_rows]
         
-        # For each item, get menu item details from the Menu Service
-        enriched_items = []
-        for item in items:
-            try:
-                menu_item_response = requests.get(
-                    f"{MENU_SERVICE_URL}/api/menu/{item['menu_item_id']}"
-                )
-                if menu_item_response.status_code == 200:
-                    menu_item = menu_item_response.json()
-                    item.update({
-                        'name': menu_item.get('name', 'Unknown Item'),
-                        'price': menu_item.get('price', 0),
-                        'image_path': menu_item.get('image_path', '')
-                    })
-                else:
-                    logger.warning(f"Menu item {item['menu_item_id']} not found")
-                    item.update({
-                        'name': 'Unknown Item',
-                        'price': 0,
-                        'image_path': ''
-                    })
-            except requests.RequestException as e:
-                logger.error(f"Error fetching menu item {item['menu_item_id']}: {e}")
-                item.update({
-                    'name': 'Unknown Item',
-                    'price': 0,
-                    'image_path': ''
-                })
-            
-            enriched_items.append(item)
+        # Menu item details for all items in one Menu Service request
+        menu_items = get_menu_items(item['menu_item_id'] for item in items)
+        order['items'] = add_menu_details(items, menu_items)
         
-        order['items'] = enriched_items
+        # Documents missing menu details are served but not cached
+        if all(item['menu_item_id'] in menu_items for item in items):
+            cache_order(order, generation)
         
         return jsonify(order)
 
@@ -203,27 +676,36 @@ def get_daily_sales_data(days=30):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get daily sales data
+    # Get daily sales data, summed over the operational and archive tables
     query = """
         SELECT 
-            DATE(o.created_at) as date,
+            date,
+            SUM(order_count) as order_count,
+            SUM(total_amount) as total_amount,
+            SUM(item_count) as item_count
+        FROM ({tables})
+        GROUP BY 
+            date
+        ORDER BY 
+            date DESC
+    """.format(tables=union_order_tables("""
+        SELECT 
+            o.business_day as date,
             COUNT(o.id) as order_count,
             SUM(o.total_amount) as total_amount,
             COUNT(oi.id) as item_count
         FROM 
-            orders o
+            {orders} o
         LEFT JOIN 
-            order_items oi ON o.id = oi.order_id
+            {order_items} oi ON o.id = oi.order_id
         WHERE 
-            o.created_at >= ? AND o.created_at <= ?
+            o.created_ts >= ? AND o.created_ts <= ?
             AND o.status != 'Cancelled'
         GROUP BY 
-            DATE(o.created_at)
-        ORDER BY 
-            DATE(o.created_at) DESC
-    """
+            o.business_day
+    """))
     
-    cursor.execute(query, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
+    cursor.execute(query, (int(start_date.timestamp()), int(end_date.timestamp())) * len(ORDER_TABLES))
     results = cursor.fetchall()
     
     conn.close()
@@ -250,27 +732,37 @@ def get_weekly_sales_data(weeks=12):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get weekly sales data using SQLite's strftime function
+    # Get weekly sales data using SQLite's strftime function, summed over the
+    # operational and archive tables
     query = """
         SELECT 
-            strftime('%Y-W%W', o.created_at) as week,
+            week,
+            SUM(order_count) as order_count,
+            SUM(total_amount) as total_amount,
+            SUM(item_count) as item_count
+        FROM ({tables})
+        GROUP BY 
+            week
+        ORDER BY 
+            week DESC
+    """.format(tables=union_order_tables("""
+        SELECT 
+            strftime('%Y-W%W', o.business_day) as week,
             COUNT(o.id) as order_count,
             SUM(o.total_amount) as total_amount,
             COUNT(oi.id) as item_count
         FROM 
-            orders o
+            {orders} o
         LEFT JOIN 
-            order_items oi ON o.id = oi.order_id
+            {order_items} oi ON o.id = oi.order_id
         WHERE 
-            o.created_at >= ? AND o.created_at <= ?
+            o.created_ts >= ? AND o.created_ts <= ?
             AND o.status != 'Cancelled'
         GROUP BY 
-            strftime('%Y-W%W', o.created_at)
-        ORDER BY 
-            strftime('%Y-W%W', o.created_at) DESC
-    """
+            strftime('%Y-W%W', o.business_day)
+    """))
     
-    cursor.execute(query, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
+    cursor.execute(query, (int(start_date.timestamp()), int(end_date.timestamp())) * len(ORDER_TABLES))
     results = cursor.fetchall()
     
     conn.close()
@@ -300,27 +792,36 @@ def get_monthly_sales_data(months=12):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Get monthly sales data using SQLite's strftime function
+    # Get monthly sales data, summed over the operational and archive tables
     query = """
         SELECT 
-            strftime('%Y-%m', o.created_at) as month,
+            month,
+            SUM(order_count) as order_count,
+            SUM(total_amount) as total_amount,
+            SUM(item_count) as item_count
+        FROM ({tables})
+        GROUP BY 
+            month
+        ORDER BY 
+            month DESC
+    """.format(tables=union_order_tables("""
+        SELECT 
+            substr(o.business_day, 1, 7) as month,
             COUNT(o.id) as order_count,
             SUM(o.total_amount) as total_amount,
             COUNT(oi.id) as item_count
         FROM 
-            orders o
+            {orders} o
         LEFT JOIN 
-            order_items oi ON o.id = oi.order_id
+            {order_items} oi ON o.id = oi.order_id
         WHERE 
-            o.created_at >= ? AND o.created_at <= ?
+            o.business_day >= ? AND o.business_day <= ?
             AND o.status != 'Cancelled'
         GROUP BY 
-            strftime('%Y-%m', o.created_at)
-        ORDER BY 
-            strftime('%Y-%m', o.created_at) DESC
-    """
+            substr(o.business_day, 1, 7)
+    """))
     
-    cursor.execute(query, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
+    cursor.execute(query, (start_date.strftime('%Y-%m-%d'), get_business_day(end_date)) * len(ORDER_TABLES))
     results = cursor.fetchall()
     
     conn.close()
@@ -344,92 +845,56 @@ def get_monthly_sales_data(months=12):
 
 def get_popular_items_data(period='all'):
     """
-    Get popular items data for the specified period by combining
-    data from order_items table and Menu Service API
+    Get popular items data for the specified period, with revenue at the
+    prices the items were sold at
     """
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        # First, get order items with quantities grouped by menu_item_id
-        query = """
+        query = f"""
             SELECT 
-                oi.menu_item_id,
-                SUM(oi.quantity) as quantity
+                oi.menu_item_id as id,
+                MAX(oi.name) as name,
+                MAX(oi.category) as category,
+                SUM(oi.quantity) as quantity,
+                SUM({LINE_TOTAL_SQL}) as revenue
             FROM 
-                order_items oi
+                {{order_items}} oi
             JOIN 
-                orders o ON oi.order_id = o.id
+                {{orders}} o ON oi.order_id = o.id
             WHERE 
                 o.status != 'Cancelled'
         """
         
         # Add time period filter
-        params = []
-        if period == 'month':
-            query += " AND o.created_at >= date('now', '-1 month')"
-        elif period == 'week':
-            query += " AND o.created_at >= date('now', '-7 days')"
-        elif period == 'today':
-            query += " AND DATE(o.created_at) = DATE('now')"
-        
-        # Group and order by
+        period_condition, params = get_report_period_condition(period)
+        if period_condition:
+            query += f" AND {period_condition}"
+        
         query += """
             GROUP BY 
                 oi.menu_item_id
-            ORDER BY 
-                quantity DESC
         """
         
-        cursor.execute(query, params)
-        results = cursor.fetchall()
+        # Sum the operational and archive tables, then group and order by.
+        # Items ordered before snapshots were stored may have no name.
+        query = """
+            SELECT 
+                id,
+                COALESCE(MAX(name), 'Item #' || id) as name,
+                COALESCE(MAX(category), 'Uncategorized') as category,
+                SUM(quantity) as quantity,
+                ROUND(SUM(revenue), 2) as revenue
+            FROM ({tables})
+            GROUP BY 
+                id
+            ORDER BY 
+                quantity DESC
+        """.format(tables=union_order_tables(query))
         
-        # Format results by getting item details from Menu Service
-        report_data = []
-        for row in results:
-            menu_item_id = row['menu_item_id']
-            quantity = row['quantity']
-            
-            try:
-                # Get item details from Menu Service
-                menu_response = requests.get(f"{MENU_SERVICE_URL}/api/menu/{menu_item_id}")
-                
-                if menu_response.status_code == 200:
-                    menu_item = menu_response.json()
-                    price = float(menu_item.get('price', 0))
-                    
-                    report_data.append({
-                        'id': menu_item_id,
-                        'name': menu_item.get('name', 'Unknown Item'),
-                        'category': menu_item.get('category', 'Uncategorized'),
-                        'quantity': quantity,
-                        'revenue': quantity * price
-                    })
-                else:
-                    logger.warning(f"Could not get details for menu item {menu_item_id}")
-                    
-                    # Include the item anyway with limited info
-                    report_data.append({
-                        'id': menu_item_id,
-                        'name': f'Item #{menu_item_id}',
-                        'category': 'Unknown',
-                        'quantity': quantity,
-                        'revenue': 0
-                    })
-                    
-            except requests.RequestException as e:
-                logger.error(f"Error connecting to Menu Service: {e}")
-                
-                # Include the item anyway with limited info
-                report_data.append({
-                    'id': menu_item_id,
-                    'name': f'Item #{menu_item_id}',
-                    'category': 'Unknown',
-                    'quantity': quantity,
-                    'revenue': 0
-                })
-                
-        return report_data
+        cursor.execute(query, params * len(ORDER_TABLES))
+        return [dict(row) for row in cursor.fetchall()]
     
     except Exception as e:
         logger.error(f"Error getting popular items data: {e}")
@@ -440,37 +905,57 @@ def get_popular_items_data(period='all'):
 
 def get_category_data(period='all'):
     """
-    Get category sales data for the specified period by first getting
-    popular items then grouping them by category
+    Get category sales data for the specified period from the category
+    snapshots of the sold items
     """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
     try:
-        # First get the popular items data which includes category info
-        items_data = get_popular_items_data(period)
+        query = f"""
+            SELECT 
+                COALESCE(oi.category, 'Uncategorized') as category,
+                SUM(oi.quantity) as item_count,
+                SUM({LINE_TOTAL_SQL}) as revenue
+            FROM 
+                {{order_items}} oi
+            JOIN 
+                {{orders}} o ON oi.order_id = o.id
+            WHERE 
+                o.status != 'Cancelled'
+        """
         
-        # Group by category
-        category_data = {}
-        for item in items_data:
-            category = item.get('category', 'Unknown')
-            
-            if category not in category_data:
-                category_data[category] = {
-                    'category': category,
-                    'item_count': 0,
-                    'revenue': 0
-                }
-            
-            category_data[category]['item_count'] += item.get('quantity', 0)
-            category_data[category]['revenue'] += item.get('revenue', 0)
+        period_condition, params = get_report_period_condition(period)
+        if period_condition:
+            query += f" AND {period_condition}"
         
-        # Convert to list and sort by revenue
-        report_data = list(category_data.values())
-        report_data.sort(key=lambda x: x['revenue'], reverse=True)
+        query += """
+            GROUP BY 
+                COALESCE(oi.category, 'Uncategorized')
+        """
         
-        return report_data
+        # Sum the operational and archive tables
+        query = """
+            SELECT 
+                category,
+                SUM(item_count) as item_count,
+                ROUND(SUM(revenue), 2) as revenue
+            FROM ({tables})
+            GROUP BY 
+                category
+            ORDER BY 
+                revenue DESC
+        """.format(tables=union_order_tables(query))
+        
+        cursor.execute(query, params * len(ORDER_TABLES))
+        return [dict(row) for row in cursor.fetchall()]
         
     except Exception as e:
         logger.error(f"Error getting category data: {e}")
         return []
+    
+    finally:
+        conn.close()
 
         
 @app.route('/api/reports/daily', methods=['GET'])
@@ -504,6 +989,7 @@ def get_category_report():
     return jsonify(report_data)
 
 @app.route('/api/orders', methods=['POST'])
+@idempotent(DATABASE)
 def create_order():
     data = request.json
     table_number = data.get('table_number')
@@ -513,42 +999,31 @@ def create_order():
     if not table_number or not items:
         return jsonify({"error": "Table number and items are required"}), 400
     
-    # Validate items with Menu Service
+    # Validate items with Menu Service, all distinct items at once
+    try:
+        menu_items = fetch_cart_menu_items(item.get('menu_item_id') for item in items)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 500
+    
     validated_items = []
-    total_amount = 0
     
     for item in items:
         menu_item_id = item.get('menu_item_id')
-        try:
-            # Verify item exists and get current price
-            menu_item_response = requests.get(
-                f"{MENU_SERVICE_URL}/api/menu/{menu_item_id}"
-            )
-            if menu_item_response.status_code == 200:
-                menu_item = menu_item_response.json()
-                if not menu_item.get('available', True):
-                    return jsonify({
-                        "error": f"Item {menu_item.get('name', 'Unknown')} is not available"
-                    }), 400
-                
-                # Use current price from menu service
-                validated_item = {
-                    'menu_item_id': menu_item_id,
-                    'quantity': item.get('quantity', 1),
-                    'notes': item.get('notes', ''),
-                    'price': menu_item.get('price', 0)
-                }
-                validated_items.append(validated_item)
-                total_amount += validated_item['price'] * validated_item['quantity']
-            else:
-                return jsonify({
-                    "error": f"Menu item {menu_item_id} not found"
-                }), 400
-        except requests.RequestException as e:
-            logger.error(f"Error validating menu item {menu_item_id}: {e}")
-            return jsonify({
-                "error": f"Could not validate menu item {menu_item_id}"
-            }), 500
+        menu_item = menu_items[menu_item_id]
+        
+        # Use current price from menu service
+        validated_items.append({
+            'menu_item_id': menu_item_id,
+            'quantity': item.get('quantity', 1),
+            'notes': item.get('notes', ''),
+            'price': menu_item.get('price', 0),
+            'discount_percentage': menu_item.get('discount_percentage', 0) or 0,
+            'name': menu_item.get('name', 'Unknown Item'),
+            'category': menu_item.get('category', 'Uncategorized'),
+            'image_path': menu_item.get('image_path', '')
+        })
     
     # Generate a unique order ID
     order_id = str(uuid.uuid4())
@@ -556,44 +1031,63 @@ def create_order():
     # Always start with 'Pending' status for order workflow
     order_status = 'Pending'
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        # Insert the order
-        cursor.execute("""
-            INSERT INTO orders (id, table_number, status, created_at, total_amount, payment_status)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (order_id, table_number, order_status, datetime.now().isoformat(), total_amount, payment_status))
-        
-        # Insert order items
-        for item in validated_items:
-            cursor.execute("""
-                INSERT INTO order_items (order_id, menu_item_id, quantity, notes, status)
-                VALUES (?, ?, ?, ?, ?)
-            """, (order_id, item['menu_item_id'], item['quantity'], 
-                item.get('notes', ''), 'Pending'))
+        order = run_write(insert_order, order_id, table_number, order_status, payment_status, validated_items)
+        notify_kitchen_queue()
         
-        conn.commit()
+        # Include the menu details we already fetched so clients can render
+        # the new order without a follow-up GET
+        menu_details = {item['menu_item_id']: item for item in validated_items}
+        for order_item in order['items']:
+            menu_item = menu_details.get(order_item['menu_item_id'], {})
+            order_item.update({
+                'name': menu_item.get('name', 'Unknown Item'),
+                'price': menu_item.get('price', 0),
+                'image_path': menu_item.get('image_path', '')
+            })
         
         # Publish event for new order
         publish_event('order_created', {
             'order_id': order_id,
             'table_number': table_number,
             'status': order_status,
-            'total_amount': total_amount,
-            'items_count': len(validated_items)
+            'total_amount': order['total_amount'],
+            'items_count': len(validated_items),
+            'version': order['version'],
+            'order': order
         })
         
         return jsonify({"id": order_id, "message": "Order created successfully"})
     
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error creating order: {e}")
         return jsonify({"error": str(e)}), 500
+
+def insert_order(cursor, order_id, table_number, order_status, payment_status, validated_items):
+    """Write operation inserting a new order and its items; returns its snapshot"""
+    # Insert the order
+    created_at = datetime.now()
+    cursor.execute("""
+        INSERT INTO orders (id, table_number, status, created_at, created_ts, business_day,
+                            payment_status, version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+    """, (order_id, table_number, order_status, created_at.isoformat(), int(created_at.timestamp()),
+          get_business_day(created_at), payment_status))
+    
+    # Insert order items with a snapshot of their menu details, so later
+    # totals and reports use the price the item was sold at
+    for item in validated_items:
+        cursor.execute("""
+            INSERT INTO order_items (order_id, menu_item_id, quantity, notes, status,
+                                     unit_price, discount_percentage, name, category)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (order_id, item['menu_item_id'], item['quantity'], 
+            item.get('notes', ''), 'Pending', item['price'], item['discount_percentage'],
+            item['name'], item['category']))
     
-    finally:
-        conn.close()
+    update_order_total(cursor, order_id)
+    
+    return get_order_snapshot(cursor, order_id)
 
 @app.route('/api/orders/<order_id>', methods=['PUT'])
 def update_order(order_id):
@@ -609,7 +1103,6 @@ def update_order(order_id):
         # Check if order exists
         cursor.execute("SELECT id FROM orders WHERE id = ?", (order_id,))
         if not cursor.fetchone():
-            conn.close()
             return jsonify({"error": "Order not found"}), 404
         
         # Build update query
@@ -632,9 +1125,10 @@ def update_order(order_id):
             values.append(data['payment_status'])
         
         if not updates:
-            conn.close()
             return jsonify({"message": "No changes made"})
         
+        updates.append("version = version + 1")
+        
         # Execute update
         values.append(order_id)  # Add order_id for WHERE clause
         cursor.execute(
@@ -643,10 +1137,16 @@ def update_order(order_id):
         )
         
         conn.commit()
+        invalidate_orders([order_id])
+        notify_kitchen_queue()
+        
+        order = get_order_snapshot(cursor, order_id)
         
         # Publish event for order update
         event_data = {
-            'order_id': order_id
+            'order_id': order_id,
+            'version': order['version'],
+            'order': order
         }
         if 'status' in data:
             event_data['status'] = data['status']
@@ -665,21 +1165,29 @@ def update_order(order_id):
     finally:
         conn.close()
 
+def add_menu_item_details(items, fields):
+    """Add the requested Menu Service details (name, price, category) to order items"""
+    menu_items = get_menu_items(item['_menu_item_id'] for item in items)
+    defaults = {'name': 'Unknown Item', 'price': 0, 'category': 'Uncategorized'}
+    
+    for item in items:
+        menu_item = menu_items.get(item.pop('_menu_item_id'), {})
+        item.update({field: menu_item.get(field, defaults[field]) for field in fields})
+    
+    return items
+
 @app.route('/api/order-items', methods=['GET'])
 def get_order_items():
     order_id = request.args.get('order_id', None)
-    status = request.args.get('status', None)
     date_filter = request.args.get('date', 'all')
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    try:
+        fields = parse_fields(DEFAULT_ORDER_ITEM_LIST_FIELDS, DEFAULT_ORDER_ITEM_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    query = """
-        SELECT oi.id, oi.order_id, oi.menu_item_id, oi.quantity, oi.notes, oi.status,
-               o.created_at, o.table_number
-        FROM order_items oi
-        JOIN orders o ON oi.order_id = o.id
-    """
+    columns = [field for field in fields if field in ORDER_ITEM_LIST_FIELDS]
+    menu_fields = [field for field in fields if field in MENU_ITEM_DETAIL_FIELDS]
     
     conditions = []
     params = []
@@ -688,62 +1196,177 @@ def get_order_items():
         conditions.append("oi.order_id = ?")
         params.append(order_id)
     
-    if status:
-        conditions.append("oi.status = ?")
-        params.append(status)
-    
-    if date_filter == 'today':
-        conditions.append("DATE(o.created_at) = DATE('now')")
-    elif date_filter == 'yesterday':
-        conditions.append("DATE(o.created_at) = DATE('now', '-1 day')")
-    elif date_filter == 'week':
-        conditions.append("DATE(o.created_at) >= DATE('now', '-7 days')")
-    elif date_filter == 'month':
-        conditions.append("strftime('%Y-%m', o.created_at) = strftime('%Y-%m', 'now')")
-    
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
+    status_condition, status_params = parse_status_filter("oi.status")
+    if status_condition:
+        conditions.append(status_condition)
+        params.extend(status_params)
+    
+    date_condition, date_params = get_date_filter_condition(date_filter)
+    if date_condition:
+        conditions.append(date_condition)
+        params.extend(date_params)
+    
+    def build(rows):
+        items = []
+        for row in rows:
+            item = {field: row[field] for field in columns}
+            item['_menu_item_id'] = row['_menu_item_id']
+            items.append(item)
+        
+        # Menu Service lookups are only made when their fields are requested
+        if menu_fields:
+            return add_menu_item_details(items, menu_fields)
+        for item in items:
+            del item['_menu_item_id']
+        return items
+    
+    def keyset(after):
+        created_ts, last_order_id, last_item_id = after
+        # The leading created_ts bound gives the planner an index range to search
+        return (
+            "o.created_ts <= ? AND "
+            "((o.created_ts, o.id) < (?, ?) OR (o.created_ts = ? AND o.id = ? AND oi.id > ?))",
+            [created_ts, created_ts, last_order_id, created_ts, last_order_id, last_item_id]
+        )
     
-    query += " ORDER BY o.created_at DESC, oi.id ASC"
+    # Newest orders first, items of an order in the order they were added
+    return listing_response({
+        'source': "order_items oi JOIN orders o ON oi.order_id = o.id",
+        'columns': ", ".join(
+            [f"{ORDER_ITEM_LIST_FIELDS[field]} AS {field}" for field in columns] +
+            ["oi.menu_item_id AS _menu_item_id"]
+        ),
+        'conditions': conditions,
+        'params': params,
+        'key_columns': ["o.created_ts", "o.id", "oi.id"],
+        'keyset': keyset,
+        'order_by': "o.created_ts DESC, o.id DESC, oi.id ASC",
+        'build': build
+    })
+
+# Order item fields that can be changed through the API, and the statuses
+# an item can be set to
+ORDER_ITEM_UPDATE_FIELDS = ['status', 'notes', 'quantity']
+ORDER_ITEM_STATUSES = ['Pending', 'In Progress', 'Ready', 'Delivered', 'Completed', 'Cancelled']
+
+def validate_order_item_update(update):
+    """Check one bulk order item change, returning an error message or None"""
+    if not isinstance(update, dict) or 'id' not in update:
+        return "Every item update needs an id"
+    
+    # bool is an int subclass, but true is not an id or a quantity
+    if isinstance(update['id'], bool) or not isinstance(update['id'], int):
+        return f"Order item id must be an integer: {update['id']!r}"
+    if not any(field in update for field in ORDER_ITEM_UPDATE_FIELDS):
+        return f"No changes given for order item {update['id']}"
+    if 'status' in update and update['status'] not in ORDER_ITEM_STATUSES:
+        return f"Invalid status for order item {update['id']}: {update['status']}"
+    
+    quantity = update.get('quantity', 1)
+    if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+        return f"Quantity of order item {update['id']} must be a positive integer"
+    
+    return None
+
+@app.route('/api/order-items/bulk', methods=['PUT'])
+def bulk_update_order_items():
+    """
+    Apply a list of order item changes ({id, status|notes|quantity}) in one
+    transaction, publishing one order_item_updated event per affected order.
+    The whole batch is rejected if any change is invalid.
+    """
+    data = request.json
+    updates = data.get('items') if isinstance(data, dict) else data
     
-    cursor.execute(query, params)
-    items = cursor.fetchall()
+    if not updates or not isinstance(updates, list):
+        return jsonify({"error": "A list of item updates is required"}), 400
     
-    conn.close()
+    for update in updates:
+        error = validate_order_item_update(update)
+        if error:
+            return jsonify({"error": error}), 400
     
-    # Convert to list of dictionaries for JSON serialization
-    result = []
-    for item in items:
-        item_dict = dict(item)
-        # Try to get menu item details for each order item
-        try:
-            menu_item_response = requests.get(
-                f"{MENU_SERVICE_URL}/api/menu/{item['menu_item_id']}"
-            )
-            if menu_item_response.status_code == 200:
-                menu_item = menu_item_response.json()
-                item_dict.update({
-                    'name': menu_item.get('name', 'Unknown Item'),
-                    'price': menu_item.get('price', 0),
-                    'category': menu_item.get('category', 'Uncategorized')
-                })
-            else:
-                item_dict.update({
-                    'name': 'Unknown Item',
-                    'price': 0,
-                    'category': 'Uncategorized'
-                })
-        except requests.RequestException:
-            # If we can't reach the Menu Service, add placeholder data
-            item_dict.update({
-                'name': 'Unknown Item',
-                'price': 0,
-                'category': 'Uncategorized'
+    try:
+        missing, order_changes = run_write(apply_order_item_updates, updates)
+        
+        if missing:
+            return jsonify({"error": f"Order items not found: {', '.join(missing)}"}), 404
+        
+        invalidate_orders(order_changes)
+        notify_kitchen_queue()
+        
+        # One event per order, carrying its new state
+        for order_id, changes in order_changes.items():
+            order = changes['order']
+            publish_event('order_item_updated', {
+                'order_id': order_id,
+                'item_ids': changes['item_ids'],
+                'updated_fields': sorted(changes['fields']),
+                'version': order['version'],
+                'order': order
             })
         
-        result.append(item_dict)
+        return jsonify({
+            "message": f"{len(updates)} order items updated successfully",
+            "orders": list(order_changes)
+        })
+    
+    except Exception as e:
+        logger.error(f"Error updating order items in bulk: {e}")
+        return jsonify({"error": str(e)}), 500
+
+def apply_order_item_updates(cursor, updates):
+    """
+    Write operation applying validated bulk order item changes. Returns the
+    ids of items that don't exist, in which case nothing is written, and the
+    changes grouped by order with each order's new snapshot.
+    """
+    # Find the order of every item
+    item_ids = list({update['id'] for update in updates})
+    cursor.execute(
+        f"SELECT id, order_id FROM order_items WHERE id IN ({', '.join('?' for _ in item_ids)})",
+        item_ids
+    )
+    item_orders = {str(row['id']): row['order_id'] for row in cursor.fetchall()}
+    
+    missing = [str(item_id) for item_id in item_ids if str(item_id) not in item_orders]
+    if missing:
+        return missing, {}
+    
+    # One executemany per combination of changed fields
+    statements = {}
+    for update in updates:
+        fields = tuple(field for field in ORDER_ITEM_UPDATE_FIELDS if field in update)
+        statements.setdefault(fields, []).append(
+            tuple(update[field] for field in fields) + (update['id'],)
+        )
+    
+    for fields, rows in statements.items():
+        cursor.executemany(
+            f"UPDATE order_items SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+            rows
+        )
     
-    return jsonify(result)
+    # Changes grouped by order
+    order_changes = {}
+    for update in updates:
+        changes = order_changes.setdefault(item_orders[str(update['id'])], {'item_ids': [], 'fields': set()})
+        changes['item_ids'].append(update['id'])
+        changes['fields'].update(field for field in ORDER_ITEM_UPDATE_FIELDS if field in update)
+    
+    for order_id, changes in order_changes.items():
+        if 'quantity' in changes['fields']:
+            update_order_total(cursor, order_id)
+    
+    cursor.executemany(
+        "UPDATE orders SET version = version + 1 WHERE id = ?",
+        [(order_id,) for order_id in order_changes]
+    )
+    
+    for order_id, changes in order_changes.items():
+        changes['order'] = get_order_snapshot(cursor, order_id)
+    
+    return [], order_changes
 
 @app.route('/api/order-items/<item_id>', methods=['PUT'])
 def update_order_item(item_id):
@@ -752,97 +1375,125 @@ def update_order_item(item_id):
     if not data:
         return jsonify({"error": "No data provided"}), 400
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    if not any(field in data for field in ('status', 'notes', 'quantity')):
+        return jsonify({"message": "No changes made"})
     
     try:
-        # Check if item exists and get order_id
-        cursor.execute("SELECT order_id FROM order_items WHERE id = ?", (item_id,))
-        result = cursor.fetchone()
+        order = run_write(apply_order_item_update, item_id, data)
         
-        if not result:
-            conn.close()
+        if order is None:
             return jsonify({"error": "Order item not found"}), 404
         
-        order_id = result['order_id']
-        
-        # Build update query
-        updates = []
-        values = []
-        
-        # Update status if provided
-        if 'status' in data:
-            updates.append("status = ?")
-            values.append(data['status'])
-        
-        # Update notes if provided
-        if 'notes' in data:
-            updates.append("notes = ?")
-            values.append(data['notes'])
-        
-        # Update quantity if provided
-        if 'quantity' in data:
-            updates.append("quantity = ?")
-            values.append(data['quantity'])
-        
-        if not updates:
-            conn.close()
-            return jsonify({"message": "No changes made"})
-        
-        # Execute update
-        values.append(item_id)  # Add item_id for WHERE clause
-        cursor.execute(
-            f"UPDATE order_items SET {', '.join(updates)} WHERE id = ?",
-            tuple(values)
-        )
-        
-        # Update total amount if quantity changed
-        if 'quantity' in data:
-            # Recalculate order total
-            cursor.execute("""
-                SELECT oi.menu_item_id, oi.quantity 
-                FROM order_items oi 
-                WHERE oi.order_id = ?
-            """, (order_id,))
-            
-            items = cursor.fetchall()
-            total_amount = 0
-            
-            for item in items:
-                try:
-                    # Get current price from menu service
-                    menu_item_response = requests.get(
-                        f"{MENU_SERVICE_URL}/api/menu/{item['menu_item_id']}"
-                    )
-                    if menu_item_response.status_code == 200:
-                        menu_item = menu_item_response.json()
-                        price = menu_item.get('price', 0)
-                        total_amount += price * item['quantity']
-                except:
-                    # If we can't get the price, just continue with what we have
-                    pass
-            
-            # Update order total
-            cursor.execute(
-                "UPDATE orders SET total_amount = ? WHERE id = ?",
-                (total_amount, order_id)
-            )
-        
-        conn.commit()
+        order_id = order['id']
+        invalidate_orders([order_id])
+        notify_kitchen_queue()
         
         # Publish event for order item update
         publish_event('order_item_updated', {
             'order_id': order_id,
             'item_id': item_id,
-            'updated_fields': list(data.keys())
+            'updated_fields': list(data.keys()),
+            'version': order['version'],
+            'order': order
         })
         
         return jsonify({"message": "Order item updated successfully"})
     
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error updating order item {item_id}: {e}")
         return jsonify({"error": str(e)}), 500
+
+def apply_order_item_update(cursor, item_id, data):
+    """
+    Write operation updating an order item's status, notes or quantity.
+    Returns the snapshot of its order, or None if the item does not exist.
+    """
+    # Check if item exists and get order_id
+    cursor.execute("SELECT order_id FROM order_items WHERE id = ?", (item_id,))
+    result = cursor.fetchone()
+    
+    if not result:
+        return None
+    
+    order_id = result['order_id']
+    
+    # Build update query
+    updates = []
+    values = []
+    
+    # Update status if provided
+    if 'status' in data:
+        updates.append("status = ?")
+        values.append(data['status'])
+    
+    # Update notes if provided
+    if 'notes' in data:
+        updates.append("notes = ?")
+        values.append(data['notes'])
+    
+    # Update quantity if provided
+    if 'quantity' in data:
+        updates.append("quantity = ?")
+        values.append(data['quantity'])
+    
+    # Execute update
+    values.append(item_id)  # Add item_id for WHERE clause
+    cursor.execute(
+        f"UPDATE order_items SET {', '.join(updates)} WHERE id = ?",
+        tuple(values)
+    )
+    
+    # Update total amount if quantity changed
+    if 'quantity' in data:
+        update_order_total(cursor, order_id)
+    
+    cursor.execute(
+        "UPDATE orders SET version = version + 1 WHERE id = ?",
+        (order_id,)
+    )
+    
+    return get_order_snapshot(cursor, order_id)
+
+@app.route('/api/kitchen/queue', methods=['GET'])
+def get_kitchen_queue():
+    """
+    Kitchen queue change feed. Without `since`, returns every item of the
+    active orders. With `since`, returns only the items changed after that
+    version, waiting up to `timeout` seconds for a change. Clients pass the
+    returned version as `since` on their next request; `reset` tells them to
+    replace their queue instead of applying changes to it.
+    """
+    since = request.args.get('since', type=int)
+    timeout = max(0, min(request.args.get('timeout', KITCHEN_QUEUE_MAX_WAIT, type=float), KITCHEN_QUEUE_MAX_WAIT))
+    deadline = time.monotonic() + timeout
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        while True:
+            cursor.execute("SELECT COALESCE(MAX(change_seq), 0) FROM order_items")
+            version = cursor.fetchone()[0]
+            
+            # A version from before a database reset is no use to apply changes to
+            if since is None or since > version:
+                return jsonify({"version": version, "reset": True, "items": get_kitchen_queue_snapshot(cursor)})
+            
+            if version > since:
+                changes = get_kitchen_queue_changes(cursor, since)
+                # Too far behind; a snapshot is smaller than the changes
+                if changes is None:
+                    return jsonify({"version": version, "reset": True, "items": get_kitchen_queue_snapshot(cursor)})
+                return jsonify({"version": changes[-1]['change_seq'], "reset": False, "items": changes})
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return jsonify({"version": version, "reset": False, "items": []})
+            
+            # Wake on changes made by this process, and check periodically
+            # for changes made by other processes
+            with kitchen_queue_changed:
+                kitchen_queue_changed.wait(min(remaining, KITCHEN_QUEUE_CHECK_INTERVAL))
     
     finally:
         conn.close()
@@ -858,62 +1509,53 @@ def get_table_orders(table_number):
     cursor = conn.cursor()
     
     try:
-        # Get orders for this table that are active
-        cursor.execute("""
-            SELECT id, table_number, status, created_at, total_amount, payment_status
-            FROM orders
-            WHERE table_number = ? AND status NOT IN ('Completed', 'Cancelled')
-            ORDER BY created_at DESC
+        # Active orders of this table and their items in one query, newest
+        # order first
+        cursor.execute(f"""
+            SELECT o.id, o.table_number, o.status, o.created_at, o.total_amount, o.payment_status, o.version,
+                   oi.id AS item_id, oi.menu_item_id, oi.quantity, oi.notes, oi.status AS item_status,
+                   oi.unit_price, oi.discount_percentage,
+                   {EFFECTIVE_PRICE_SQL} AS effective_price, ROUND({LINE_TOTAL_SQL}, 2) AS line_total
+            FROM orders o
+            LEFT JOIN order_items oi ON oi.order_id = o.id
+            WHERE o.table_number = ? AND o.status NOT IN ('Completed', 'Cancelled')
+            ORDER BY o.created_ts DESC, o.id, oi.id
         """, (table_number,))
         
-        orders = cursor.fetchall()
-        orders_list = []
-        
-        for order in orders:
-            order_dict = dict(order)
-            
-            # Get order items
-            cursor.execute("""
-                SELECT id, menu_item_id, quantity, notes, status
-                FROM order_items
-                WHERE order_id = ?
-            """, (order['id'],))
-            
-            items = cursor.fetchall()
-            items_list = []
-            
-            # Get menu item details for each order item
-            for item in items:
-                item_dict = dict(item)
-                try:
-                    # Get item details from menu service
-                    menu_item_response = requests.get(
-                        f"{MENU_SERVICE_URL}/api/menu/{item['menu_item_id']}"
-                    )
-                    if menu_item_response.status_code == 200:
-                        menu_item = menu_item_response.json()
-                        item_dict.update({
-                            'name': menu_item.get('name', 'Unknown Item'),
-                            'price': menu_item.get('price', 0),
-                            'image_path': menu_item.get('image_path', '')
-                        })
-                    else:
-                        item_dict.update({
-                            'name': 'Unknown Item',
-                            'price': 0,
-                            'image_path': ''
-                        })
-                except requests.RequestException:
-                    item_dict.update({
-                        'name': 'Unknown Item',
-                        'price': 0,
-                        'image_path': ''
-                    })
-                
-                items_list.append(item_dict)
+        # Build the nested orders in one pass over the rows
+        orders = {}
+        for row in cursor.fetchall():
+            order = orders.get(row['id'])
+            if order is None:
+                order = orders[row['id']] = {
+                    'id': row['id'],
+                    'table_number': row['table_number'],
+                    'status': row['status'],
+                    'created_at': row['created_at'],
+                    'total_amount': row['total_amount'],
+                    'payment_status': row['payment_status'],
+                    'version': row['version'],
+                    'items': []
+                }
             
-            order_dict['items'] = items_list
-            orders_list.append(order_dict)
+            # Orders without items come back with one row of NULL item columns
+            if row['item_id'] is not None:
+                order['items'].append({
+                    'id': row['item_id'],
+                    'menu_item_id': row['menu_item_id'],
+                    'quantity': row['quantity'],
+                    'notes': row['notes'],
+                    'status': row['item_status'],
+                    'unit_price': row['unit_price'],
+                    'discount_percentage': row['discount_percentage'],
+                    'effective_price': row['effective_price'],
+                    'line_total': row['line_total']
+                })
+        
+        orders_list = list(orders.values())
+        
+        # Menu item details for every item of the table in one request
+        add_menu_details([item for order in orders_list for item in order['items']])
         
         return jsonify(orders_list)
     
@@ -961,6 +1603,33 @@ def validate_table_auth(auth_header, table_number):
 
 
 # Event Handlers
+def complete_paid_order(cursor, order_id):
+    """Write operation completing an order and its items after payment"""
+    # Update order status to Completed and payment status to paid
+    cursor.execute("""
+        UPDATE orders 
+        SET status = 'Completed', payment_status = 'paid', completed_at = ?,
+            version = version + 1
+        WHERE id = ?
+    """, (datetime.now().isoformat(), order_id))
+    
+    # Update all order items to Completed
+    cursor.execute("""
+        UPDATE order_items
+        SET status = 'Completed'
+        WHERE order_id = ?
+    """, (order_id,))
+    
+    return get_order_snapshot(cursor, order_id)
+
+@retry_on_busy
+def mark_order_paid(order_id):
+    """Complete an order and its items after payment, returning the new order state"""
+    order = run_write(complete_paid_order, order_id)
+    invalidate_orders([order_id])
+    notify_kitchen_queue()
+    return order
+
 def handle_payment_processed(payload):
     """Handle payment_processed event"""
     try:
@@ -969,32 +1638,19 @@ def handle_payment_processed(payload):
             logger.error("Payment processed event missing order_id")
             return
             
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Update order status to Completed and payment status to paid
-        cursor.execute("""
-            UPDATE orders 
-            SET status = 'Completed', payment_status = 'paid', completed_at = ?
-            WHERE id = ?
-        """, (datetime.now().isoformat(), order_id))
-        
-        # Update all order items to Completed
-        cursor.execute("""
-            UPDATE order_items
-            SET status = 'Completed'
-            WHERE order_id = ?
-        """, (order_id,))
-        
-        conn.commit()
-        conn.close()
+        order = mark_order_paid(order_id)
         
         # Publish order updated event
-        publish_event('order_updated', {
+        event_data = {
             'order_id': order_id,
             'status': 'Completed',
             'payment_status': 'paid'
-        })
+        }
+        if order:
+            event_data['version'] = order['version']
+            event_data['order'] = order
+        
+        publish_event('order_updated', event_data)
         
         logger.info(f"Order {order_id} marked as completed after payment")
         
@@ -1006,12 +1662,95 @@ def handle_menu_item_availability_updated(payload):
     # In a real implementation, we might need to cancel pending orders with unavailable items
     logger.info(f"Menu item availability updated: {payload}")
 
+def handle_menu_item_changed(payload):
+    """Handle menu_item_updated and menu_item_deleted events"""
+    item_id = payload.get('item_id')
+    if item_id is None:
+        return
+    invalidate_menu_items([int(item_id)])
+    logger.info(f"Menu item {item_id} changed, cached orders holding it invalidated")
+
+def handle_menu_updated(payload):
+    """Handle menu_updated event, sent after bulk menu changes"""
+    invalidate_menu_items()
+    logger.info("Menu updated, order cache cleared")
+
+def backfill_item_snapshots():
+    """
+    Fill in the price snapshots of order items created before they were
+    stored, using the current menu. Those items were charged the menu price
+    without discount, so their discount stays 0.
+    """
+    retry_count = 0
+    max_retries = 5
+    
+    while retry_count < max_retries:
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT menu_item_id FROM order_items WHERE unit_price IS NULL")
+            menu_item_ids = [row['menu_item_id'] for row in cursor.fetchall()]
+            if not menu_item_ids:
+                return
+            
+            menu_items = get_menu_items(menu_item_ids)
+            if menu_items:
+                cursor.executemany("""
+                    UPDATE order_items
+                    SET unit_price = ?, name = COALESCE(name, ?), category = COALESCE(category, ?)
+                    WHERE menu_item_id = ? AND unit_price IS NULL
+                """, [
+                    (menu_item.get('price', 0), menu_item.get('name'), menu_item.get('category'), menu_item_id)
+                    for menu_item_id, menu_item in menu_items.items()
+                ])
+                conn.commit()
+                logger.info(f"Backfilled order item price snapshots for {len(menu_items)} menu items")
+                return
+        finally:
+            conn.close()
+        
+        retry_count += 1
+        wait_time = 2 ** retry_count  # Exponential backoff
+        logger.warning(f"Could not fetch menu items for price snapshot backfill. Retrying in {wait_time}s...")
+        time.sleep(wait_time)
+    
+    logger.error(f"Gave up backfilling order item price snapshots after {max_retries} attempts")
+
+def archive_orders_periodically():
+    """
+    Move old finished orders to the archive tables every ARCHIVE_INTERVAL
+    seconds. The first run waits one interval, after the price snapshot
+    backfill has had its chance to run.
+    """
+    while True:
+        time.sleep(ARCHIVE_INTERVAL)
+        
+        conn = get_db_connection()
+        try:
+            archive_finished_orders(conn, ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE)
+        except Exception as e:
+            logger.error(f"Error archiving finished orders: {e}")
+        finally:
+            conn.close()
+
+# Backfill in the background; the Menu Service may still be starting
+threading.Thread(target=backfill_item_snapshots, daemon=True).start()
+
+if ARCHIVE_AFTER_DAYS > 0:
+    threading.Thread(target=archive_orders_periodically, daemon=True).start()
+
 # Register event handlers
 register_event_handler('payment_processed', handle_payment_processed)
 register_event_handler('menu_item_availability_updated', handle_menu_item_availability_updated)
+register_event_handler('menu_item_updated', handle_menu_item_changed)
+register_event_handler('menu_item_deleted', handle_menu_item_changed)
+register_event_handler('menu_updated', handle_menu_updated)
 
 # Setup consumer
-setup_consumer(['payment_processed', 'menu_item_availability_updated'])
+setup_consumer([
+    'payment_processed', 'menu_item_availability_updated',
+    'menu_item_updated', 'menu_item_deleted', 'menu_updated'
+])
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5002)
\ No newline at end of file
@@ -0,0 +1,106 @@
+import time
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Operational tables and the archive tables their old orders are moved to.
+# Reports run over both; live views (kitchen, tables, listings) over the first.
+ORDER_TABLES = [('orders', 'order_items'), ('orders_archive', 'order_items_archive')]
+
+# Columns copied to the archive tables
+ORDER_COLUMNS = [
+    'id', 'table_number', 'status', 'created_at', 'completed_at', 'payment_status',
+    'total_amount', 'version', 'created_ts', 'business_day'
+]
+ORDER_ITEM_COLUMNS = [
+    'id', 'order_id', 'menu_item_id', 'quantity', 'notes', 'status',
+    'unit_price', 'discount_percentage', 'name', 'category', 'change_seq'
+]
+
+# Statuses of orders that no longer change
+FINISHED_ORDER_STATUSES = ['Completed', 'Cancelled']
+
+def union_order_tables(query):
+    """
+    Run a query written against {orders} and {order_items} over the operational
+    and the archive tables, combined with UNION ALL. Its parameters have to be
+    passed once per table pair.
+    """
+    return "\nUNION ALL\n".join(
+        query.format(orders=orders, order_items=order_items)
+        for orders, order_items in ORDER_TABLES
+    )
+
+def archive_batch(conn, before, batch_size):
+    """
+    Move up to batch_size orders finished before a local datetime, with their
+    items, into the archive tables in one short transaction. Returns the
+    number of orders moved.
+    """
+    cursor = conn.cursor()
+    statuses = ', '.join('?' for _ in FINISHED_ORDER_STATUSES)
+    
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        # An order finished before the cutoff was also created before it, so
+        # the created_ts bound keeps this a range scan of the status index.
+        # The order holding the newest change_seq stays, so the kitchen queue
+        # sequence never goes backwards.
+        cursor.execute(f"""
+            SELECT id
+            FROM orders
+            WHERE status IN ({statuses})
+              AND created_ts < ?
+              AND COALESCE(completed_at, created_at) < ?
+              AND id IS NOT (SELECT order_id FROM order_items ORDER BY change_seq DESC LIMIT 1)
+            LIMIT ?
+        """, FINISHED_ORDER_STATUSES + [int(before.timestamp()), before.isoformat(), batch_size])
+        order_ids = [row[0] for row in cursor.fetchall()]
+        
+        if not order_ids:
+            conn.rollback()
+            return 0
+        
+        placeholders = ', '.join('?' for _ in order_ids)
+        order_columns = ', '.join(ORDER_COLUMNS)
+        item_columns = ', '.join(ORDER_ITEM_COLUMNS)
+        
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO orders_archive ({order_columns})
+            SELECT {order_columns} FROM orders WHERE id IN ({placeholders})
+        """, order_ids)
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO order_items_archive ({item_columns})
+            SELECT {item_columns} FROM order_items WHERE order_id IN ({placeholders})
+        """, order_ids)
+        cursor.execute(f"DELETE FROM order_items WHERE order_id IN ({placeholders})", order_ids)
+        cursor.execute(f"DELETE FROM orders WHERE id IN ({placeholders})", order_ids)
+        
+        conn.commit()
+        return len(order_ids)
+    
+    except Exception:
+        conn.rollback()
+        raise
+
+def archive_finished_orders(conn, days, batch_size=200, pause=0.05):
+    """
+    Move the orders completed or cancelled more than `days` days ago into the
+    archive tables, batch by batch. Pausing between batches lets the live
+    writers take the write lock. Returns the number of orders moved.
+    """
+    before = datetime.now() - timedelta(days=days)
+    archived = 0
+    
+    while True:
+        moved = archive_batch(conn, before, batch_size)
+        archived += moved
+        if moved < batch_size:
+            break
+        time.sleep(pause)
+    
+    if archived:
+        logger.info(f"Archived {archived} orders finished before {before.isoformat()}")
+    return archived
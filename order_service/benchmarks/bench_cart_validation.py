@@ -0,0 +1,105 @@
+"""
+Benchmark of cart validation in create_order: one Menu Service request per
+cart item in sequence, against concurrent requests for the distinct items
+through a bounded pool. Carts of 1, 4, 12 and 25 items drawn from a 40-item
+menu, so larger carts repeat items.
+
+A small local HTTP server stands in for the Menu Service, answering each
+request after --latency-ms to model its handler and the network hop.
+
+Usage:
+    python benchmarks/bench_cart_validation.py [--latency-ms 5] [--repeat 200]
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MENU_ITEMS = 40
+CART_SIZES = [1, 4, 12, 25]
+
+class MenuHandler(BaseHTTPRequestHandler):
+    """Serves /api/menu/<id> like the Menu Service, after a fixed delay"""
+    
+    latency = 0
+    
+    def do_GET(self):
+        time.sleep(self.latency)
+        item_id = int(self.path.rsplit('/', 1)[1])
+        data = json.dumps({'id': item_id, 'name': f'Item {item_id}', 'price': 5.0 + item_id % 10,
+                           'available': True}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+class MenuServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops concurrent connects; Werkzeug uses 128
+    request_queue_size = 128
+
+def fetch_menu_item(menu_url, menu_item_id):
+    with urllib.request.urlopen(f"{menu_url}/api/menu/{menu_item_id}", timeout=2) as response:
+        return json.loads(response.read())
+
+def validate_serial(menu_url, pool, cart):
+    """The original validation: one request per cart item, in order"""
+    return [fetch_menu_item(menu_url, menu_item_id) for menu_item_id in cart]
+
+def validate_parallel(menu_url, pool, cart):
+    """The current validation: distinct items fetched concurrently"""
+    futures = {pool.submit(fetch_menu_item, menu_url, menu_item_id): menu_item_id
+               for menu_item_id in dict.fromkeys(cart)}
+    menu_items = {}
+    for future in as_completed(futures):
+        menu_items[futures[future]] = future.result()
+    return [menu_items[menu_item_id] for menu_item_id in cart]
+
+def measure(validate, menu_url, pool, carts):
+    timings = []
+    for cart in carts:
+        start = time.perf_counter()
+        validate(menu_url, pool, cart)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=5)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+    
+    MenuHandler.latency = args.latency_ms / 1000
+    server = MenuServer(('127.0.0.1', 0), MenuHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    menu_url = f"http://127.0.0.1:{server.server_address[1]}"
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    rng = random.Random(3)
+    
+    print(f"{'cart items':<12}{'distinct':>9}{'serial p50':>12}{'p99':>8}{'parallel p50':>14}{'p99':>8}")
+    for size in CART_SIZES:
+        carts = [[rng.randint(1, MENU_ITEMS) for _ in range(size)] for _ in range(args.repeat)]
+        distinct = statistics.mean(len(set(cart)) for cart in carts)
+        
+        # Both must resolve the same items
+        assert validate_serial(menu_url, pool, carts[0]) == validate_parallel(menu_url, pool, carts[0])
+        
+        serial = measure(validate_serial, menu_url, pool, carts)
+        parallel = measure(validate_parallel, menu_url, pool, carts)
+        print(f"{size:<12}{distinct:>9.1f}{serial[0]:>12.1f}{serial[1]:>8.1f}{parallel[0]:>14.1f}{parallel[1]:>8.1f}")
+    
+    pool.shutdown()
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
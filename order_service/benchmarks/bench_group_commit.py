@@ -0,0 +1,158 @@
+"""
+Benchmark of order creation under concurrent clients: one transaction and
+commit per order, as the service does by default, against group commit
+through one writer thread (ORDER_GROUP_COMMIT=true). Each client inserts
+orders back to back for a fixed time; 50 and 200 clients by default.
+
+Usage:
+    python benchmarks/bench_group_commit.py [--clients 50 200] [--seconds 5]
+"""
+import argparse
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bench_queries import create_base_schema
+from migrations import run_migrations
+from db.pool import get_connection, get_pool, retry_on_busy
+from db.group_commit import GroupCommitWriter
+
+MENU_ITEMS = 40
+
+def insert_order(cursor, order_id, table_number, items):
+    """Same statements as the service's insert_order write operation"""
+    created_at = datetime.now()
+    cursor.execute("""
+        INSERT INTO orders (id, table_number, status, created_at, created_ts, business_day,
+                            payment_status, version)
+        VALUES (?, ?, 'Pending', ?, ?, ?, 'unpaid', 1)
+    """, (order_id, table_number, created_at.isoformat(), int(created_at.timestamp()),
+          created_at.strftime('%Y-%m-%d')))
+    
+    for menu_item_id, quantity, price in items:
+        cursor.execute("""
+            INSERT INTO order_items (order_id, menu_item_id, quantity, notes, status,
+                                     unit_price, discount_percentage, name, category)
+            VALUES (?, ?, ?, '', 'Pending', ?, 0, ?, 'Main')
+        """, (order_id, menu_item_id, quantity, price, f'Item {menu_item_id}'))
+    
+    cursor.execute("""
+        UPDATE orders
+        SET total_amount = (
+            SELECT ROUND(COALESCE(SUM(oi.quantity * oi.unit_price * (100 - oi.discount_percentage) / 100.0), 0), 2)
+            FROM order_items oi
+            WHERE oi.order_id = orders.id
+        )
+        WHERE id = ?
+    """, (order_id,))
+    
+    cursor.execute("SELECT version FROM orders WHERE id = ?", (order_id,))
+    return cursor.fetchone()[0]
+
+def make_direct_write(database):
+    """One pooled connection, transaction and commit per order"""
+    @retry_on_busy(retries=10)
+    def write(*args):
+        conn = get_connection(database)
+        try:
+            result = insert_order(conn.cursor(), *args)
+            conn.commit()
+            return result
+        finally:
+            conn.close()
+    return write
+
+def make_group_write(database):
+    """Orders from all clients share the writer thread's transactions"""
+    writer = GroupCommitWriter(database)
+    return lambda *args: writer.execute(insert_order, *args)
+
+def seed(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    
+    conn = sqlite3.connect(path)
+    create_base_schema(conn)
+    run_migrations(conn)
+    conn.close()
+
+def run(write, clients, seconds):
+    """Run clients inserting orders for a number of seconds"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(clients + 1)
+    stop_at = []
+    
+    def client(number):
+        rng = random.Random(number)
+        local_latencies = []
+        local_errors = 0
+        start_barrier.wait()
+        
+        while time.perf_counter() < stop_at[0]:
+            items = [(rng.randint(1, MENU_ITEMS), rng.randint(1, 3), 5.0 + rng.randint(0, 9))
+                     for _ in range(rng.randint(1, 4))]
+            started = time.perf_counter()
+            try:
+                write(str(uuid.uuid4()), rng.randint(1, 30), items)
+                local_latencies.append((time.perf_counter() - started) * 1000)
+            except sqlite3.Error:
+                local_errors += 1
+        
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+    
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    
+    stop_at.append(time.perf_counter() + seconds)
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    
+    latencies.sort()
+    return {
+        'orders_per_second': len(latencies) / seconds,
+        'p50': statistics.median(latencies) if latencies else 0,
+        'p99': latencies[int(len(latencies) * 0.99)] if latencies else 0,
+        'errors': sum(errors)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--db', default=os.path.join('/tmp', 'group_commit_bench.db'))
+    args = parser.parse_args()
+    
+    # The per-request writers retry busy errors; don't log every retry
+    logging.getLogger('db.pool').setLevel(logging.ERROR)
+    
+    print(f"{'clients':<9}{'mode':<14}{'orders/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'errors':>8}")
+    for clients in args.clients:
+        for mode, make_write in (('per request', make_direct_write), ('group commit', make_group_write)):
+            seed(args.db)
+            result = run(make_write(args.db), clients, args.seconds)
+            get_pool(args.db).close_all()
+            print(f"{clients:<9}{mode:<14}{result['orders_per_second']:>10.0f}"
+                  f"{result['p50']:>10.2f}{result['p99']:>10.2f}{result['errors']:>8}")
+    
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+
+if __name__ == '__main__':
+    main()
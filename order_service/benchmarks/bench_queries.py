@@ -0,0 +1,295 @@
+"""
+Benchmark of the Order Service hot queries over a seeded database: the
+original queries on the original schema, then the current queries after
+running the schema migrations.
+
+Usage:
+    python benchmarks/bench_queries.py [--orders 1000000] [--db /tmp/orders_bench.db]
+
+The seeded database is kept between runs; pass --reseed to rebuild it.
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'common'))
+from migrations import run_migrations
+
+STATUSES = ['Pending', 'In Progress', 'Ready', 'Delivered']
+TABLES = 30
+MENU_ITEMS = 40
+
+def create_base_schema(conn):
+    """Create the tables the way create_tables does, before any migration"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS orders (
+        id TEXT PRIMARY KEY,
+        table_number INTEGER,
+        status TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        completed_at TIMESTAMP,
+        payment_status TEXT NOT NULL,
+        total_amount REAL DEFAULT 0
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS order_items (
+        id INTEGER PRIMARY KEY,
+        order_id TEXT NOT NULL,
+        menu_item_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        notes TEXT,
+        status TEXT NOT NULL,
+        FOREIGN KEY (order_id) REFERENCES orders (id)
+    )
+    ''')
+    conn.commit()
+
+def seed(path, order_count):
+    """Seed order history spread over three years plus a few active orders"""
+    if os.path.exists(path):
+        os.remove(path)
+    
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    create_base_schema(conn)
+    
+    rng = random.Random(42)
+    now = datetime.now()
+    span = timedelta(days=3 * 365).total_seconds()
+    active = 50
+    
+    def rows():
+        for i in range(order_count):
+            order_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            if i >= order_count - active:
+                created = now - timedelta(minutes=rng.randint(0, 90))
+                status = rng.choice(STATUSES)
+                completed_at = None
+                payment_status = 'unpaid'
+            else:
+                created = now - timedelta(seconds=rng.random() * span)
+                status = 'Cancelled' if rng.random() < 0.03 else 'Completed'
+                completed_at = (created + timedelta(minutes=45)).isoformat()
+                payment_status = 'paid'
+            
+            items = []
+            total = 0.0
+            for _ in range(rng.randint(1, 4)):
+                quantity = rng.randint(1, 3)
+                total += quantity * (5 + (rng.randint(1, MENU_ITEMS) % 10))
+                item_status = status if status in ('Completed', 'Cancelled') else rng.choice(STATUSES[:3])
+                items.append((order_id, rng.randint(1, MENU_ITEMS), quantity, '', item_status))
+            
+            yield (order_id, rng.randint(1, TABLES), status, created.isoformat(),
+                   completed_at, payment_status, round(total, 2)), items
+    
+    batch_orders, batch_items = [], []
+    for order, items in rows():
+        batch_orders.append(order)
+        batch_items.extend(items)
+        if len(batch_orders) >= 50000:
+            flush(conn, batch_orders, batch_items)
+            batch_orders, batch_items = [], []
+    flush(conn, batch_orders, batch_items)
+    
+    conn.close()
+
+def flush(conn, orders, items):
+    conn.executemany("""
+        INSERT INTO orders (id, table_number, status, created_at, completed_at, payment_status, total_amount)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, orders)
+    conn.executemany("""
+        INSERT INTO order_items (order_id, menu_item_id, quantity, notes, status)
+        VALUES (?, ?, ?, ?, ?)
+    """, items)
+    conn.commit()
+
+def get_table_orders(conn, table_number, order_column='created_ts'):
+    """Same queries as the /api/orders/table/<n> route (without menu calls)"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT id, table_number, status, created_at, total_amount, payment_status
+        FROM orders
+        WHERE table_number = ? AND status NOT IN ('Completed', 'Cancelled')
+        ORDER BY {order_column} DESC
+    """, (table_number,))
+    orders = cursor.fetchall()
+    for order in orders:
+        cursor.execute("""
+            SELECT id, menu_item_id, quantity, notes, status
+            FROM order_items
+            WHERE order_id = ?
+        """, (order[0],))
+        cursor.fetchall()
+    return orders
+
+def build_legacy_queries():
+    """Queries as written against the original schema, before any migration"""
+    end_date = datetime.now()
+    month_start = end_date - timedelta(days=365)
+    
+    get_orders = """
+        SELECT o.id, o.table_number, o.status, o.created_at, o.completed_at, o.total_amount,
+               (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id) as item_count
+        FROM orders o
+        WHERE {where}
+        ORDER BY o.created_at DESC
+    """
+    
+    return [
+        ('get_orders status=Pending', get_orders.format(where="o.status = ?"), ('Pending',)),
+        ('get_orders date=today', get_orders.format(where="DATE(o.created_at) = DATE('now')"), ()),
+        ('get_table_orders', get_table_orders, (7, 'created_at')),
+        ('get_order_items date=today status=Pending', """
+            SELECT oi.id, oi.order_id, oi.menu_item_id, oi.quantity, oi.notes, oi.status,
+                   o.created_at, o.table_number
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            WHERE oi.status = ? AND DATE(o.created_at) = DATE('now')
+            ORDER BY o.created_at DESC, oi.id ASC
+        """, ('Pending',)),
+        ('report daily (30 days)', """
+            SELECT DATE(o.created_at) as date, COUNT(o.id) as order_count,
+                   SUM(o.total_amount) as total_amount, COUNT(oi.id) as item_count
+            FROM orders o
+            LEFT JOIN order_items oi ON o.id = oi.order_id
+            WHERE o.created_at >= ? AND o.created_at <= ? AND o.status != 'Cancelled'
+            GROUP BY DATE(o.created_at)
+            ORDER BY DATE(o.created_at) DESC
+        """, ((end_date - timedelta(days=30)).strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))),
+        ('report monthly (12 months)', """
+            SELECT strftime('%Y-%m', o.created_at) as month, COUNT(o.id) as order_count,
+                   SUM(o.total_amount) as total_amount, COUNT(oi.id) as item_count
+            FROM orders o
+            LEFT JOIN order_items oi ON o.id = oi.order_id
+            WHERE o.created_at >= ? AND o.created_at <= ? AND o.status != 'Cancelled'
+            GROUP BY strftime('%Y-%m', o.created_at)
+            ORDER BY strftime('%Y-%m', o.created_at) DESC
+        """, (month_start.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))),
+        ('report popular items (week)', """
+            SELECT oi.menu_item_id, SUM(oi.quantity) as quantity
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            WHERE o.status != 'Cancelled' AND o.created_at >= date('now', '-7 days')
+            GROUP BY oi.menu_item_id
+            ORDER BY quantity DESC
+        """, ()),
+    ]
+
+def build_queries():
+    """Queries issued by get_orders, get_order_items and the report functions"""
+    end_date = datetime.now()
+    today = end_date.strftime('%Y-%m-%d')
+    month_start = end_date - timedelta(days=365)
+    
+    get_orders = """
+        SELECT o.id, o.table_number, o.status, o.created_at, o.completed_at, o.total_amount,
+               (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id) as item_count
+        FROM orders o
+        WHERE {where}
+        ORDER BY o.created_ts DESC
+    """
+    
+    return [
+        ('get_orders status=Pending', get_orders.format(where="o.status = ?"), ('Pending',)),
+        ('get_orders date=today', get_orders.format(where="o.business_day = ?"), (today,)),
+        ('get_table_orders', get_table_orders, (7,)),
+        ('get_order_items date=today status=Pending', """
+            SELECT oi.id, oi.order_id, oi.menu_item_id, oi.quantity, oi.notes, oi.status,
+                   o.created_at, o.table_number
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            WHERE oi.status = ? AND o.business_day = ?
+            ORDER BY o.created_ts DESC, oi.id ASC
+        """, ('Pending', today)),
+        ('report daily (30 days)', """
+            SELECT o.business_day as date, COUNT(o.id) as order_count,
+                   SUM(o.total_amount) as total_amount, COUNT(oi.id) as item_count
+            FROM orders o
+            LEFT JOIN order_items oi ON o.id = oi.order_id
+            WHERE o.created_ts >= ? AND o.created_ts <= ? AND o.status != 'Cancelled'
+            GROUP BY o.business_day
+            ORDER BY o.business_day DESC
+        """, (int((end_date - timedelta(days=30)).timestamp()), int(end_date.timestamp()))),
+        ('report monthly (12 months)', """
+            SELECT substr(o.business_day, 1, 7) as month, COUNT(o.id) as order_count,
+                   SUM(o.total_amount) as total_amount, COUNT(oi.id) as item_count
+            FROM orders o
+            LEFT JOIN order_items oi ON o.id = oi.order_id
+            WHERE o.business_day >= ? AND o.business_day <= ? AND o.status != 'Cancelled'
+            GROUP BY substr(o.business_day, 1, 7)
+            ORDER BY substr(o.business_day, 1, 7) DESC
+        """, (month_start.strftime('%Y-%m-%d'), today)),
+        ('report popular items (week)', """
+            SELECT oi.menu_item_id, COALESCE(MAX(oi.name), 'Item #' || oi.menu_item_id) as name,
+                   SUM(oi.quantity) as quantity,
+                   ROUND(SUM(oi.quantity * COALESCE(oi.unit_price, 0) * (100 - oi.discount_percentage) / 100.0), 2) as revenue
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            WHERE o.status != 'Cancelled' AND o.business_day >= ?
+            GROUP BY oi.menu_item_id
+            ORDER BY quantity DESC
+        """, ((end_date - timedelta(days=7)).strftime('%Y-%m-%d'),)),
+    ]
+
+def time_query(conn, query, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if callable(query):
+            query(conn, *params)
+        else:
+            conn.execute(query, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def run(conn, queries, repeat):
+    return {name: time_query(conn, query, params, repeat) for name, query, params in queries}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--db', default=os.path.join('/tmp', 'orders_bench.db'))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--reseed', action='store_true')
+    args = parser.parse_args()
+    
+    if args.reseed or not os.path.exists(args.db):
+        print(f"Seeding {args.orders} orders into {args.db}...")
+        start = time.perf_counter()
+        seed(args.db, args.orders)
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+    
+    # Work on a copy so the seeded baseline can be reused
+    work_db = args.db + '.work'
+    shutil.copyfile(args.db, work_db)
+    conn = sqlite3.connect(work_db)
+    
+    before = run(conn, build_legacy_queries(), args.repeat)
+    
+    start = time.perf_counter()
+    version = run_migrations(conn)
+    print(f"Migrated to schema version {version} in {time.perf_counter() - start:.1f}s")
+    
+    after = run(conn, build_queries(), args.repeat)
+    conn.close()
+    os.remove(work_db)
+    
+    print(f"\n{'query':<45}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float('inf')
+        print(f"{name:<45}{before[name]:>14.2f}{after[name]:>14.2f}{speedup:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Benchmark of the /api/orders/table/<n> view: the original per-order item
+queries with one menu request per item, against the single JOIN with one
+bulk menu request. Tables hold 1, 10 and 50 active orders.
+
+A small local HTTP server stands in for the Menu Service so the menu round
+trips are real requests.
+
+Usage:
+    python benchmarks/bench_table_orders.py [--history 100000] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bench_queries import create_base_schema
+from migrations import run_migrations
+
+MENU_ITEMS = 40
+# Table number -> active orders
+ACTIVE_TABLES = {1: 1, 2: 10, 3: 50}
+
+class MenuHandler(BaseHTTPRequestHandler):
+    """Serves /api/menu/<id> and /api/menu?ids=... like the Menu Service"""
+    
+    def menu_item(self, item_id):
+        return {'id': item_id, 'name': f'Item {item_id}', 'price': 5.0 + item_id % 10, 'image_path': ''}
+    
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path == '/api/menu':
+            ids = urllib.parse.parse_qs(url.query).get('ids', [''])[0]
+            body = [self.menu_item(int(item_id)) for item_id in ids.split(',') if item_id]
+        else:
+            body = self.menu_item(int(url.path.rsplit('/', 1)[1]))
+        
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+def get_json(url):
+    with urllib.request.urlopen(url) as response:
+        return json.loads(response.read())
+
+def seed(path, history):
+    """Seed order history plus the active orders of the benchmarked tables"""
+    if os.path.exists(path):
+        os.remove(path)
+    
+    conn = sqlite3.connect(path)
+    create_base_schema(conn)
+    run_migrations(conn)
+    
+    rng = random.Random(7)
+    now = datetime.now()
+    orders, items = [], []
+    
+    def add_order(table_number, created, status):
+        order_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        orders.append((order_id, table_number, status, created.isoformat(), int(created.timestamp()),
+                       created.strftime('%Y-%m-%d'), 'paid' if status == 'Completed' else 'unpaid'))
+        for _ in range(rng.randint(1, 4)):
+            items.append((order_id, rng.randint(1, MENU_ITEMS), rng.randint(1, 3), '', 'Pending'))
+    
+    for _ in range(history):
+        add_order(rng.randint(1, 30), now - timedelta(seconds=rng.random() * 365 * 86400), 'Completed')
+    for table_number, active in ACTIVE_TABLES.items():
+        for _ in range(active):
+            add_order(table_number, now - timedelta(minutes=rng.randint(0, 90)), 'Pending')
+    
+    conn.executemany("""
+        INSERT INTO orders (id, table_number, status, created_at, created_ts, business_day, payment_status, version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+    """, orders)
+    conn.executemany("""
+        INSERT INTO order_items (order_id, menu_item_id, quantity, notes, status)
+        VALUES (?, ?, ?, ?, ?)
+    """, items)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+def table_orders_per_item(conn, menu_url, table_number):
+    """The original view: items queried per order, one menu request per item"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, table_number, status, created_at, total_amount, payment_status, version
+        FROM orders
+        WHERE table_number = ? AND status NOT IN ('Completed', 'Cancelled')
+        ORDER BY created_ts DESC
+    """, (table_number,))
+    
+    orders_list = []
+    for order in cursor.fetchall():
+        order_dict = dict(order)
+        cursor.execute("""
+            SELECT id, menu_item_id, quantity, notes, status
+            FROM order_items
+            WHERE order_id = ?
+        """, (order['id'],))
+        
+        items_list = []
+        for item in cursor.fetchall():
+            item_dict = dict(item)
+            menu_item = get_json(f"{menu_url}/api/menu/{item['menu_item_id']}")
+            item_dict.update({
+                'name': menu_item['name'],
+                'price': menu_item['price'],
+                'image_path': menu_item['image_path']
+            })
+            items_list.append(item_dict)
+        
+        order_dict['items'] = items_list
+        orders_list.append(order_dict)
+    
+    return orders_list
+
+def table_orders_joined(conn, menu_url, table_number):
+    """The current view: one JOIN built in a single pass, one bulk menu request"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT o.id, o.table_number, o.status, o.created_at, o.total_amount, o.payment_status, o.version,
+               oi.id AS item_id, oi.menu_item_id, oi.quantity, oi.notes, oi.status AS item_status
+        FROM orders o
+        LEFT JOIN order_items oi ON oi.order_id = o.id
+        WHERE o.table_number = ? AND o.status NOT IN ('Completed', 'Cancelled')
+        ORDER BY o.created_ts DESC, o.id, oi.id
+    """, (table_number,))
+    
+    orders = {}
+    for row in cursor.fetchall():
+        order = orders.get(row['id'])
+        if order is None:
+            order = orders[row['id']] = {
+                'id': row['id'],
+                'table_number': row['table_number'],
+                'status': row['status'],
+                'created_at': row['created_at'],
+                'total_amount': row['total_amount'],
+                'payment_status': row['payment_status'],
+                'version': row['version'],
+                'items': []
+            }
+        if row['item_id'] is not None:
+            order['items'].append({
+                'id': row['item_id'],
+                'menu_item_id': row['menu_item_id'],
+                'quantity': row['quantity'],
+                'notes': row['notes'],
+                'status': row['item_status']
+            })
+    
+    items = [item for order in orders.values() for item in order['items']]
+    ids = ','.join(str(i) for i in sorted({item['menu_item_id'] for item in items}))
+    menu_items = {m['id']: m for m in get_json(f"{menu_url}/api/menu?ids={ids}")} if ids else {}
+    for item in items:
+        menu_item = menu_items[item['menu_item_id']]
+        item.update({
+            'name': menu_item['name'],
+            'price': menu_item['price'],
+            'image_path': menu_item['image_path']
+        })
+    
+    return list(orders.values())
+
+def normalize(orders):
+    """Orders and their items sorted by id, for comparing the two views"""
+    return sorted(
+        (dict(order, items=sorted(order['items'], key=lambda item: item['id'])) for order in orders),
+        key=lambda order: order['id']
+    )
+
+def time_view(view, conn, menu_url, table_number, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        view(conn, menu_url, table_number)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, default=100000)
+    parser.add_argument('--db', default=os.path.join('/tmp', 'table_orders_bench.db'))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    seed(args.db, args.history)
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MenuHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    menu_url = f"http://127.0.0.1:{server.server_address[1]}"
+    
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    
+    print(f"{'active orders':<16}{'per item (ms)':>16}{'joined (ms)':>14}{'speedup':>10}")
+    for table_number, active in ACTIVE_TABLES.items():
+        # Both views must return the same orders
+        assert normalize(table_orders_per_item(conn, menu_url, table_number)) == \
+            normalize(table_orders_joined(conn, menu_url, table_number))
+        
+        before = time_view(table_orders_per_item, conn, menu_url, table_number, args.repeat)
+        after = time_view(table_orders_joined, conn, menu_url, table_number, args.repeat)
+        print(f"{active:<16}{before:>16.2f}{after:>14.2f}{before / after:>9.1f}x")
+    
+    conn.close()
+    server.shutdown()
+    os.remove(args.db)
+
+if __name__ == '__main__':
+    main()
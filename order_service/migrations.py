@@ -0,0 +1,314 @@
+import os
+import logging
+from datetime import datetime
+
+from db.idempotency import create_idempotency_table
+
+logger = logging.getLogger(__name__)
+
+# Registry of schema migrations, applied in version order
+MIGRATIONS = []
+
+def migration(version, name):
+    """Register a schema migration function under a version number"""
+    def decorator(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+def get_columns(cursor, table):
+    """Return the column names of a table"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [column[1] for column in cursor.fetchall()]
+
+@migration(1, 'add_orders_version')
+def add_orders_version(cursor):
+    # Databases created before order deltas were pushed have no version column
+    if 'version' not in get_columns(cursor, 'orders'):
+        cursor.execute("ALTER TABLE orders ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+@migration(2, 'add_order_indexes')
+def add_order_indexes(cursor):
+    # Item lookups by order; covers the report aggregates over quantities
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_items_order
+        ON order_items (order_id, menu_item_id, quantity, status)
+    """)
+    
+    # Kitchen queue filters items by status
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_items_status
+        ON order_items (status, order_id)
+    """)
+    
+    # Active orders of a table, newest first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_table_status
+        ON orders (table_number, status, created_at)
+    """)
+    
+    # Order listing filtered by status, newest first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_status_created
+        ON orders (status, created_at)
+    """)
+    
+    # Date range reports; covers the columns they aggregate
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_created
+        ON orders (created_at, status, total_amount)
+    """)
+    
+    # Same-day filters written as DATE(created_at) = ...
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_created_date
+        ON orders (DATE(created_at))
+    """)
+    
+    # Give the planner statistics to choose between the new indexes
+    cursor.execute("ANALYZE")
+
+@migration(3, 'add_order_time_columns')
+def add_order_time_columns(cursor):
+    columns = get_columns(cursor, 'orders')
+    
+    # Epoch seconds and local business day, so date filters can be written
+    # as index range predicates instead of DATE()/strftime() over created_at
+    if 'created_ts' not in columns:
+        cursor.execute("ALTER TABLE orders ADD COLUMN created_ts INTEGER")
+    if 'business_day' not in columns:
+        cursor.execute("ALTER TABLE orders ADD COLUMN business_day TEXT")
+    
+    # created_at holds local time; the 'utc' modifier converts it before
+    # taking the epoch, matching datetime.timestamp() in the service
+    start_hour = int(os.getenv('BUSINESS_DAY_START_HOUR', 0))
+    cursor.execute("""
+        UPDATE orders
+        SET created_ts = CAST(strftime('%s', created_at, 'utc') AS INTEGER),
+            business_day = DATE(created_at, ?)
+        WHERE created_ts IS NULL OR business_day IS NULL
+    """, (f'-{start_hour} hours',))
+    
+    # Rolling time windows and report ranges; covers the report aggregates
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_created_ts
+        ON orders (created_ts, business_day, status, total_amount)
+    """)
+    
+    # Calendar day filters (today, yesterday, this month)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_business_day
+        ON orders (business_day, status)
+    """)
+    
+    # Listings are now ordered by created_ts
+    cursor.execute("DROP INDEX IF EXISTS idx_orders_table_status")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_table_status
+        ON orders (table_number, status, created_ts)
+    """)
+    cursor.execute("DROP INDEX IF EXISTS idx_orders_status_created")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_status_created
+        ON orders (status, created_ts)
+    """)
+    
+    # Superseded by the indexes above
+    cursor.execute("DROP INDEX IF EXISTS idx_orders_created")
+    cursor.execute("DROP INDEX IF EXISTS idx_orders_created_date")
+    
+    cursor.execute("ANALYZE")
+
+@migration(4, 'add_order_keyset_indexes')
+def add_order_keyset_indexes(cursor):
+    # Listings page through orders by (created_ts, id), newest first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_keyset
+        ON orders (created_ts, id)
+    """)
+    
+    # Same key after a status or calendar day filter
+    cursor.execute("DROP INDEX IF EXISTS idx_orders_status_created")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_status_created
+        ON orders (status, created_ts, id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_day_keyset
+        ON orders (business_day, created_ts, id)
+    """)
+    
+    cursor.execute("ANALYZE")
+
+@migration(5, 'add_order_item_price_snapshots')
+def add_order_item_price_snapshots(cursor):
+    columns = get_columns(cursor, 'order_items')
+    
+    # Menu details as they were when the item was ordered. Items created
+    # before this migration are filled in from the current menu at startup.
+    if 'unit_price' not in columns:
+        cursor.execute("ALTER TABLE order_items ADD COLUMN unit_price REAL")
+    if 'discount_percentage' not in columns:
+        cursor.execute("ALTER TABLE order_items ADD COLUMN discount_percentage INTEGER NOT NULL DEFAULT 0")
+    if 'name' not in columns:
+        cursor.execute("ALTER TABLE order_items ADD COLUMN name TEXT")
+    if 'category' not in columns:
+        cursor.execute("ALTER TABLE order_items ADD COLUMN category TEXT")
+    
+    # Cover the prices so totals and revenue reports stay index-only
+    cursor.execute("DROP INDEX IF EXISTS idx_order_items_order")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_items_order
+        ON order_items (order_id, menu_item_id, quantity, unit_price, discount_percentage, status)
+    """)
+    
+    cursor.execute("ANALYZE")
+
+@migration(6, 'add_kitchen_queue_change_seq')
+def add_kitchen_queue_change_seq(cursor):
+    # Change sequence of the kitchen queue feed: every item insert, item
+    # change and order status change moves the affected items to a new,
+    # higher sequence number
+    if 'change_seq' not in get_columns(cursor, 'order_items'):
+        cursor.execute("ALTER TABLE order_items ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("UPDATE order_items SET change_seq = id")
+    
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_items_change_seq
+        ON order_items (change_seq)
+    """)
+    
+    # Triggers keep the sequence current for every writer, including bulk
+    # updates and other processes
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_order_items_insert_change_seq
+        AFTER INSERT ON order_items
+        BEGIN
+            UPDATE order_items
+            SET change_seq = (SELECT MAX(change_seq) FROM order_items) + 1
+            WHERE id = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_order_items_update_change_seq
+        AFTER UPDATE OF status, quantity, notes ON order_items
+        WHEN NEW.status IS NOT OLD.status
+          OR NEW.quantity IS NOT OLD.quantity
+          OR NEW.notes IS NOT OLD.notes
+        BEGIN
+            UPDATE order_items
+            SET change_seq = (SELECT MAX(change_seq) FROM order_items) + 1
+            WHERE id = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_status_change_seq
+        AFTER UPDATE OF status ON orders
+        WHEN NEW.status IS NOT OLD.status
+        BEGIN
+            UPDATE order_items
+            SET change_seq = (SELECT MAX(change_seq) FROM order_items) + 1
+            WHERE order_id = NEW.id;
+        END
+    """)
+
+@migration(7, 'add_idempotency_keys')
+def add_idempotency_keys(cursor):
+    # Stored responses of order creations sent with an Idempotency-Key
+    create_idempotency_table(cursor)
+
+@migration(8, 'add_order_archive_tables')
+def add_order_archive_tables(cursor):
+    # Orders finished long ago are moved here so the live queries scan small
+    # tables; the columns match orders and order_items as of this version
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS orders_archive (
+        id TEXT PRIMARY KEY,
+        table_number INTEGER,
+        status TEXT NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        completed_at TIMESTAMP,
+        payment_status TEXT NOT NULL,
+        total_amount REAL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 0,
+        created_ts INTEGER,
+        business_day TEXT
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_items_archive (
+        id INTEGER PRIMARY KEY,
+        order_id TEXT NOT NULL,
+        menu_item_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        notes TEXT,
+        status TEXT NOT NULL,
+        unit_price REAL,
+        discount_percentage INTEGER NOT NULL DEFAULT 0,
+        name TEXT,
+        category TEXT,
+        change_seq INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    
+    # Same report indexes as the operational tables
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_archive_created_ts
+        ON orders_archive (created_ts, business_day, status, total_amount)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_archive_business_day
+        ON orders_archive (business_day, status)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_items_archive_order
+        ON order_items_archive (order_id, menu_item_id, quantity, unit_price, discount_percentage, status)
+    """)
+
+def run_migrations(conn):
+    """
+    Apply every migration that has not been recorded in schema_migrations yet.
+    Each migration runs in its own transaction together with its record.
+    """
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP NOT NULL
+    )
+    ''')
+    conn.commit()
+    
+    cursor.execute("SELECT version FROM schema_migrations")
+    applied = {row[0] for row in cursor.fetchall()}
+    
+    for version, name, func in MIGRATIONS:
+        if version in applied:
+            continue
+        
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            # Another process may have applied it while we waited for the lock
+            cursor.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,))
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+            
+            func(cursor)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, datetime.now().isoformat())
+            )
+            conn.commit()
+            logger.info(f"Applied migration {version}: {name}")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Migration {version} ({name}) failed: {e}")
+            raise
+    
+    cursor.execute("SELECT MAX(version) FROM schema_migrations")
+    return cursor.fetchone()[0] or 0
@@ -1,6 +1,5 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import sqlite3
 import os
 import uuid
 from datetime import datetime
@@ -14,6 +13,8 @@ import time
 sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
 from events.producer import publish_event
 from events.consumer import setup_consumer, register_event_handler
+from db.pool import get_connection, retry_on_busy
+from db.idempotency import idempotent, create_idempotency_table
 
 # Set up logging
 logging.basicConfig(
@@ -32,10 +33,10 @@ ORDER_SERVICE_URL = os.getenv('ORDER_SERVICE_URL', 'http://localhost:5002')
 
 # Database setup
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled WAL-mode connection; close() hands it back to the pool
+    return get_connection(DATABASE)
 
+@retry_on_busy
 def create_tables():
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -65,6 +66,9 @@ def create_tables():
     )
     ''')
     
+    # Stored responses of payments sent with an Idempotency-Key
+    create_idempotency_table(cursor)
+    
     conn.commit()
     conn.close()
     logger.info("Database tables created or confirmed")
@@ -112,6 +116,7 @@ def generate_receipt_number():
 
 # API Routes
 @app.route('/api/payment/process', methods=['POST'])
+@idempotent(DATABASE)
 def process_payment():
     data = request.json
     
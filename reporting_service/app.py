@@ -1,6 +1,5 @@
 from flask import Flask, request, jsonify, send_file, make_response
 from flask_cors import CORS
-import sqlite3
 import os
 import logging
 import sys
@@ -14,6 +13,7 @@ import pandas as pd
 # Add common directory to path for event modules
 sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
 from events.consumer import setup_consumer, register_event_handler
+from db.pool import get_connection, retry_on_busy
 
 # Import PDF generation library
 try:
@@ -44,10 +44,10 @@ MENU_SERVICE_URL = os.getenv('MENU_SERVICE_URL', 'http://localhost:5001')
 
 # Database setup
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled WAL-mode connection; close() hands it back to the pool
+    return get_connection(DATABASE)
 
+@retry_on_busy
 def create_tables():
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -233,19 +233,36 @@ def get_daily_sales_data(days=30):
     
     return report_data
 
+# Order fields the local report calculations aggregate over
+REPORT_ORDER_FIELDS = 'id,status,created_at,total_amount,item_count'
+
+def request_order_stream(params):
+    """
+    Request orders from the Order Service as a streamed NDJSON listing,
+    projected to the fields the local report calculations use
+    """
+    return requests.get(
+        f"{ORDER_SERVICE_URL}/api/orders",
+        params=dict(params, format='ndjson', fields=REPORT_ORDER_FIELDS),
+        stream=True
+    )
+
+def iter_ndjson(response):
+    """Yield the objects of an NDJSON response one line at a time"""
+    for line in response.iter_lines():
+        if line:
+            yield json.loads(line)
+
 def calculate_daily_sales_locally(days):
     """Calculate daily sales data locally (fallback if Order Service is unavailable)"""
     print("Performing local calculation by querying orders from the Order Service...")
     
     try:
         # Call the orders endpoint instead and transform the data
-        response = requests.get(
-            f"{ORDER_SERVICE_URL}/api/orders",
-            params={"date": "month"}  # Use month to get enough data
-        )
+        response = request_order_stream({"date": "month"})  # Use month to get enough data
         
         if response.status_code == 200:
-            orders = response.json()
+            orders = iter_ndjson(response)
             
             # Group orders by date
             daily_data = {}
@@ -298,13 +315,10 @@ def calculate_weekly_sales_locally(weeks):
     
     try:
         # Call the orders endpoint instead and transform the data
-        response = requests.get(
-            f"{ORDER_SERVICE_URL}/api/orders",
-            params={"date": "month"}  # Use month to get enough data
-        )
+        response = request_order_stream({"date": "month"})  # Use month to get enough data
         
         if response.status_code == 200:
-            orders = response.json()
+            orders = iter_ndjson(response)
             
             # Group orders by week
             weekly_data = {}
@@ -368,12 +382,10 @@ def calculate_monthly_sales_locally(months):
     
     try:
         # Call the orders endpoint instead and transform the data
-        response = requests.get(
-            f"{ORDER_SERVICE_URL}/api/orders"
-        )
+        response = request_order_stream({})
         
         if response.status_code == 200:
-            orders = response.json()
+            orders = iter_ndjson(response)
             
             # Group orders by month
             monthly_data = {}
@@ -522,16 +534,13 @@ def calculate_popular_items_locally(period='all'):
     
     try:
         # 1. Get orders data from Order Service
-        orders_response = requests.get(
-            f"{ORDER_SERVICE_URL}/api/orders",
-            params={"date": "month" if period == "month" else "all"}
-        )
+        orders_response = request_order_stream({"date": "month" if period == "month" else "all"})
         
         if orders_response.status_code != 200:
             print(f"Order Service returned error {orders_response.status_code}")
             return jsonify([])
             
-        orders = orders_response.json()
+        orders = iter_ndjson(orders_response)
         
         # 2. Get menu items from Menu Service
         try:
@@ -552,24 +561,21 @@ def calculate_popular_items_locally(period='all'):
         # Filter orders by period
         if period == 'month':
             threshold_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            filtered_orders = [o for o in orders if o.get('created_at', '').split('T')[0] >= threshold_date]
+            filtered_orders = (o for o in orders if o.get('created_at', '').split('T')[0] >= threshold_date)
         elif period == 'week':
             threshold_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            filtered_orders = [o for o in orders if o.get('created_at', '').split('T')[0] >= threshold_date]
+            filtered_orders = (o for o in orders if o.get('created_at', '').split('T')[0] >= threshold_date)
         elif period == 'today':
             today = datetime.now().strftime('%Y-%m-%d')
-            filtered_orders = [o for o in orders if o.get('created_at', '').split('T')[0] == today]
+            filtered_orders = (o for o in orders if o.get('created_at', '').split('T')[0] == today)
         else:
             filtered_orders = orders
         
-        valid_orders = [o for o in filtered_orders if o.get('status') != 'Cancelled']
+        valid_orders = (o for o in filtered_orders if o.get('status') != 'Cancelled')
         
         # Since we don't have detailed order items, we'll use aggregated item_count from orders
         # This is an approximation but better than returning empty data
-        item_count_by_order = {o['id']: o.get('item_count', 0) for o in valid_orders}
-        
-        # Sum up the item counts
-        total_items = sum(item_count_by_order.values())
+        total_items = sum(o.get('item_count', 0) or 0 for o in valid_orders)
         
         # If we have menu items, we can at least show them with estimated quantities
         if menu_items:
@@ -587,7 +593,7 @@ def calculate_popular_items_locally(period='all'):
                     'name': menu_item.get('name', 'Unknown'),
                     'category': menu_item.get('category', 'Unknown'),
                     'quantity': total_quantity,
-                    'revenue': total_quantity * float(menu_item.get('price', 0))
+                    'revenue': total_quantity * float(menu_item.get('effective_price', menu_item.get('price', 0)))
                 })
         else:
             # If we don't have menu items, return placeholder data
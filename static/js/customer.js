@@ -8,6 +8,9 @@ document.addEventListener('DOMContentLoaded', function() {
     let tableNumber = null;
     let currentLanguage = localStorage.getItem('language') || 'en';
     let activeOrders = [];
+    let searchResults = null;
+    let menuVersion = null;
+    let searchTimer = null;
     const socket = io();
     // DOM Elements
     const tableNumberDisplay = document.getElementById('table-number');
@@ -169,21 +172,6 @@ document.addEventListener('DOMContentLoaded', function() {
     if (darkModeToggle) darkModeToggle.addEventListener('change', toggleDarkMode);
     if (darkModeButton) darkModeButton.addEventListener('click', toggleDarkMode);
     
-    // Initialize search functionality
-    const searchInput = document.getElementById('search-menu');
-    if (searchInput) {
-        // Clear any existing event listeners
-        searchInput.removeEventListener('input', filterMenuItems);
-        
-        // Add event listener
-        searchInput.addEventListener('input', function() {
-            // Use the existing filterMenuItems function if available
-            if (typeof window.filterMenuItems === 'function') {
-                window.filterMenuItems();
-            }
-        });
-    }
-    
     // Update displayMenuItems function if needed
     if (typeof displayMenuItems === 'function') {
         updateMenuItemsWithDataId();
@@ -302,13 +290,40 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
-    socket.on('menu_updated', function() {
-        loadMenu();
+    socket.on('menu_updated', function(data) {
+        // Skip changes this page has already synced
+        if (data && data.version != null && menuVersion !== null && data.version <= menuVersion) {
+            return;
+        }
+        syncMenu();
+    });
+    
+    // A reconnect gets a new session on the server, which forgets this
+    // device's table, and order and menu changes sent meanwhile were missed
+    let socketConnected = false;
+    socket.on('connect', function() {
+        if (socketConnected && tableNumber) {
+            socket.emit('register_device', {
+                role: 'customer',
+                table_number: tableNumber
+            });
+            loadActiveOrders();
+            syncMenu();
+        }
+        socketConnected = true;
+    });
+    
+    // Background tabs may have missed menu changes, so catch up when the
+    // page is shown again
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'visible' && tableNumber) {
+            syncMenu();
+        }
     });
     
     socket.on('order_updated', function(data) {
-        // Refresh active orders when an order is updated
-        loadActiveOrders();
+        // Apply the pushed order state instead of refetching the table's orders
+        applyOrderDelta(data);
     });
     
     socket.on('reset_device', function() {
@@ -476,16 +491,12 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     function initializeOrderTracking() {
-        // Load active orders immediately
+        // Load active orders immediately; later changes are pushed over the
+        // socket as order deltas
         loadActiveOrders();
         
-        // Set up automatic refresh every 30 seconds
-        orderUpdateInterval = setInterval(loadActiveOrders, 30000);
-        
-        // Also refresh orders when the socket notifies us of updates
-        socket.on('order_updated', function(data) {
-            loadActiveOrders();
-        });
+        // Slow fallback in case pushed deltas are lost
+        setInterval(loadActiveOrders, 120000);
     }
     
     function initChatbot() {
@@ -710,6 +721,66 @@ document.addEventListener('DOMContentLoaded', function() {
     
     
     
+    function applyOrderDelta(data) {
+        // Older services only send the order id, so fall back to a full reload
+        if (!data || !data.order) {
+            loadActiveOrders();
+            return;
+        }
+        
+        const delta = data.order;
+        if (!tableNumber || parseInt(delta.table_number) !== parseInt(tableNumber)) {
+            return;
+        }
+        
+        const index = activeOrders.findIndex(order => order.id === delta.id);
+        const current = index >= 0 ? activeOrders[index] : null;
+        
+        // Ignore deltas we have already applied or that arrived out of order
+        if (current && current.version !== undefined && delta.version <= current.version) {
+            return;
+        }
+        
+        if (delta.status === 'Completed' || delta.status === 'Cancelled') {
+            if (current) {
+                activeOrders.splice(index, 1);
+                displayActiveOrders();
+            }
+            return;
+        }
+        
+        // Keep the menu details we already have for each item
+        const knownItems = {};
+        if (current && Array.isArray(current.items)) {
+            current.items.forEach(item => {
+                knownItems[item.id] = item;
+            });
+        }
+        
+        let missingDetails = false;
+        const items = (delta.items || []).map(item => {
+            const known = knownItems[item.id];
+            if (item.name === undefined && !known) {
+                missingDetails = true;
+            }
+            return Object.assign({}, known, item);
+        });
+        
+        if (missingDetails) {
+            loadActiveOrders();
+            return;
+        }
+        
+        const updatedOrder = Object.assign({}, current, delta, { items: items });
+        if (current) {
+            activeOrders[index] = updatedOrder;
+        } else {
+            activeOrders.unshift(updatedOrder);
+        }
+        
+        displayActiveOrders();
+    }
+    
     function displayActiveOrders() {
         if (!activeOrdersContainer) {
             console.error("Active orders container not found!");
@@ -1263,7 +1334,11 @@ document.addEventListener('DOMContentLoaded', function() {
             filteredItems = filteredItems.filter(item => item.category === category);
         }
         
-        if (searchTerm) {
+        if (searchTerm && searchResults) {
+            // Server search results, best match first
+            const itemsById = new Map(filteredItems.map(item => [item.id, item]));
+            filteredItems = searchResults.map(id => itemsById.get(id)).filter(Boolean);
+        } else if (searchTerm) {
             filteredItems = filteredItems.filter(item => {
                 // Search in both languages
                 const nameMatch = (
@@ -1385,9 +1460,9 @@ document.addEventListener('DOMContentLoaded', function() {
             const discountBadge = menuItemElement.querySelector('.discount-badge');
                     
             if (item.discount_percentage > 0 && originalPriceElement && currentPriceElement && discountBadge) {
-                // Calculate discounted price
+                // Discounted price as computed by the menu service
                 const originalPrice = item.price;
-                const discountedPrice = originalPrice * (1 - item.discount_percentage / 100);
+                const discountedPrice = item.effective_price;
                 
                 // Display original price with strikethrough
                 originalPriceElement.textContent = `$${originalPrice.toFixed(2)}`;
@@ -1410,7 +1485,14 @@ document.addEventListener('DOMContentLoaded', function() {
             // Handle image if it exists
             const imageElement = menuItemElement.querySelector('.item-image');
             if (imageElement) {
-                if (item.image_path) {
+                if (item.image_variants) {
+                    // Let the browser pick the smallest variant that fills the card
+                    const variants = Object.values(item.image_variants);
+                    imageElement.srcset = variants.map(v => `${v.webp} ${v.width}w`).join(', ');
+                    imageElement.sizes = '(max-width: 600px) 50vw, 300px';
+                    imageElement.src = item.image_variants.card.jpeg;
+                    imageElement.alt = itemName;
+                } else if (item.image_path) {
                     imageElement.src = item.image_path;
                     imageElement.alt = itemName;
                 } else {
@@ -1428,10 +1510,8 @@ document.addEventListener('DOMContentLoaded', function() {
             if (isAvailable) {
                 if (addButton && quantityInput) {
                     addButton.addEventListener('click', () => {
-                        // Calculate the actual price (considering discounts)
-                        const actualPrice = item.discount_percentage > 0 
-                            ? item.price * (1 - item.discount_percentage / 100) 
-                            : item.price;
+                        // The actual price, discounts included
+                        const actualPrice = item.effective_price;
                             
                         // Create a copy of the item with the actual price
                         const itemWithDiscount = {
@@ -1510,7 +1590,12 @@ document.addEventListener('DOMContentLoaded', function() {
     
     function loadMenu() {
         fetch('/api/menu')
-        .then(response => response.json())
+        .then(response => {
+            // The version later changes are fetched from
+            const version = response.headers.get('X-Menu-Version');
+            menuVersion = version === null ? null : Number(version);
+            return response.json();
+        })
         .then(data => {
             console.log("Menu data loaded:", data);
             menuItems = data;
@@ -1520,10 +1605,77 @@ document.addEventListener('DOMContentLoaded', function() {
         .catch(error => console.error('Error loading menu:', error));
     }
     
+    // Apply only the items changed since the loaded menu version; the server
+    // answers with a reset when a full reload is cheaper or required
+    function syncMenu() {
+        if (menuVersion === null) {
+            loadMenu();
+            return;
+        }
+        
+        fetch(`/api/menu/changes?since=${menuVersion}`)
+        .then(response => response.json())
+        .then(feed => {
+            if (feed.reset) {
+                loadMenu();
+                return;
+            }
+            // An older sync answering late has nothing new
+            if (feed.version <= menuVersion) return;
+            
+            feed.changes.forEach(change => {
+                const id = change.op === 'delete' ? change.id : change.item.id;
+                const index = menuItems.findIndex(item => item.id === id);
+                if (change.op === 'delete') {
+                    if (index !== -1) menuItems.splice(index, 1);
+                } else if (index !== -1) {
+                    menuItems[index] = change.item;
+                } else {
+                    menuItems.push(change.item);
+                }
+            });
+            
+            // Same order as the full menu: by category, then name
+            menuItems.sort((a, b) => a.category === b.category
+                ? (a.name < b.name ? -1 : a.name > b.name ? 1 : 0)
+                : (a.category < b.category ? -1 : 1));
+            menuVersion = feed.version;
+            window.menuItems = menuItems;
+            displayMenuItems();
+        })
+        .catch(error => {
+            console.error('Error syncing menu:', error);
+            loadMenu();
+        });
+    }
+    
     function filterMenuItems() {
-        if (typeof displayMenuItems === 'function') {
+        const searchTerm = searchMenu ? searchMenu.value.trim() : '';
+        clearTimeout(searchTimer);
+        
+        if (!searchTerm) {
+            searchResults = null;
             displayMenuItems();
+            return;
         }
+        
+        // Ranked, accent-insensitive search in every menu language on the
+        // server; the local filter is the fallback while it is unavailable
+        searchTimer = setTimeout(() => {
+            fetch(`/api/menu/search?q=${encodeURIComponent(searchTerm)}&limit=100`)
+                .then(response => response.json())
+                .then(results => {
+                    // Ignore results for what the customer typed before
+                    if (searchMenu.value.trim() !== searchTerm) return;
+                    searchResults = Array.isArray(results) ? results.map(item => item.id) : null;
+                    displayMenuItems();
+                })
+                .catch(error => {
+                    console.error('Error searching menu:', error);
+                    searchResults = null;
+                    displayMenuItems();
+                });
+        }, 150);
     }
     
     function addToOrder(item, quantity) {
@@ -1750,6 +1902,16 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Body and Idempotency-Key of the order being submitted
+    let pendingOrder = null;
+    
+    function generateIdempotencyKey() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    }
+
     function submitOrder() {
         // Validate order
         if (!tableNumber) {
@@ -1771,19 +1933,28 @@ document.addEventListener('DOMContentLoaded', function() {
             table_number: tableNumber,
             items: cart
         };
+        const body = JSON.stringify(orderData);
+        
+        // Resubmitting the same cart reuses its key, so a retry after a lost
+        // response returns the order that was already placed
+        if (!pendingOrder || pendingOrder.body !== body) {
+            pendingOrder = { body: body, key: generateIdempotencyKey() };
+        }
     
         // Send order to server
         fetch('/api/orders', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
-                'X-Table-Auth': generateTableAuth(tableNumber) // Add security token
+                'X-Table-Auth': generateTableAuth(tableNumber), // Add security token
+                'Idempotency-Key': pendingOrder.key
             },
-            body: JSON.stringify(orderData)
+            body: body
         })
         .then(response => response.json())
         .then(data => {
             if (data.id) {
+                pendingOrder = null;
                 alert(currentLanguage === 'en' ? 
                     `Order #${data.id} has been placed successfully!` :
                     `Đơn hàng #${data.id} đã được đặt thành công!`);
@@ -1835,12 +2006,9 @@ document.addEventListener('DOMContentLoaded', function() {
         loadActiveOrders();
     }
     function setupOrderRefresh() {
-        // First load orders immediately
+        // First load orders immediately; updates arrive as socket deltas
         loadActiveOrders();
         
-        // Then set up a refresh interval (every 30 seconds)
-        setInterval(loadActiveOrders, 30000);
-        
         // Add a refresh button to the orders section header
         const ordersHeader = document.querySelector('.orders-tracking h2');
         if (ordersHeader) {
@@ -1960,7 +2128,14 @@ document.addEventListener('DOMContentLoaded', function() {
                     }
                     
                     const quantity = parseInt(item.quantity) || 1;
-                    const itemTotal = finalPrice * quantity;
+                    let itemTotal = finalPrice * quantity;
+                    
+                    // Orders served with their price snapshot are charged
+                    // exactly that, whatever the menu says now
+                    if (item.line_total !== undefined && item.line_total !== null) {
+                        basePrice = parseFloat(item.price);
+                        itemTotal = item.line_total;
+                    }
                     
                     // Add to totals
                     orderTotal += itemTotal;
@@ -1,10 +1,17 @@
 // Kitchen.js - Handles kitchen interface functionality with menu availability management
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize variables
-    let orders = [];
+    let kitchenOrders = {};
+    let queueVersion = null;
+    let queuePollGeneration = 0;
     let menuItems = [];
     const socket = io();
     
+    // Kitchen queue long-polling: how long the server may hold a request
+    // open, and how long to wait before retrying after an error
+    const QUEUE_POLL_TIMEOUT = 25;
+    const QUEUE_RETRY_DELAY = 5000;
+    
     // DOM Elements for orders
     const kitchenOrdersContainer = document.getElementById('kitchen-orders');
     const statusFilter = document.getElementById('status-filter');
@@ -33,14 +40,14 @@ document.addEventListener('DOMContentLoaded', function() {
     const kitchenOrderTemplate = document.getElementById('kitchen-order-template');
     const kitchenItemTemplate = document.getElementById('kitchen-item-template');
     
-    // Load initial orders only
-    loadOrders();
+    // Load the kitchen queue and keep it current from the change feed
+    loadKitchenQueue();
     
     // We'll load menu items only when that tab is clicked
     
     // Event Listeners for orders
-    statusFilter.addEventListener('change', loadOrders);
-    refreshButton.addEventListener('click', loadOrders);
+    statusFilter.addEventListener('change', displayOrders);
+    refreshButton.addEventListener('click', loadKitchenQueue);
     
     // Listen for a custom event when the menu tab is activated
     document.addEventListener('menuTabActivated', function() {
@@ -54,17 +61,14 @@ document.addEventListener('DOMContentLoaded', function() {
         initMenuManagementElements();
     }
   
-    // Socket.io event handlers
-    socket.on('new_order', function(data) {
-        // Reload orders when a new order is created
-        loadOrders();
-    });
-    
-    socket.on('order_updated', function(data) {
-        // Reload orders when an order is updated
-        loadOrders();
+    // Register as a staff device on every (re)connect, so the server sends
+    // this screen the order events of all tables
+    socket.on('connect', function() {
+        socket.emit('register_device', { role: 'kitchen' });
     });
     
+    // Socket.io event handlers (order changes arrive through the kitchen
+    // queue feed)
     socket.on('menu_updated', function(data) {
         // Reload menu items when the menu is updated
         loadMenuItems();
@@ -72,114 +76,147 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // ------------ Orders Functions ------------
     
-    function loadOrders() {
-        const status = statusFilter.value;
-        let url = '/api/orders';
-        
-        if (status !== 'All') {
-            url += `?status=${status}`;
+    function loadKitchenQueue() {
+        // Start over from a full snapshot; a poll still in flight from
+        // before is ignored when it returns
+        queueVersion = null;
+        pollKitchenQueue(++queuePollGeneration);
+    }
+    
+    function pollKitchenQueue(generation) {
+        const params = new URLSearchParams({ timeout: QUEUE_POLL_TIMEOUT });
+        if (queueVersion !== null) {
+            params.set('since', queueVersion);
         }
         
-        fetch(url)
-            .then(response => response.json())
+        fetch(`/api/kitchen/queue?${params.toString()}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+                }
+                return response.json();
+            })
             .then(data => {
-                orders = data.filter(order => 
-                    order.status !== 'Completed' && order.status !== 'Cancelled'
-                );
-                displayOrders();
+                if (generation !== queuePollGeneration) {
+                    return;
+                }
+                applyQueueChanges(data);
+                pollKitchenQueue(generation);
             })
-            .catch(error => console.error('Error loading orders:', error));
+            .catch(error => {
+                console.error('Error polling the kitchen queue:', error);
+                setTimeout(() => {
+                    if (generation === queuePollGeneration) {
+                        pollKitchenQueue(generation);
+                    }
+                }, QUEUE_RETRY_DELAY);
+            });
+    }
+    
+    function applyQueueChanges(data) {
+        if (data.reset) {
+            kitchenOrders = {};
+        }
+        
+        // Rows come in change order, each with its order's current state
+        data.items.forEach(row => {
+            if (row.order_status === 'Completed' || row.order_status === 'Cancelled') {
+                delete kitchenOrders[row.order_id];
+                return;
+            }
+            
+            if (!kitchenOrders[row.order_id]) {
+                kitchenOrders[row.order_id] = { id: row.order_id, items: {} };
+            }
+            
+            const order = kitchenOrders[row.order_id];
+            order.table_number = row.table_number;
+            order.status = row.order_status;
+            order.created_at = row.created_at;
+            order.items[row.id] = row;
+        });
+        
+        queueVersion = data.version;
+        
+        // Nothing to redraw when a poll times out without changes
+        if (data.reset || data.items.length > 0) {
+            displayOrders();
+        }
     }
     
-    // Modified displayOrders function with error handling
 function displayOrders() {
     // Clear container
     kitchenOrdersContainer.innerHTML = '';
     
-    if (orders.length ===
- 0) {
+    const status = statusFilter.value;
+    const orders = Object.values(kitchenOrders)
+        .filter(order => status === 'All' || order.status === status)
+        .sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
+    
+    if (orders.length === 0) {
         kitchenOrdersContainer.innerHTML = '<div class="no-orders-message">No active orders</div>';
         return;
     }
     
     // Display orders
     orders.forEach(order => {
-        // Fetch order details
-        fetch(`/api/orders/${order.id}`)
-            .then(response => {
-                // Check if the response is ok before trying to parse JSON
-                if (!response.ok) {
-                    throw new Error(`Server returned ${response.status}: ${response.statusText}`);
-                }
-                return response.json();
-            })
-            .then(orderDetails => {
-                const orderElement = kitchenOrderTemplate.content.cloneNode(true);
-                
-                orderElement.querySelector('.order-id').textContent = `Order #${orderDetails.id}`;
-                orderElement.querySelector('.table-number').textContent = `Table ${orderDetails.table_number}`;
-                orderElement.querySelector('.order-time').textContent = formatTime(orderDetails.created_at);
-                orderElement.querySelector('.order-status').textContent = orderDetails.status;
-                orderElement.querySelector('.order-status').classList.add(`status-${orderDetails.status.toLowerCase().replace(' ', '-')}`);
-                
-                const itemsContainer = orderElement.querySelector('.order-items');
-                
-                // Add order items
-                orderDetails.items.forEach(item => {
-                    const itemElement = kitchenItemTemplate.content.cloneNode(true);
-                    
-                    const checkbox = itemElement.querySelector('.item-checkbox');
-                    checkbox.checked = item.status === 'Ready';
-                    checkbox.disabled = orderDetails.status === 'Ready' || orderDetails.status === 'Delivered';
-                    checkbox.addEventListener('change', () => {
-                        updateItemStatus(item.id, checkbox.checked ? 'Ready' : 'Pending');
-                    });
-                    
-                    itemElement.querySelector('.item-name').textContent = item.name;
-                    itemElement.querySelector('.item-quantity').textContent = item.quantity;
-                    
-                    if (item.notes) {
-                        itemElement.querySelector('.item-notes').textContent = `Note: ${item.notes}`;
-                    } else {
-                        itemElement.querySelector('.item-notes').style.display = 'none';
-                    }
-                    
-                    itemsContainer.appendChild(itemElement);
-                });
-                
-                // Setup action buttons
-                const startCookingButton = orderElement.querySelector('.start-cooking-button');
-                const readyButton = orderElement.querySelector('.ready-button');
-                
-                startCookingButton.style.display = orderDetails.status === 'Pending' ? 'inline-block' : 'none';
-                readyButton.style.display = orderDetails.status === 'In Progress' ? 'inline-block' : 'none';
-                
-                startCookingButton.addEventListener('click', () => {
-                    updateOrderStatus(orderDetails.id, 'In Progress');
-                });
-                
-                readyButton.addEventListener('click', () => {
-                    updateOrderStatus(orderDetails.id, 'Ready');
-                });
-                
-                kitchenOrdersContainer.appendChild(orderElement);
-            })
-            .catch(error => {
-                console.error(`Error loading details for order ${order.id}:`, error);
-                // Create a simpler order element with error message
-                const errorOrderElement = document.createElement('div');
-                errorOrderElement.className = 'kitchen-order error';
-                errorOrderElement.innerHTML = `
-                    <div class="order-header">
-                        <h3 class="order-id">Order #${order.id}</h3>
-                        <span class="order-status status-error">Error</span>
-                    </div>
-                    <div class="error-message">Failed to load order details. Please refresh or check server logs.</div>
-                `;
-                kitchenOrdersContainer.appendChild(errorOrderElement);
-            });
+        renderOrder(Object.assign({}, order, {
+            items: Object.values(order.items).sort((a, b) => a.id - b.id)
+        }));
     });
 }
+
+function renderOrder(orderDetails) {
+    const orderElement = kitchenOrderTemplate.content.cloneNode(true);
+    
+    orderElement.querySelector('.order-id').textContent = `Order #${orderDetails.id}`;
+    orderElement.querySelector('.table-number').textContent = `Table ${orderDetails.table_number}`;
+    orderElement.querySelector('.order-time').textContent = formatTime(orderDetails.created_at);
+    orderElement.querySelector('.order-status').textContent = orderDetails.status;
+    orderElement.querySelector('.order-status').classList.add(`status-${orderDetails.status.toLowerCase().replace(' ', '-')}`);
+    
+    const itemsContainer = orderElement.querySelector('.order-items');
+    
+    // Add order items
+    orderDetails.items.forEach(item => {
+        const itemElement = kitchenItemTemplate.content.cloneNode(true);
+        
+        const checkbox = itemElement.querySelector('.item-checkbox');
+        checkbox.checked = item.status === 'Ready';
+        checkbox.disabled = orderDetails.status === 'Ready' || orderDetails.status === 'Delivered';
+        checkbox.addEventListener('change', () => {
+            updateItemStatus(item.id, checkbox.checked ? 'Ready' : 'Pending');
+        });
+        
+        itemElement.querySelector('.item-name').textContent = item.name;
+        itemElement.querySelector('.item-quantity').textContent = item.quantity;
+        
+        if (item.notes) {
+            itemElement.querySelector('.item-notes').textContent = `Note: ${item.notes}`;
+        } else {
+            itemElement.querySelector('.item-notes').style.display = 'none';
+        }
+        
+        itemsContainer.appendChild(itemElement);
+    });
+    
+    // Setup action buttons
+    const startCookingButton = orderElement.querySelector('.start-cooking-button');
+    const readyButton = orderElement.querySelector('.ready-button');
+    
+    startCookingButton.style.display = orderDetails.status === 'Pending' ? 'inline-block' : 'none';
+    readyButton.style.display = orderDetails.status === 'In Progress' ? 'inline-block' : 'none';
+    
+    startCookingButton.addEventListener('click', () => {
+        updateOrderStatus(orderDetails.id, 'In Progress');
+    });
+    
+    readyButton.addEventListener('click', () => {
+        markOrderReady(orderDetails);
+    });
+    
+    kitchenOrdersContainer.appendChild(orderElement);
+}
     
     function updateItemStatus(itemId, status) {
         fetch(`/api/order-items/${itemId}`, {
@@ -193,6 +230,34 @@ function displayOrders() {
         .catch(error => console.error('Error updating item status:', error));
     }
     
+    function markOrderReady(orderDetails) {
+        // Mark the whole ticket ready with one request, then the order itself
+        const updates = orderDetails.items
+            .filter(item => item.status !== 'Ready')
+            .map(item => ({ id: item.id, status: 'Ready' }));
+        
+        if (updates.length === 0) {
+            updateOrderStatus(orderDetails.id, 'Ready');
+            return;
+        }
+        
+        fetch('/api/order-items/bulk', {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ items: updates })
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) {
+                console.error('Error marking items ready:', data.error);
+            }
+            updateOrderStatus(orderDetails.id, 'Ready');
+        })
+        .catch(error => console.error('Error marking items ready:', error));
+    }
+    
     function updateOrderStatus(orderId, status) {
         fetch(`/api/orders/${orderId}`, {
             method: 'PUT',
@@ -203,10 +268,8 @@ function displayOrders() {
         })
         .then(response => response.json())
         .then(data => {
-            if (data.message) {
-                // Reload orders
-                loadOrders();
-            } else {
+            // The change shows up through the kitchen queue feed
+            if (!data.message) {
                 alert('Error updating order: ' + data.error);
             }
         })
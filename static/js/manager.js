@@ -3,6 +3,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize variables
     let menuItems = [];
     let orders = [];
+    let ordersNextCursor = null;
     const socket = io();
     
     // DOM Elements - Tabs
@@ -154,7 +155,7 @@ document.addEventListener('DOMContentLoaded', function() {
     loadOrders();
     
     // Event Listeners - Orders Tab
-    applyFiltersButton.addEventListener('click', loadOrders);
+    applyFiltersButton.addEventListener('click', () => loadOrders());
     exportOrdersButton.addEventListener('click', exportOrders);
     
     // Event Listeners - Menu Tab
@@ -196,6 +197,12 @@ document.addEventListener('DOMContentLoaded', function() {
         exportReportButton.addEventListener('click', exportReport);
     }
     
+    // Register as a staff device on every (re)connect, so the server sends
+    // this screen the order events of all tables
+    socket.on('connect', function() {
+        socket.emit('register_device', { role: 'manager' });
+    });
+    
     // Socket.io event handlers
     socket.on('new_order', function(data) {
         // Reload orders if on orders tab
@@ -478,29 +485,61 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
     // Functions - Orders Tab
-    function loadOrders() {
+    // Columns shown in the orders table
+    const ORDER_LIST_FIELDS = 'id,table_number,status,created_at,item_count,total_amount';
+    
+    function getOrderFilterParams() {
+        const params = new URLSearchParams();
         const date = dateFilter.value;
         const status = statusFilter.value;
         
-        let url = '/api/orders?';
-        
         if (date !== 'all') {
-            url += `date=${date}&`;
+            params.set('date', date);
         }
         
         if (status !== 'All') {
-            url += `status=${status}`;
+            params.set('status', status);
         }
         
-        fetch(url)
-            .then(response => response.json())
+        return params;
+    }
+    
+    function loadOrders(append = false) {
+        const params = getOrderFilterParams();
+        params.set('fields', ORDER_LIST_FIELDS);
+        
+        // Orders come one page at a time; the next page starts at the cursor
+        if (append && ordersNextCursor) {
+            params.set('cursor', ordersNextCursor);
+        }
+        
+        fetch(`/api/orders?${params.toString()}`)
+            .then(response => {
+                ordersNextCursor = response.headers.get('X-Next-Cursor');
+                return response.json();
+            })
             .then(data => {
-                orders = data;
+                orders = append ? orders.concat(data) : data;
                 displayOrders();
             })
             .catch(error => console.error('Error loading orders:', error));
     }
     
+    function updateLoadMoreOrdersButton() {
+        let loadMoreButton = document.getElementById('load-more-orders');
+        
+        if (!loadMoreButton) {
+            loadMoreButton = document.createElement('button');
+            loadMoreButton.id = 'load-more-orders';
+            loadMoreButton.className = 'secondary-button';
+            loadMoreButton.textContent = 'Load More';
+            loadMoreButton.addEventListener('click', () => loadOrders(true));
+            document.getElementById('orders-table').appendChild(loadMoreButton);
+        }
+        
+        loadMoreButton.style.display = ordersNextCursor ? '' : 'none';
+    }
+    
     function displayOrders() {
         // Clear container
         ordersList.innerHTML = '';
@@ -528,6 +567,8 @@ document.addEventListener('DOMContentLoaded', function() {
             
             ordersList.appendChild(row);
         });
+        
+        updateLoadMoreOrdersButton();
     }
     
     function viewOrderDetails(orderId) {
@@ -545,8 +586,8 @@ document.addEventListener('DOMContentLoaded', function() {
                         <tr>
                             <td>${item.name}</td>
                             <td>${item.quantity}</td>
-                            <td>$${item.price.toFixed(2)}</td>
-                            <td>$${(item.price * item.quantity).toFixed(2)}</td>
+                            <td>$${item.effective_price.toFixed(2)}</td>
+                            <td>$${item.line_total.toFixed(2)}</td>
                             <td>${item.status}</td>
                             <td>${item.notes || '-'}</td>
                         </tr>
@@ -623,8 +664,59 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     function exportOrders() {
-        // Not implemented in this version
-        alert('Export feature is not implemented in the current version.');
+        // Stream every order matching the filters as NDJSON and write it out
+        // as CSV line by line, rather than loading the history as one array
+        const params = getOrderFilterParams();
+        params.set('format', 'ndjson');
+        params.set('fields', ORDER_LIST_FIELDS);
+        
+        const columns = ORDER_LIST_FIELDS.split(',');
+        const csvParts = [columns.join(',') + '\n'];
+        
+        const toCsvLine = line => {
+            const order = JSON.parse(line);
+            return columns.map(column => {
+                const value = order[column] === null || order[column] === undefined ? '' : String(order[column]);
+                return /[",\n]/.test(value) ? `"${value.replace(/"/g, '""')}"` : value;
+            }).join(',') + '\n';
+        };
+        
+        fetch(`/api/orders?${params.toString()}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Export failed with status ${response.status}`);
+                }
+                
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffered = '';
+                
+                const readChunk = () => reader.read().then(({ done, value }) => {
+                    buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+                    
+                    const lines = buffered.split('\n');
+                    buffered = done ? '' : lines.pop();
+                    lines.filter(line => line.trim()).forEach(line => csvParts.push(toCsvLine(line)));
+                    
+                    return done ? null : readChunk();
+                });
+                
+                return readChunk();
+            })
+            .then(() => {
+                const blob = new Blob(csvParts, { type: 'text/csv' });
+                const link = document.createElement('a');
+                link.href = URL.createObjectURL(blob);
+                link.download = `orders-${new Date().toISOString().split('T')[0]}.csv`;
+                document.body.appendChild(link);
+                link.click();
+                document.body.removeChild(link);
+                URL.revokeObjectURL(link.href);
+            })
+            .catch(error => {
+                console.error('Error exporting orders:', error);
+                alert('Failed to export orders. Please try again.');
+            });
     }
     
     // Functions - Menu Tab
@@ -674,7 +766,7 @@ document.addEventListener('DOMContentLoaded', function() {
             
             row.innerHTML = `
                 <td>${item.id}</td>
-                <td><img src="${item.image_path || '/static/images/placeholder.jpg'}" class="menu-thumb" alt="${item.name}"></td>
+                <td><img src="${item.image_variants ? item.image_variants.thumb.jpeg : (item.image_path || '/static/images/placeholder.jpg')}" class="menu-thumb" alt="${item.name}"></td>
                 <td>
                     ${item.name}
                     ${badges}
@@ -2080,6 +2172,26 @@ document.addEventListener('DOMContentLoaded', function() {
         importModal.style.display = 'none';
     }
     
+    // Poll an import job until it finishes, showing the rows read so far
+    function pollImportJob(jobId) {
+        return fetch(`/api/menu/import/${jobId}`)
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'running') {
+                    importMessageDiv.textContent = `Importing... ${job.rows_read} rows processed.`;
+                    return new Promise(resolve => setTimeout(resolve, 1000))
+                        .then(() => pollImportJob(jobId));
+                }
+                if (job.status === 'failed') {
+                    throw new Error(`${job.error} (${job.imported} items imported, ${job.updated} items updated before the failure)`);
+                }
+                if (job.error) {
+                    throw new Error(job.error);
+                }
+                return job;
+            });
+    }
+    
     function previewImport() {
         const file = fileImportInput.files[0];
         if (!file) {
@@ -2271,19 +2383,29 @@ document.addEventListener('DOMContentLoaded', function() {
         formData.append('file', file);
         formData.append('update_existing', updateExistingCheckbox.checked);
         
-        // Send to backend
+        // Send to backend; the import runs as a job that is polled for progress
         fetch('/api/menu/import', {
             method: 'POST',
             body: formData
         })
         .then(response => response.json())
+        .then(job => {
+            if (job.error) {
+                throw new Error(job.error);
+            }
+            return pollImportJob(job.id);
+        })
         .then(data => {
-            if (data.error) {
-                throw new Error(data.error);
+            let message = `Import successful! ${data.imported} items imported, ${data.updated} items updated.`;
+            if (data.skipped) {
+                message += ` ${data.skipped} existing items skipped.`;
             }
-            
-            importMessageDiv.textContent = `Import successful! ${data.imported} items imported, ${data.updated} items updated.`;
-            importMessageDiv.className = 'message success';
+            if (data.error_count) {
+                const rows = data.errors.map(e => `row ${e.row}: ${e.error}`).join('; ');
+                message += ` ${data.error_count} rows not imported (${rows}).`;
+            }
+            importMessageDiv.textContent = message;
+            importMessageDiv.className = data.error_count ? 'message info' : 'message success';
             
             // Reload menu items to show the changes
             loadMenuItems();
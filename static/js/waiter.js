@@ -2,9 +2,14 @@
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize variables
     let orders = [];
+    let orderDetailsCache = {};
     let selectedOrderId = null;
     const socket = io();
     
+    // Orders still being worked on, and how many the queue loads at once
+    const ACTIVE_ORDER_STATUSES = 'Pending,In Progress,Ready,Delivered';
+    const ACTIVE_ORDERS_LIMIT = 1000;
+    
     // DOM Elements
     const ordersList = document.getElementById('orders-list');
     const statusFilter = document.getElementById('status-filter');
@@ -25,7 +30,11 @@ document.addEventListener('DOMContentLoaded', function() {
     // Event Listeners
     statusFilter.addEventListener('change', loadOrders);
     searchOrders.addEventListener('input', filterOrders);
-    refreshButton.addEventListener('click', loadOrders);
+    refreshButton.addEventListener('click', function() {
+        // A manual refresh always refetches the full order details
+        orderDetailsCache = {};
+        loadOrders();
+    });
     markDeliveredButton.addEventListener('click', markOrderDelivered);
     markPaidButton.addEventListener('click', markOrderPaid);
     socket.on('order_paid', function(data) {
@@ -39,30 +48,31 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
     
+    // Register as a staff device on every (re)connect, so the server sends
+    // this screen the order events of all tables
+    socket.on('connect', function() {
+        socket.emit('register_device', { role: 'waiter' });
+    });
+    
     // Socket.io event handlers
     socket.on('new_order', function(data) {
-        // Reload orders when a new order is created
-        loadOrders();
+        // Apply the pushed order state instead of refetching the orders
+        applyOrderDelta(data);
     });
     
     socket.on('order_updated', function(data) {
-        // Reload orders when an order is updated
-        loadOrders();
-        
-        // If the updated order is the currently selected one, refresh details
-        if (selectedOrderId && data.order_id === selectedOrderId) {
-            loadOrderDetails(selectedOrderId);
-        }
+        // Apply the pushed order state instead of refetching the orders
+        applyOrderDelta(data);
     });
     
     // Functions
     function loadOrders() {
         const status = statusFilter.value;
-        let url = '/api/orders';
         
-        if (status !== 'All') {
-            url += `?status=${status}`;
-        }
+        // "All" means every active order; filtering on the server keeps the
+        // completed history out of the first page
+        const statuses = status === 'All' ? ACTIVE_ORDER_STATUSES : status;
+        const url = `/api/orders?status=${encodeURIComponent(statuses)}&limit=${ACTIVE_ORDERS_LIMIT}`;
         
         fetch(url)
             .then(response => response.json())
@@ -73,6 +83,81 @@ document.addEventListener('DOMContentLoaded', function() {
             .catch(error => console.error('Error loading orders:', error));
     }
     
+    function applyOrderDelta(data) {
+        // Older services only send the order id, so fall back to a full reload
+        if (!data || !data.order) {
+            loadOrders();
+            if (selectedOrderId && data && data.order_id === selectedOrderId) {
+                loadOrderDetails(selectedOrderId);
+            }
+            return;
+        }
+        
+        const delta = data.order;
+        const cached = orderDetailsCache[delta.id];
+        
+        // Ignore deltas we have already applied or that arrived out of order
+        if (cached && cached.version !== undefined && delta.version <= cached.version) {
+            return;
+        }
+        
+        // Keep the menu details we already have for each item
+        const knownItems = {};
+        if (cached && Array.isArray(cached.items)) {
+            cached.items.forEach(item => {
+                knownItems[item.id] = item;
+            });
+        }
+        
+        let missingDetails = false;
+        const items = (delta.items || []).map(item => {
+            const known = knownItems[item.id];
+            if (item.name === undefined && !known) {
+                missingDetails = true;
+            }
+            return Object.assign({}, known, item);
+        });
+        
+        if (missingDetails) {
+            delete orderDetailsCache[delta.id];
+        } else {
+            orderDetailsCache[delta.id] = Object.assign({}, cached, delta, { items: items });
+        }
+        
+        // Apply the same status filter as loadOrders; "All" means every
+        // active order
+        const status = statusFilter.value;
+        const statuses = status === 'All' ? ACTIVE_ORDER_STATUSES.split(',') : [status];
+        const index = orders.findIndex(order => order.id === delta.id);
+        
+        if (statuses.includes(delta.status)) {
+            const summary = {
+                id: delta.id,
+                table_number: delta.table_number,
+                status: delta.status,
+                created_at: delta.created_at,
+                completed_at: delta.completed_at,
+                total_amount: delta.total_amount,
+                version: delta.version,
+                item_count: items.length
+            };
+            if (index >= 0) {
+                orders[index] = Object.assign({}, orders[index], summary);
+            } else {
+                orders.unshift(summary);
+            }
+        } else if (index >= 0) {
+            orders.splice(index, 1);
+        }
+        
+        displayOrders();
+        
+        // If the updated order is the currently selected one, refresh details
+        if (selectedOrderId === delta.id) {
+            loadOrderDetails(selectedOrderId);
+        }
+    }
+    
     function displayOrders() {
         // Clear container
         ordersList.innerHTML = '';
@@ -127,57 +212,68 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     function loadOrderDetails(orderId) {
+        // Use the pushed order state when we already have it
+        if (orderDetailsCache[orderId]) {
+            displayOrderDetails(orderDetailsCache[orderId]);
+            return;
+        }
+        
         fetch(`/api/orders/${orderId}`)
             .then(response => response.json())
             .then(order => {
-                // Update order info
-                orderInfo.innerHTML = `
-                    <div class="order-detail-header">
-                        <h3>Order #${order.id}</h3>
-                        <span class="order-status status-${order.status.toLowerCase().replace(' ', '-')}">${order.status}</span>
-                    </div>
-                    <div class="order-detail-row">
-                        <span class="label">Table:</span>
-                        <span>${order.table_number}</span>
-                    </div>
-                    
-                    <div class="order-detail-row">
-                        <span class="label">Time:</span>
-                        <span>${formatDateTime(order.created_at)}</span>
-                    </div>
-                    <div class="order-detail-row">
-                        <span class="label">Total:</span>
-                        <span>$${order.total_amount.toFixed(2)}</span>
-                    </div>
-                `;
-                
-                // Update order items
-                orderItemsList.innerHTML = '';
-                order.items.forEach(item => {
-                    const itemElement = detailItemTemplate.content.cloneNode(true);
-                    
-                    itemElement.querySelector('.item-name').textContent = item.name;
-                    itemElement.querySelector('.item-quantity').textContent = item.quantity;
-                    
-                    if (item.notes) {
-                        itemElement.querySelector('.item-notes').textContent = `Note: ${item.notes}`;
-                    } else {
-                        itemElement.querySelector('.item-notes').style.display = 'none';
-                    }
-                    
-                    itemElement.querySelector('.item-status').textContent = item.status;
-                    itemElement.querySelector('.item-status').classList.add(`status-${item.status.toLowerCase().replace(' ', '-')}`);
-                    
-                    orderItemsList.appendChild(itemElement);
-                });
-                
-                // Update buttons state
-                markDeliveredButton.disabled = !(order.status === 'Ready');
-                markPaidButton.disabled = !(order.status === 'Delivered');
+                orderDetailsCache[order.id] = order;
+                displayOrderDetails(order);
             })
             .catch(error => console.error('Error loading order details:', error));
     }
     
+    function displayOrderDetails(order) {
+        // Update order info
+        orderInfo.innerHTML = `
+            <div class="order-detail-header">
+                <h3>Order #${order.id}</h3>
+                <span class="order-status status-${order.status.toLowerCase().replace(' ', '-')}">${order.status}</span>
+            </div>
+            <div class="order-detail-row">
+                <span class="label">Table:</span>
+                <span>${order.table_number}</span>
+            </div>
+            
+            <div class="order-detail-row">
+                <span class="label">Time:</span>
+                <span>${formatDateTime(order.created_at)}</span>
+            </div>
+            <div class="order-detail-row">
+                <span class="label">Total:</span>
+                <span>$${order.total_amount.toFixed(2)}</span>
+            </div>
+        `;
+        
+        // Update order items
+        orderItemsList.innerHTML = '';
+        order.items.forEach(item => {
+            const itemElement = detailItemTemplate.content.cloneNode(true);
+            
+            itemElement.querySelector('.item-name').textContent = item.name;
+            itemElement.querySelector('.item-quantity').textContent = item.quantity;
+            
+            if (item.notes) {
+                itemElement.querySelector('.item-notes').textContent = `Note: ${item.notes}`;
+            } else {
+                itemElement.querySelector('.item-notes').style.display = 'none';
+            }
+            
+            itemElement.querySelector('.item-status').textContent = item.status;
+            itemElement.querySelector('.item-status').classList.add(`status-${item.status.toLowerCase().replace(' ', '-')}`);
+            
+            orderItemsList.appendChild(itemElement);
+        });
+        
+        // Update buttons state
+        markDeliveredButton.disabled = !(order.status === 'Ready');
+        markPaidButton.disabled = !(order.status === 'Delivered');
+    }
+    
     function markOrderDelivered() {
         if (!selectedOrderId) return;
         
@@ -13,6 +13,7 @@ from PIL import Image
 
 # Add common directory to path for event modules
 sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
+from events.producer import publish_event
 from events.consumer import setup_consumer, register_event_handler
 
 # Set up logging
@@ -261,6 +262,8 @@ def update_menu_translation():
     
     # Save updated translations
     if save_menu_translations(menu_translations):
+        # The Menu Service indexes translations for search
+        publish_event('menu_translations_updated', {'items': {item_id: menu_translations['items'][item_id]}})
         return jsonify({"success": True})
     else:
         return jsonify({"error": "Failed to save translations"}), 500
@@ -368,6 +371,7 @@ def import_menu_translations(df, update_existing):
     
     # Initialize count
     count = 0
+    changed_items = set()
     
     # Process each row
     for _, row in df.iterrows():
@@ -400,10 +404,16 @@ def import_menu_translations(df, update_existing):
                 # Update translation if it doesn't exist or update_existing is True
                 if lang_code not in menu_translations['items'][item_id][field] or update_existing:
                     menu_translations['items'][item_id][field][lang_code] = row[lang]
+                    changed_items.add(item_id)
                     count += 1
     
     # Save updated translations
     if save_menu_translations(menu_translations):
+        # One event for the whole import
+        if changed_items:
+            publish_event('menu_translations_updated', {
+                'items': {item_id: menu_translations['items'][item_id] for item_id in changed_items}
+            })
         return count
     else:
         raise Exception("Failed to save translations")
@@ -1,6 +1,5 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import sqlite3
 import os
 import jwt
 import datetime
@@ -14,6 +13,7 @@ import bcrypt
 # Add common directory to path for event modules
 sys.path.append(os.path.join(os.path.dirname(__file__), 'common'))
 from events.producer import publish_event
+from db.pool import get_connection, retry_on_busy
 import sys
 print("PYTHON PATH:", sys.path)
 
@@ -40,10 +40,10 @@ ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', '060704')
 
 # Database setup
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled WAL-mode connection; close() hands it back to the pool
+    return get_connection(DATABASE)
 
+@retry_on_busy
 def create_tables():
     conn = get_db_connection()
     cursor = conn.cursor()